@@ -1,14 +1,33 @@
 from flask import render_template
 from flask_login import login_required
 import json, uuid, time, traceback, requests, random, threading, ipaddress
+from concurrent.futures import TimeoutError as FutureTimeout
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response
 from flask_login import login_user, logout_user, login_required
 from sqlalchemy import desc, func
 
 from config import Config
 from extensions import db
-from models import User, KVStore, EventLog, Counters, Product
+from models import User, KVStore, EventLog, Counters, Product, settings_cache
+from utils.eventlog_writer import writer as eventlog_writer
+from utils.dedup import dedup_window
+from utils.counters import counters
+from utils.coverage import coverage
+from utils.scheduler import AutomationScheduler
+from utils.capi_batcher import capi_batcher
+from utils.capi_jobs import capi_jobs
+from utils.graph_transport import graph_transport
+from utils.retention import retention
+from utils.event_bus import bus
+from utils.catalog import catalog
+from utils.page_cache import page_cache
+from utils.payload_codec import payload_codec
+from utils.request_log import request_sampler
+from utils.profiler import profiler
+from utils.rollups import rollups
+from utils.user_data import user_data, identity_from
+from utils import runner
 
 admin_bp = Blueprint("admin", __name__, template_folder="templates")
 
@@ -41,25 +60,7 @@ def pltv_max(): return float(KVStore.get("pltv_max","600"))
 def pltv_randomized(): return (KVStore.get("pltv_randomized","1")=="1")
 
 # -------------------- Rate Limiting --------------------
-class TokenBucket:
-    def __init__(self, qps, burst=None):
-        self.qps = float(qps or 1.0)
-        self.capacity = burst or max(1, int(self.qps * 2))
-        self.tokens = self.capacity
-        self.updated = time.time()
-        self.lock = threading.Lock()
-    def take(self):
-        with self.lock:
-            now = time.time()
-            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.qps)
-            self.updated = now
-            if self.tokens >= 1:
-                self.tokens -= 1
-                return True
-            return False
-
-pixel_bucket = TokenBucket(float(getattr(Config, "RATE_LIMIT_QPS_PIXEL", 5)))
-capi_bucket  = TokenBucket(float(getattr(Config, "RATE_LIMIT_QPS_CAPI", 5)))
+from utils.rate_limit import TokenBucket, pixel_bucket, capi_bucket
 
 # -------------------- Auth --------------------
 @admin_bp.route("/login", methods=["GET","POST"])
@@ -89,28 +90,19 @@ def send_pixel(event, status_override=None):
         time.sleep(0.005)
         latency = int((time.time() - start) * 1000)
         status = status_override or "ok"
-        ev = EventLog(
-            ts=datetime.utcnow(), channel="pixel",
-            event_name=_sg(event,"event_name","?"),
-            event_id=_sg(event,"event_id",str(uuid.uuid4())),
-            status=status, latency_ms=latency,
-            payload=json.dumps(event)
-        )
-        db.session.add(ev)
-        c = Counters.get_or_create()
-        c.pixel += 1
-        dup = EventLog.query.filter_by(event_id=ev.event_id, channel="capi").first()
-        if dup: c.dedup += 1
-        db.session.commit()
+        event_id = _sg(event,"event_id",str(uuid.uuid4()))
+        coverage.observe("pixel", _sg(event,"event_name","?"), event)
+        eventlog_writer.record(channel="pixel",
+            event_name=_sg(event,"event_name","?"), event_id=event_id,
+            status=status, latency_ms=latency, payload=json.dumps(event))
+        counters.incr(pixel=1, dedup=int(dedup_window.check(event_id, "pixel", "capi")))
         return (status, latency, None)
     except Exception as e:
         try:
-            ev = EventLog(ts=datetime.utcnow(), channel="pixel",
-                          event_name=_sg(event,"event_name","?"),
-                          event_id=_sg(event,"event_id",""),
-                          status="error", latency_ms=0,
-                          payload=json.dumps(_as_dict(event)), error=str(e)[:1000])
-            db.session.add(ev); db.session.commit()
+            eventlog_writer.record(channel="pixel",
+                event_name=_sg(event,"event_name","?"), event_id=_sg(event,"event_id",""),
+                status="error", latency_ms=0,
+                payload=json.dumps(_as_dict(event)), error=str(e)[:1000])
         except Exception: pass
         return ("error", 0, str(e)[:1000])
 
@@ -134,10 +126,8 @@ def _ensure_synthetic_fbp():
         KVStore.set(fbpk, fbp)
     return fbp
 
-def send_capi(event):
-    event = _as_dict(event)
-    if not capi_enabled() or chaos_drop(): return ("dropped", 0, None)
-    start = time.time(); status, err = "ok", None
+def capi_request_context():
+    """(ua, ip, fbp, fbc) of the current request; read before handing a send to another thread."""
     try:
         ua = request.headers.get("User-Agent","") if request else ""
         ip_raw = (request.headers.get("X-Forwarded-For","") or (request.remote_addr or "")) if request else ""
@@ -145,13 +135,25 @@ def send_capi(event):
         fbc = request.cookies.get("_fbc") if request else None
     except Exception:
         ua, ip_raw, fbp, fbc = "Mozilla/5.0 (Server Automation)", "", None, None
+    return ua, ip_raw, fbp, fbc
+
+def send_capi(event, wait=True):
+    r = send_capi_result(event, wait=wait)
+    return (r["status"], r["latency_ms"], r["error"])
+
+def send_capi_result(event, wait=True, req_ctx=None):
+    """send_capi with the full result dict (status, http_status, latency_ms, error)."""
+    event = _as_dict(event)
+    if not capi_enabled() or chaos_drop(): return {"status": "dropped", "http_status": None, "latency_ms": 0, "error": None}
+    start = time.time(); status, err = "ok", None
+    ua, ip_raw, fbp, fbc = req_ctx or capi_request_context()
     if not ua: ua = "Mozilla/5.0"
     clean_ip = _clean_ip(ip_raw)
     if not fbp:
         try: fbp = _ensure_synthetic_fbp()
         except Exception: fbp = f"fb.1.{int(time.time())}.{random.randint(1000000000, 9999999999)}"
 
-    url = f"https://graph.facebook.com/{getattr(Config,'GRAPH_VER','v20.0')}/{getattr(Config,'PIXEL_ID','')}/events"
+    url = f"{getattr(Config,'GRAPH_BASE_URL','https://graph.facebook.com/')}{getattr(Config,'GRAPH_VER','v20.0')}/{getattr(Config,'PIXEL_ID','')}/events"
     data = {
         "data":[{
             "event_name": _sg(event,"event_name","?"),
@@ -159,12 +161,7 @@ def send_capi(event):
             "event_id": _sg(event,"event_id",str(uuid.uuid4())),
             "action_source": "website",
             "event_source_url": (getattr(Config,'BASE_URL',None) or "https://example.com"),
-            "user_data": {
-                "client_user_agent": ua,
-                **({"client_ip_address": clean_ip} if clean_ip else {}),
-                **({"fbp": fbp} if fbp else {}),
-                **({"fbc": fbc} if fbc else {}),
-            },
+            "user_data": user_data.build(identity_from(event), ua=ua, ip=clean_ip, fbp=fbp, fbc=fbc),
             "custom_data": {
                 "currency": _sg(event,"currency","USD"),
                 "value": float(_sg(event,"value",0) or 0),
@@ -175,39 +172,40 @@ def send_capi(event):
     }
     test_code = getattr(Config,"TEST_EVENT_CODE","")
     if test_code: data["test_event_code"]=test_code
+    event_name, event_id = data["data"][0]["event_name"], data["data"][0]["event_id"]
+    coverage.observe("capi", event_name, data)
+    if getattr(Config,"PIXEL_ID","") and getattr(Config,"ACCESS_TOKEN",""):
+        # Real sends are packed into multi-event Graph requests by the batcher
+        fut = capi_batcher.submit(url, getattr(Config,"ACCESS_TOKEN",""), data["data"][0], test_code,
+            on_done=lambda r: _log_capi(event_name, event_id, r["status"], r["latency_ms"], r["payload"], r["error"]))
+        if not wait: return {"status": "queued", "http_status": None, "latency_ms": 0, "error": None}
+        try: return fut.result(timeout=capi_batcher.result_timeout)
+        except FutureTimeout:   # still in flight; on_done logs the outcome when it lands
+            return {"status": "timeout", "http_status": None, "latency_ms": int((time.time()-start)*1000),
+                    "error": f"no CAPI result within {capi_batcher.result_timeout:.0f}s"}
     try:
-        while not capi_bucket.take(): time.sleep(0.02)
-        if getattr(Config,"PIXEL_ID","") and getattr(Config,"ACCESS_TOKEN",""):
-            resp = requests.post(url, params={"access_token": getattr(Config,"ACCESS_TOKEN","")}, json=data, timeout=10)
-            ok = 200 <= resp.status_code < 300
-            status = "ok" if ok else f"http_{resp.status_code}"
-            if not ok: err = (resp.text or "")[:1000]
-        else:
-            status = "dry_run"
+        capi_bucket.acquire()
+        status = "dry_run"
     except Exception as e:
         status="error"; err=str(e)[:1000]
     latency = int((time.time()-start)*1000)
+    _log_capi(event_name, event_id, status, latency, json.dumps(data), err)
+    return {"status": status, "http_status": None, "latency_ms": latency, "error": err}
+
+def _log_capi(event_name, event_id, status, latency, payload, err):
     try:
-        ev = EventLog(ts=datetime.utcnow(), channel="capi",
-                      event_name=_sg(event,"event_name","?"),
-                      event_id=_sg(event,"event_id",""),
-                      status=status, latency_ms=latency,
-                      payload=json.dumps(data), error=err)
-        db.session.add(ev)
+        eventlog_writer.record(channel="capi", event_name=event_name, event_id=event_id,
+            status=status, latency_ms=latency, payload=payload, error=err)
+        dup = dedup_window.check(event_id, "capi", "pixel")
         if status in ("ok","dry_run"):
-            c = Counters.get_or_create()
-            c.capi += 1
-            dup = EventLog.query.filter_by(event_id=ev.event_id, channel="pixel").first()
-            if dup: c.dedup += 1
-        db.session.commit()
+            counters.incr(capi=1, dedup=int(dup))
     except Exception: pass
-    return (status, latency, err)
 
 # -------------------- UI --------------------
 @admin_bp.route("/")
 @login_required
 def dashboard():
-    c = Counters.get_or_create()
+    c = counters.totals()
     build = KVStore.get("build_number","v1.0.0")
     graph = KVStore.get("graph_version","v20.0")
     recent = EventLog.query.order_by(desc(EventLog.ts)).limit(20).all()
@@ -260,78 +258,121 @@ def manual_send():
             raw = request.get_data(as_text=True) or ""
             body = json.loads(raw) if raw.strip() else {}
         payload = _as_dict(body)
+        channels = payload.pop("channels", None) or ["pixel","capi"]
         payload.setdefault("event_name","PageView")
         payload.setdefault("event_id", str(uuid.uuid4()))
         payload.setdefault("currency","USD")
         # Allow manual inclusion of profit_margin/pltv; do not auto-add here
         try: payload["value"] = float(payload.get("value",0) or 0)
         except Exception: payload["value"] = 0.0
-        try: p_status = send_pixel(payload)
-        except Exception as e: p_status=("error",0,str(e)[:1000])
-        try: c_status = send_capi(payload)
-        except Exception as e: c_status=("error",0,str(e)[:1000])
+        p_status = c_status = ("skipped",0,None)
+        if "pixel" in channels:
+            try: p_status = send_pixel(payload)
+            except Exception as e: p_status=("error",0,str(e)[:1000])
+        if "capi" in channels:
+            # the Graph call runs on the dispatch executor; poll /api/jobs/<id> for the outcome
+            event, req_ctx = dict(payload), capi_request_context()
+            job = capi_jobs.submit(lambda: send_capi_result(event, req_ctx=req_ctx),
+                                   event_name=payload["event_name"], event_id=payload["event_id"])
+            return jsonify({"ok":True,"pixel":p_status[0],"capi":"queued","job_id":job["id"],
+                            "job_url":url_for("admin.api_job", job_id=job["id"])}), 202
         return jsonify({"ok":True,"pixel":p_status[0],"capi":c_status[0]})
     except Exception as e:
         return jsonify({"ok":False,"error":str(e)}),500
 
 # -------------------- Automation --------------------
-AUTOMATION_THREADS = {}
-AUTOMATION_STOP = threading.Event()
-
-def automation_worker(app, event_name, interval_s):
-    with app.app_context():
-        while not AUTOMATION_STOP.is_set():
-            # Respect per-event toggle if you have them; otherwise always on
-            value = 0.0; currency="USD"
-            event_payload = {"event_name": event_name, "event_id": str(uuid.uuid4()), "currency": currency}
-            if event_name == "Purchase":
-                price = random.uniform(10,300)
-                cmin,cmax = margin_min(), margin_max()
-                cost = price * random.uniform(cmin,cmax)
-                margin = max(0, price - cost)
-                value = price
-                event_payload.update({
-                    "value": value,
-                    "profit_margin": round(margin, 2),
-                    "pltv": round(random.uniform(pltv_min(), pltv_max()), 2) if pltv_randomized() else None
-                })
-                if event_payload.get("pltv") is None:
-                    event_payload.pop("pltv", None)
-            else:
-                event_payload["value"] = value
-
-            # Send only to channels enabled for automation
-            if get_auto_pixel():
-                try: send_pixel(event_payload)
-                except Exception: pass
-            if get_auto_capi():
-                try: send_capi(event_payload)
-                except Exception: pass
-            time.sleep(max(0.25, float(interval_s)))
+# One heap-driven scheduler feeds a worker pool of AUTOMATION_MAX_CONCURRENCY
+automation = AutomationScheduler(max_workers=getattr(Config,"AUTOMATION_MAX_CONCURRENCY",4),
+                                 arrivals=getattr(Config,"AUTOMATION_ARRIVALS","poisson"))
+AUTOMATION_STOP = automation.stop_event
+DEFAULT_INTERVALS = {"PageView":1.5,"ViewContent":2.0,"AddToCart":3.5,"InitiateCheckout":4.0,"AddPaymentInfo":5.0,"Purchase":6.0}
+
+def automation_payload(event_name):
+    value = 0.0; currency="USD"
+    # pooled identities arrive pre-hashed (USER_DATA_IDENTITY_POOL, off by default)
+    event_payload = {"event_name": event_name, "event_id": str(uuid.uuid4()), "currency": currency, **user_data.pick()}
+    if event_name == "Purchase":
+        price = random.uniform(10,300)
+        cmin,cmax = margin_min(), margin_max()
+        cost = price * random.uniform(cmin,cmax)
+        margin = max(0, price - cost)
+        value = price
+        event_payload.update({
+            "value": value,
+            "profit_margin": round(margin, 2),
+            "pltv": round(random.uniform(pltv_min(), pltv_max()), 2) if pltv_randomized() else None
+        })
+        if event_payload.get("pltv") is None:
+            event_payload.pop("pltv", None)
+    else:
+        event_payload["value"] = value
+    return event_payload
+
+def automation_worker(app, event_name):
+    # One scheduled arrival: build the event and send it to the enabled channels
+    with app.app_context(), profiler.automation():
+        event_payload = automation_payload(event_name)
+        if get_auto_pixel():
+            try: send_pixel(event_payload)
+            except Exception: pass
+        if get_auto_capi():
+            try: send_capi(event_payload, wait=False)
+            except Exception: pass
+
+def _automation_rates(data):
+    # Explicit events/sec win; otherwise fall back to the saved per-event intervals
+    rates, intervals = data.get("rates") or {}, data.get("intervals") or {}
+    out = {}
+    for name, default in DEFAULT_INTERVALS.items():
+        if name in rates:
+            out[name] = float(rates[name] or 0)
+            continue
+        key = f"interval_{name}"
+        interval = float(intervals.get(key, KVStore.get(key, default)))
+        out[name] = 1.0 / interval if interval > 0 else 0.0
+    for name, r in rates.items():
+        out.setdefault(name, float(r or 0))
+    return out
+
+def runner_mode():
+    # "thread": scheduler inside this web process; "process": `flask automation-runner`
+    return getattr(Config, "AUTOMATION_RUNNER", "thread")
+
+def automation_view():
+    """(running, per-event status, arrivals, max_concurrency, requested rates) for either runner mode."""
+    if runner_mode() == "process":
+        st = runner.status(getattr(Config, "AUTOMATION_RUNNER_HEARTBEAT", 1.0))
+        return st["running"], st["rates"], st["arrivals"], st["max_concurrency"], st["requested"], st
+    running = automation.running
+    return running, automation.status(), automation.arrivals, automation.max_workers, \
+        (automation.rates if running else {}), None
 
 @admin_bp.route("/api/automation", methods=["POST"])
 @login_required
 def api_automation():
     data = request.get_json(silent=True) or {}
     cmd = data.get("cmd")
+    max_workers = data.get("max_concurrency") or getattr(Config,"AUTOMATION_MAX_CONCURRENCY",4)
+    if cmd == "start" and runner_mode() == "process":
+        rates = {n: r for n, r in _automation_rates(data).items() if r > 0}
+        config = {"rates": rates, "max_concurrency": int(max_workers),
+                  "arrivals": data.get("arrivals") or getattr(Config,"AUTOMATION_ARRIVALS","poisson")}
+        if not runner.request_start(config):
+            return {"ok":False,"error":"already running"},400
+        return {"ok":True,"started": list(rates)}
     if cmd == "start":
-        if AUTOMATION_THREADS:
+        if automation.running:
             return {"ok":False,"error":"already running"},400
-        AUTOMATION_STOP.clear()
-        intervals = data.get("intervals", {})
         app = current_app._get_current_object()
-        defaults = {"PageView":1.5,"ViewContent":2.0,"AddToCart":3.5,"InitiateCheckout":4.0,"AddPaymentInfo":5.0,"Purchase":6.0}
-        for name, default in defaults.items():
-            key = f"interval_{name}"
-            interval = float(intervals.get(key, KVStore.get(key, default)))
-            t = threading.Thread(target=automation_worker, args=(app,name,interval), daemon=True)
-            t.start(); AUTOMATION_THREADS[name]=t
-        return {"ok":True,"started": list(AUTOMATION_THREADS.keys())}
+        started = automation.start(lambda name: automation_worker(app, name), _automation_rates(data),
+                                   max_workers=max_workers, arrivals=data.get("arrivals"))
+        return {"ok":True,"started": started}
     elif cmd == "stop":
-        AUTOMATION_STOP.set()
-        for k,t in list(AUTOMATION_THREADS.items()):
-            t.join(timeout=0.2)
-        AUTOMATION_THREADS.clear()
+        if runner_mode() == "process":
+            runner.request_stop()   # shards flush their own queues as they exit
+            return {"ok":True,"stopped":True}
+        automation.stop()
+        eventlog_writer.flush()
         return {"ok":True,"stopped":True}
     return {"ok":False,"error":"unknown cmd"},400
 
@@ -339,38 +380,261 @@ def api_automation():
 @admin_bp.route("/api/counters")
 @login_required
 def api_counters():
-    c = Counters.get_or_create()
-    # Count events that include profit_margin / pltv in payload (across both channels)
-    margin_events = db.session.query(func.count(EventLog.id)).filter(EventLog.payload.contains('"profit_margin"')).scalar() or 0
-    pltv_events   = db.session.query(func.count(EventLog.id)).filter(EventLog.payload.contains('"pltv"')).scalar() or 0
+    return {"ok": True, **counters_payload()}
+
+def counters_payload():
+    c = counters.totals()
+    # Parameter coverage is counted at send time (utils/coverage.py), not scanned from payloads
     return {
-        "ok": True,
-        "pixel": c.pixel,
-        "capi": c.capi,
-        "dedup": c.dedup,
-        "margin_events": int(margin_events),
-        "pltv_events": int(pltv_events)
+        "pixel": c["pixel"],
+        "capi": c["capi"],
+        "dedup": c["dedup"],
+        "margin_events": coverage.param_total("margin"),
+        "pltv_events": coverage.param_total("pltv"),
+        "coverage": coverage.snapshot(),
     }
 
+@admin_bp.route("/api/stats")
+@login_required
+def api_stats():
+    return {"ok": True, "eventlog_writer": eventlog_writer.stats(), "dedup": dedup_window.stats(),
+            "capi_batcher": capi_batcher.stats(), "graph_transport": graph_transport.stats(),
+            "settings_cache": settings_cache.stats(), "retention": retention.stats(),
+            "event_bus": bus.stats(), "catalog": catalog.stats(),
+            "page_cache": page_cache.stats(), "capi_jobs": capi_jobs.stats(),
+            "payload_codec": payload_codec.stats(), "request_log": request_sampler.stats(),
+            "profiler": profiler.stats(), "rollups": rollups.stats(),
+            "user_data": user_data.stats()}
+
+@admin_bp.route("/api/jobs")
+@login_required
+def api_jobs():
+    limit = max(1, min(500, request.args.get("limit", 50, type=int)))
+    return {"ok": True, "jobs": capi_jobs.recent(limit)}
+
+@admin_bp.route("/api/jobs/<job_id>")
+@login_required
+def api_job(job_id):
+    job = capi_jobs.get(job_id)
+    if job is None: return {"ok": False, "error": "unknown job"}, 404
+    return {"ok": True, "job": job}
+
+@admin_bp.route("/api/rollups")
+@login_required
+def api_rollups():
+    # chart data from event_rollup only; cost depends on the window, not the history
+    res = "1h" if request.args.get("res") == "1h" else "1m"
+    limit = 24 * 90 if res == "1h" else 24 * 60
+    buckets = max(1, min(limit, request.args.get("buckets", 60, type=int)))
+    return {"ok": True, "res": res, "series": rollups.series(res, buckets, channel=request.args.get("channel") or None,
+                                                             event_name=request.args.get("event_name") or None)}
+
+@admin_bp.route("/api/archive")
+@login_required
+def api_archive():
+    def _ts(name):
+        v = request.args.get(name)
+        try: return datetime.fromisoformat(v) if v else None
+        except ValueError: return None
+    event_id = (request.args.get("event_id") or "").strip() or None
+    start, end = _ts("start"), _ts("end")
+    if not event_id and not (start and end):
+        return {"ok": False, "error": "event_id or start+end required"}, 400
+    limit = min(int(request.args.get("limit", 200) or 200), 2000)
+    rows = retention.search(event_id=event_id, start=start, end=end, limit=limit)
+    return {"ok": True, "count": len(rows), "rows": rows}
+
 @admin_bp.route("/api/automation_status")
 @login_required
 def api_automation_status():
-    running = bool(AUTOMATION_THREADS) and not AUTOMATION_STOP.is_set()
-    return {"ok": True, "running": running, "threads": list(AUTOMATION_THREADS.keys()),
+    running, rates, arrivals, max_workers, requested, runner_status = automation_view()
+    out = {"ok": True, "running": running, "threads": list(requested) if running else [],
+           "rates": rates, "arrivals": arrivals, "max_concurrency": max_workers,
+           "automation_pixel": get_auto_pixel(), "automation_capi": get_auto_capi(), "mode": runner_mode()}
+    if runner_status is not None: out["runner"] = runner_status
+    return out
+
+# -------------------- Live stream (SSE) --------------------
+def _automation_state():
+    running, rates, arrivals, max_workers, requested, _ = automation_view()
+    _live.automation_rates = rates if running else {}
+    return {"running": running, "threads": list(requested) if running else [],
+            "requested": requested if running else {}, "arrivals": arrivals,
+            "max_concurrency": max_workers,
             "automation_pixel": get_auto_pixel(), "automation_capi": get_auto_capi()}
 
+class _LiveSources:
+    """Diffing state for the bus producer thread (the only caller)."""
+    def __init__(self):
+        self.prev, self.prev_t, self.last_id = None, None, None
+        self._rates = None
+        self.automation_rates = {}   # filled by the automation source earlier in the same tick
+
+    def counters(self):
+        cur = counters_payload()
+        keys = ("pixel", "capi", "dedup")
+        delta = {k: cur[k] - self.prev[k] for k in keys} if self.prev else {k: 0 for k in keys}
+        now = time.time()
+        if self.prev and now > self.prev_t:
+            self._rates = {f"{k}_eps": round(delta[k] / (now - self.prev_t), 2) for k in keys}
+        self.prev, self.prev_t = cur, now
+        return {**cur, "delta": delta}
+
+    def rates(self):
+        out = dict(self._rates or {})
+        out["automation"] = self.automation_rates
+        out["eventlog_written"] = eventlog_writer.written
+        return out
+
+    def events(self, limit=50):
+        t = EventLog.__table__
+        if self.last_id is None:
+            self.last_id = db.session.execute(db.select(db.func.max(t.c.id))).scalar() or 0
+            return []
+        rows = db.session.execute(
+            db.select(t.c.id, t.c.ts, t.c.channel, t.c.event_name, t.c.status, t.c.latency_ms)
+            .where(t.c.id > self.last_id).order_by(t.c.id.desc()).limit(limit)).mappings().all()
+        if not rows: return []
+        self.last_id = rows[0]["id"]
+        return [{**r, "ts": r["ts"].isoformat() if r["ts"] else None} for r in reversed(rows)]
+
+_live = _LiveSources()
+bus.add_source("counters", _live.counters)
+bus.add_source("automation", _automation_state)
+bus.add_source("rates", _live.rates)
+bus.add_source("events", _live.events, snapshot=False)
+
+@admin_bp.route("/api/stream")
+@login_required
+def api_stream():
+    sub = bus.subscribe()
+    if sub is None:
+        # every stream holds a worker thread; beyond the cap clients fall back to polling
+        return {"ok": False, "error": "too many live subscribers"}, 503
+    return Response(bus.stream(sub), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# -------------------- Catalog --------------------
+@admin_bp.route("/catalog", methods=["GET","POST"])
+@login_required
+def catalog_view():
+    if request.method == "POST":
+        action, sku = request.form.get("action"), (request.form.get("sku") or "").strip()
+        if action == "add" and sku:
+            p = Product.query.filter_by(sku=sku).first() or Product(sku=sku)
+            p.name = (request.form.get("name") or sku).strip()
+            try: p.price = float(request.form.get("price") or 0)
+            except ValueError: p.price = 0.0
+            p.currency = (request.form.get("currency") or "USD").strip().upper()
+            db.session.add(p)
+        elif action == "delete" and sku:
+            Product.query.filter_by(sku=sku).delete()
+        db.session.commit()
+        catalog.bump()   # shop pages reload the catalog on their next lookup
+        return redirect(url_for("admin.catalog_view"))
+    return render_template("admin/catalog.html", items=catalog.all())
+
+# -------------------- Profiler --------------------
+@admin_bp.route("/profiler", methods=["GET","POST"])
+@login_required
+def profiler_view():
+    if request.method == "POST":
+        action = request.form.get("action")
+        if action == "configure":
+            try: rate = float(request.form.get("rate_pct") or 0) / 100.0
+            except ValueError: rate = 0.0
+            profiler.configure(rate=rate, header=bool(request.form.get("header")))
+        elif action == "window":
+            try: seconds = float(request.form.get("seconds") or 0)
+            except ValueError: seconds = 0.0
+            profiler.configure(window_seconds=min(seconds, 600))   # ignored in process runner mode
+        elif action == "off":
+            profiler.configure(rate=0, header=False, window_seconds=0)
+        elif action == "clear":
+            profiler.clear()
+        return redirect(url_for("admin.profiler_view", **request.args))
+    ids = {int(i) for i in request.args.getlist("id") if i.isdigit()} or None
+    sort = request.args.get("sort", "cumulative")
+    return render_template("admin/profiler.html", settings=profiler.settings(), entries=profiler.entries(),
+                           rows=profiler.top(ids, sort=sort, limit=40), ids=ids or set(), sort=sort)
+
+@admin_bp.route("/profiler/<int:profile_id>.pstats")
+@login_required
+def profiler_download(profile_id):
+    data = profiler.dump(profile_id)
+    if data is None: return {"ok": False, "error": "not found"}, 404
+    return Response(data, mimetype="application/octet-stream",
+                    headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.pstats"})
+
+@admin_bp.route("/api/profiles")
+@login_required
+def api_profiles():
+    ids = {int(i) for i in request.args.getlist("id") if i.isdigit()} or None
+    return {"ok": True, "settings": profiler.settings(), "profiles": profiler.entries(),
+            "top": profiler.top(ids, sort=request.args.get("sort", "cumulative"),
+                                limit=max(1, min(200, request.args.get("limit", 30, type=int))))}
+
 # -------------------- Inspector & Health --------------------
+# Rows are fetched page by page from /api/logs; payload/error only on demand
 @admin_bp.route("/request-inspector")
 @login_required
 def request_inspector():
-    logs = EventLog.query.order_by(desc(EventLog.ts)).limit(100).all()
-    return render_template("admin/request_inspector.html", logs=logs)
+    return render_template("admin/request_inspector.html")
 
 @admin_bp.route("/logs")
 @login_required
 def logs_view():
-    logs = EventLog.query.order_by(desc(EventLog.ts)).limit(500).all()
-    return render_template("admin/logs.html", logs=logs)
+    return render_template("admin/logs.html")
+
+LOG_SUMMARY_COLUMNS = ("id", "ts", "channel", "event_name", "event_id", "status", "latency_ms")
+LOG_FILTERS = ("channel", "event_name", "status", "event_id")
+
+def _parse_ts(v):
+    try: return datetime.fromisoformat(v) if v else None
+    except ValueError: return None
+
+@admin_bp.route("/api/logs")
+@login_required
+def api_logs():
+    """Newest-first summary rows with keyset (ts, id) paging, NULL ts last: pass `next` back as `cursor`."""
+    t = EventLog.__table__
+    has_error = db.and_(t.c.error.isnot(None), t.c.error != "").label("has_error")
+    q = db.select(*(t.c[c] for c in LOG_SUMMARY_COLUMNS), has_error)
+    for f in LOG_FILTERS:
+        v = (request.args.get(f) or "").strip()
+        if v: q = q.where(t.c[f] == v)
+    start, end = _parse_ts(request.args.get("start")), _parse_ts(request.args.get("end"))
+    if start: q = q.where(t.c.ts >= start)
+    if end: q = q.where(t.c.ts <= end)
+    cursor = request.args.get("cursor") or ""
+    if cursor:
+        try:
+            c_ts, c_id = cursor.rsplit("|", 1)
+            c_ts, c_id = datetime.fromisoformat(c_ts) if c_ts else None, int(c_id)
+        except ValueError:
+            return {"ok": False, "error": "bad cursor"}, 400
+        if c_ts is None:
+            q = q.where(t.c.ts.is_(None), t.c.id < c_id)
+        else:
+            q = q.where(db.or_(t.c.ts < c_ts, db.and_(t.c.ts == c_ts, t.c.id < c_id), t.c.ts.is_(None)))
+    try: limit = max(1, min(int(request.args.get("limit", 100)), 500))
+    except ValueError: limit = 100
+    rows = db.session.execute(q.order_by(t.c.ts.desc().nulls_last(), t.c.id.desc()).limit(limit + 1)).mappings().all()
+    more, rows = len(rows) > limit, rows[:limit]
+    out = [{**r, "ts": r["ts"].isoformat() if r["ts"] else None, "has_error": bool(r["has_error"])} for r in rows]
+    nxt = f"{out[-1]['ts'] or ''}|{out[-1]['id']}" if more else None
+    return {"ok": True, "rows": out, "next": nxt}
+
+@admin_bp.route("/api/logs/<int:log_id>")
+@login_required
+def api_log_detail(log_id):
+    t = EventLog.__table__
+    row = db.session.execute(db.select(t.c.payload, t.c.payload_z, t.c.error).where(t.c.id == log_id)).first()
+    if row is None: return {"ok": False, "error": "not found"}, 404
+    text = payload_codec.text(row.payload, row.payload_z)
+    try: payload = json.loads(text) if text else None
+    except ValueError: payload = text
+    return {"ok": True, "id": log_id, "payload": payload, "error": row.error}
 
 @admin_bp.route("/api/pixel-check", methods=["POST"])
 @login_required
@@ -387,7 +651,8 @@ def pixel_check():
     last_err=None
     for url in candidates:
         try:
-            resp = requests.get(url, timeout=8)
+            # candidates are already tried in turn, so no per-URL retries
+            resp = graph_transport.get(url, timeout=8, retries=0)
             html = resp.text.lower()
             has_meta_noindex = ('name="robots"' in html) or ('noindex' in html)
             has_pixel_snippet = ("window.demopixel" in html) or ("/static/js/pixel.js" in html)
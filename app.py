@@ -10,10 +10,28 @@ from dotenv import load_dotenv
 
 from extensions import db, login_manager
 from config import Config
-from models import ensure_seed_admin, KVStore
+from models import ensure_seed_admin, ensure_schema, KVStore, Counters, settings_cache
+from utils.eventlog_writer import writer as eventlog_writer
+from utils.dedup import dedup_window
+from utils.capi_batcher import capi_batcher
+from utils.capi_jobs import capi_jobs
+from utils.payload_codec import payload_codec
+from utils.metrics import metrics
+from utils.request_log import request_sampler
+from utils.profiler import profiler
+from utils.rollups import rollups
+from utils.user_data import user_data
+from utils.rate_limit import pixel_bucket, capi_bucket
+from utils.graph_transport import graph_transport
+from utils.counters import counters
+from utils.coverage import coverage
+from utils.retention import retention
+from utils.event_bus import bus
+from utils.page_cache import page_cache
+from cli import register_cli
 
 # Blueprints
-from shop.routes import shop_bp
+from shop.routes import shop_bp, ensure_seed_products
 from admin.routes import admin_bp
 
 load_dotenv()
@@ -26,9 +44,12 @@ def create_app():
     Migrate(app, db)  # safe even if it's the no-op
 
     login_manager.init_app(app)
+    metrics.init_app(app)   # first, so its timer wraps the other request hooks
 
     app.register_blueprint(shop_bp)
     app.register_blueprint(admin_bp, url_prefix="/admin")
+    register_cli(app)
+    page_cache.init_app(app)
 
     @app.after_request
     def add_noindex(response):
@@ -44,10 +65,46 @@ def create_app():
     def healthz():
         return {"ok": True, "time": datetime.utcnow().isoformat()}
 
+    background = app.config.get("BACKGROUND_SERVICES", True)
+    if not background:
+        # automation shards: the web app owns schema, seeding and housekeeping
+        app.config.update(RETENTION_INTERVAL=0, ROLLUP_COMPACT_INTERVAL=0)
+
     with app.app_context():
-        ensure_seed_admin()
-        KVStore.set("build_number", os.getenv("BUILD_NUMBER", "v1.0.0"))
-        KVStore.set("graph_version", os.getenv("GRAPH_VER", "v20.0"))
+        if background:
+            ensure_seed_admin()
+            ensure_schema()
+        settings_cache.init_app(app)
+        settings_cache.load(force=True)
+        if background:
+            KVStore.set("build_number", os.getenv("BUILD_NUMBER", "v1.0.0"))
+            KVStore.set("graph_version", os.getenv("GRAPH_VER", "v20.0"))
+            ensure_seed_products()
+            Counters.get_or_create()
+
+    payload_codec.init_app(app)
+    eventlog_writer.init_app(app)
+    eventlog_writer.add_flush_hook(counters)
+    eventlog_writer.add_flush_hook(coverage)
+    rollups.init_app(app, eventlog_writer)
+    dedup_window.init_app(app)
+    graph_transport.init_app(app)
+    capi_batcher.init_app(app)
+    retention.init_app(app)
+    bus.init_app(app)
+    if background: capi_jobs.init_app(app, bus)
+    request_sampler.init_app(app, eventlog_writer)
+    profiler.init_app(app)
+    user_data.init_app(app)
+
+    metrics.gauge("shop_eventlog_queue_depth", "EventLog rows waiting for the writer", lambda: eventlog_writer.q.qsize())
+    metrics.gauge("shop_capi_batcher_pending", "CAPI events waiting to be batched", lambda: capi_batcher.stats()["pending"])
+    metrics.gauge("shop_capi_jobs_pending", "Manual CAPI jobs queued or running", lambda: capi_jobs.stats()["pending"])
+    metrics.gauge("shop_sse_subscribers", "Open live-stream connections", lambda: len(bus.subscribers))
+    metrics.gauge("shop_ratelimit_tokens", "Tokens left per rate-limit bucket",
+                  lambda: {(b.name,): round(b.tokens, 3) for b in (pixel_bucket, capi_bucket)}, ("bucket",))
+    metrics.gauge("shop_user_data_hash_cache", "user_data hash cache lookups by result",
+                  lambda: {(k,): user_data.stats()[k] for k in ("hits", "misses")}, ("result",))
 
     return app
 
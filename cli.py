@@ -0,0 +1,147 @@
+import json, click
+from utils.coverage import coverage
+
+def register_cli(app):
+    @app.cli.command("coverage-backfill")
+    def coverage_backfill():
+        """Rebuild parameter coverage counts from existing EventLog rows."""
+        scanned = coverage.backfill()
+        click.echo(f"scanned {scanned} EventLog rows")
+
+    @app.cli.command("loadgen")
+    @click.option("--shoppers", default=10, show_default=True, help="Concurrent virtual shoppers.")
+    @click.option("--duration", default=60.0, show_default=True, help="Run time in seconds.")
+    @click.option("--base-url", default="", help="Target server; empty runs in-process against this app.")
+    @click.option("--think", default="0.5,2.0", show_default=True, help="Think time range in seconds: min,max.")
+    @click.option("--conv", multiple=True, help="Conversion ratio into a step, e.g. --conv AddToCart=0.3")
+    @click.option("--out", default="", help="Also write the JSON report to this file.")
+    def loadgen(shoppers, duration, base_url, think, conv, out):
+        """Run funnel-shaped virtual shoppers against the shop routes."""
+        from utils.loadgen import LoadGenerator, HttpClient, AppClient
+        lo, hi = (float(x) for x in think.split(","))
+        conversion = {k: float(v) for k, v in (c.split("=", 1) for c in conv)}
+        if base_url: make_client = lambda cookies=None: HttpClient(base_url, cookies)
+        else: make_client = lambda cookies=None: AppClient(app, cookies)
+        report = LoadGenerator(make_client, shoppers=shoppers, duration=duration, conversion=conversion,
+                               think=(lo, hi), admin_user=app.config["ADMIN_USER"],
+                               admin_pass=app.config["ADMIN_PASS"]).run()
+        text = json.dumps(report, indent=2)
+        if out:
+            with open(out, "w") as f: f.write(text)
+        click.echo(text)
+
+    @app.cli.command("bench")
+    @click.option("--sizes", default="10k,100k,1m,10m", show_default=True, help="EventLog sizes to seed and measure (10k, 1m or a row count).")
+    @click.option("--calls", default=200, show_default=True, help="Sequential calls per case for latency percentiles.")
+    @click.option("--seconds", default=5.0, show_default=True, help="Sustained-throughput window per case.")
+    @click.option("--threads", default=4, show_default=True, help="Concurrent callers in the throughput window.")
+    @click.option("--case", "cases", multiple=True, help="Only run these cases (default: all).")
+    @click.option("--graph-latency-ms", default=20.0, show_default=True, help="Response delay of the Graph stub.")
+    @click.option("--out", default="", help="Write results JSON to this file.")
+    @click.option("--baseline", default="", help="Compare against an earlier results file.")
+    @click.option("--threshold", default=0.2, show_default=True, help="Allowed p95/throughput regression as a fraction.")
+    def bench(sizes, calls, seconds, threads, cases, graph_latency_ms, out, baseline, threshold):
+        """Benchmark the event hot paths at several EventLog sizes (seeds rows; use a throwaway DATABASE_URL)."""
+        from utils.bench import run_bench, compare, parse_size
+        results = run_bench(app, [parse_size(s) for s in sizes.split(",") if s.strip()], calls=calls, seconds=seconds,
+                            threads=threads, cases=set(cases), graph_latency_ms=graph_latency_ms, echo=click.echo)
+        if out:
+            with open(out, "w") as f: json.dump(results, f, indent=2)
+            click.echo(f"wrote {out}")
+        if baseline:
+            with open(baseline) as f: regressions = compare(results, json.load(f), threshold)
+            for r in regressions:
+                click.echo(f"REGRESSION {r['size']} {r['case']} {r['metric']}: {r['baseline']} -> {r['current']} ({r['change']:+.1%})")
+            if regressions: raise SystemExit(1)
+            click.echo(f"no regressions beyond {threshold:.0%}")
+
+    @app.cli.command("retention-run")
+    @click.option("--max-chunks", default=0, help="Stop after this many chunks (0 = until nothing is expired).")
+    def retention_run(max_chunks):
+        """Archive EventLog rows outside the retention policy now."""
+        from utils.retention import retention
+        if not retention.enabled: raise click.ClickException("no retention policy set (RETENTION_MAX_AGE_DAYS / RETENTION_MAX_ROWS)")
+        moved = retention.run(max_chunks=max_chunks or None)
+        click.echo(f"archived {moved} rows into {retention.archive_dir}")
+
+    @app.cli.command("archive-search")
+    @click.option("--event-id", default="", help="Find archived rows with this event_id.")
+    @click.option("--start", default="", help="ISO timestamp lower bound.")
+    @click.option("--end", default="", help="ISO timestamp upper bound.")
+    @click.option("--limit", default=100, show_default=True)
+    def archive_search(event_id, start, end, limit):
+        """Look up archived EventLog rows by event_id and/or time range."""
+        from datetime import datetime
+        from utils.retention import retention
+        rows = retention.search(event_id=event_id or None, start=datetime.fromisoformat(start) if start else None,
+                                end=datetime.fromisoformat(end) if end else None, limit=limit)
+        for r in rows: click.echo(json.dumps(r))
+
+    @app.cli.command("compact-payloads")
+    @click.option("--chunk", default=2000, show_default=True, help="Rows per transaction.")
+    @click.option("--vacuum", is_flag=True, help="VACUUM afterwards so SQLite returns the space to the filesystem.")
+    def compact_payloads(chunk, vacuum):
+        """Compress existing plain-text EventLog payloads (new rows are compressed on write)."""
+        from extensions import db
+        from utils.payload_codec import compact_eventlog
+        rows, raw, stored = compact_eventlog(chunk=chunk, echo=click.echo)
+        if rows:
+            click.echo(f"compacted {rows} rows: {raw} -> {stored} bytes "
+                       f"({(raw - stored) / rows:.0f} bytes/row saved, ratio {stored / raw:.2f})")
+        else:
+            click.echo("nothing to compact")
+        if vacuum and db.engine.dialect.name == "sqlite":
+            with db.engine.connect() as conn: conn.exec_driver_sql("VACUUM")
+
+    @app.cli.command("rollup-compact")
+    def rollup_compact():
+        """Fold settled per-minute rollup rows now (also runs every ROLLUP_COMPACT_INTERVAL)."""
+        from utils.rollups import rollups
+        click.echo(f"folded {rollups.compact()} rollup rows")
+
+    @app.cli.command("rollup-rebuild")
+    @click.option("--chunk", default=5000, show_default=True)
+    def rollup_rebuild(chunk):
+        """Recompute all rollups from EventLog (run once after upgrading; archived rows are not included)."""
+        from utils.rollups import rollups
+        click.echo(f"rebuilt rollups from {rollups.rebuild(chunk=chunk, echo=click.echo)} EventLog rows")
+
+    @app.cli.command("seed-catalog")
+    @click.option("--count", default=12, show_default=True, help="Demo products to create.")
+    @click.option("--reset", is_flag=True, help="Replace the existing catalog.")
+    def seed_catalog(count, reset):
+        """Seed demo products (an empty catalog is also seeded at startup)."""
+        from shop.routes import ensure_seed_products
+        from utils.catalog import catalog
+        ensure_seed_products(count=count, reset=reset)
+        click.echo(f"catalog has {len(catalog.all())} products")
+
+    @app.cli.command("automation-runner")
+    @click.option("--processes", default=0, help="Shard processes (default AUTOMATION_RUNNER_PROCESSES, else one per CPU).")
+    def automation_runner(processes):
+        """Run automation out of process; start/stop it from the dashboard (AUTOMATION_RUNNER=process)."""
+        from utils.runner import RunnerSupervisor
+        ok = RunnerSupervisor(app, processes=processes or app.config.get("AUTOMATION_RUNNER_PROCESSES") or None,
+                              heartbeat=app.config.get("AUTOMATION_RUNNER_HEARTBEAT", 1.0), echo=click.echo).run()
+        if not ok: raise SystemExit(1)
+
+    @app.cli.command("graph-stub")
+    @click.option("--host", default="127.0.0.1", show_default=True)
+    @click.option("--port", default=8765, show_default=True)
+    @click.option("--latency", default="lognormal:40,0.5", show_default=True,
+                  help="fixed:MS, uniform:LO,HI, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or exp:MEAN (milliseconds).")
+    @click.option("--per-event-ms", default=0.05, show_default=True, help="Extra latency per event in a batch.")
+    @click.option("--p429", default=0.0, show_default=True, help="Fraction of calls answered 429 with Retry-After.")
+    @click.option("--p5xx", default=0.0, show_default=True, help="Fraction of calls answered 500/502/503.")
+    @click.option("--p4xx", default=0.0, show_default=True, help="Fraction of calls answered 400 invalid parameter.")
+    @click.option("--rate-limit", default=0.0, show_default=True, help="Calls/sec before 429s (0 = unlimited).")
+    @click.option("--retry-after", default=1, show_default=True, help="Retry-After seconds on 429s.")
+    @click.option("--no-validate", is_flag=True, help="Accept any event payload.")
+    def graph_stub(host, port, latency, per_event_ms, p429, p5xx, p4xx, rate_limit, retry_after, no_validate):
+        """Serve a local Graph /events stand-in; set GRAPH_BASE_URL=http://HOST:PORT/ to send to it."""
+        from werkzeug.serving import run_simple
+        from utils.graph_stub import GraphStub, make_app
+        stub = GraphStub(latency=latency, per_event_ms=per_event_ms, p429=p429, p5xx=p5xx, p4xx=p4xx,
+                         rate_limit=rate_limit, validate=not no_validate, retry_after=retry_after)
+        click.echo(f"Graph stub on http://{host}:{port}/ (stats at /_stub/stats)")
+        run_simple(host, port, make_app(stub), threaded=True)
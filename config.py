@@ -10,6 +10,8 @@ class Config:
     PIXEL_ID = os.getenv("PIXEL_ID", "")
     ACCESS_TOKEN = os.getenv("ACCESS_TOKEN", "")
     GRAPH_VER = os.getenv("GRAPH_VER", "v20.0")
+    # point at `flask graph-stub` (e.g. http://127.0.0.1:8765/) for offline load tests
+    GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.facebook.com/").rstrip("/") + "/"
     TEST_EVENT_CODE = os.getenv("TEST_EVENT_CODE", "")
     BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:5000")
 
@@ -19,5 +21,78 @@ class Config:
 
     # Automation defaults
     AUTOMATION_MAX_CONCURRENCY = int(os.getenv("AUTOMATION_MAX_CONCURRENCY", "4"))
+    AUTOMATION_ARRIVALS = os.getenv("AUTOMATION_ARRIVALS", "poisson")   # poisson | jitter | fixed
+    AUTOMATION_RUNNER = os.getenv("AUTOMATION_RUNNER", "thread")          # thread (in web worker) | process (flask automation-runner)
+    AUTOMATION_RUNNER_PROCESSES = int(os.getenv("AUTOMATION_RUNNER_PROCESSES", "0"))   # 0 = one per CPU
+    AUTOMATION_RUNNER_HEARTBEAT = float(os.getenv("AUTOMATION_RUNNER_HEARTBEAT", "1.0"))
+    # 0 = skip boot-time schema/seed writes and housekeeping threads (retention, rollup compaction,
+    # manual-send executor); set for automation-runner shards, which the supervisor does itself
+    BACKGROUND_SERVICES = os.getenv("BACKGROUND_SERVICES", "1") == "1"
     RATE_LIMIT_QPS_PIXEL = float(os.getenv("RATE_LIMIT_QPS_PIXEL", "5"))
     RATE_LIMIT_QPS_CAPI = float(os.getenv("RATE_LIMIT_QPS_CAPI", "5"))
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "shared")   # shared (all processes on the host) | memory
+    RATE_LIMIT_FILE = os.getenv("RATE_LIMIT_FILE", "")               # default: tempdir, one file per DATABASE_URL
+    CAPI_BATCH_SIZE = int(os.getenv("CAPI_BATCH_SIZE", "100"))          # events per Graph request (max 1000)
+    CAPI_BATCH_LINGER_MS = float(os.getenv("CAPI_BATCH_LINGER_MS", "100"))
+    CAPI_BATCH_WORKERS = int(os.getenv("CAPI_BATCH_WORKERS", "4"))
+    CAPI_SPLIT_DEPTH = int(os.getenv("CAPI_SPLIT_DEPTH", "4"))          # max split levels after a 400 (<= 2**(n+1)-1 requests)
+    CAPI_DISPATCH_WORKERS = int(os.getenv("CAPI_DISPATCH_WORKERS", "4"))   # executor for manual CAPI sends
+    CAPI_JOBS_MAX = int(os.getenv("CAPI_JOBS_MAX", "1000"))               # rows kept in capi_job (shared by all workers)
+
+    # Per-minute rollups (utils/rollups.py)
+    ROLLUP_COMPACT_INTERVAL = float(os.getenv("ROLLUP_COMPACT_INTERVAL", "60"))   # seconds; 0 = CLI only
+    ROLLUP_MINUTE_HOURS = int(os.getenv("ROLLUP_MINUTE_HOURS", "24"))             # then folded into hourly rows
+
+    # Metrics, request sampling and profiling
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")                       # scrapers send "Authorization: Bearer <token>"; unset = admin session only
+    REQUEST_LOG_SAMPLE = float(os.getenv("REQUEST_LOG_SAMPLE", "0.01"))   # share of requests written to RequestLog (5xx always)
+    REQUEST_LOG_BODY_MAX = int(os.getenv("REQUEST_LOG_BODY_MAX", "2000"))
+
+    PROFILE_RING = int(os.getenv("PROFILE_RING", "50"))      # captures kept per process
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")           # if set, the X-Profile header must carry it
+
+    # user_data hashing
+    USER_DATA_CACHE_SIZE = int(os.getenv("USER_DATA_CACHE_SIZE", "4096"))       # (param, raw value) hashes kept per process
+    USER_DATA_IDENTITY_POOL = int(os.getenv("USER_DATA_IDENTITY_POOL", "0"))    # synthetic identities for automation; 0 = none
+
+    # EventLog write-behind queue
+    PAYLOAD_COMPRESSION = os.getenv("PAYLOAD_COMPRESSION", "zlib")            # zlib | off
+    PAYLOAD_COMPRESSION_LEVEL = int(os.getenv("PAYLOAD_COMPRESSION_LEVEL", "6"))
+    EVENTLOG_QUEUE_MAX = int(os.getenv("EVENTLOG_QUEUE_MAX", "20000"))
+    EVENTLOG_BATCH_ROWS = int(os.getenv("EVENTLOG_BATCH_ROWS", "500"))
+    EVENTLOG_FLUSH_INTERVAL = float(os.getenv("EVENTLOG_FLUSH_INTERVAL", "0.5"))
+
+    # Pixel/CAPI dedup window
+    DEDUP_WINDOW_TTL = float(os.getenv("DEDUP_WINDOW_TTL", "900"))
+    DEDUP_WINDOW_MAX = int(os.getenv("DEDUP_WINDOW_MAX", "100000"))
+
+    # Graph HTTP transport (pooled session, retry/backoff, circuit breaker)
+    GRAPH_POOL_SIZE = int(os.getenv("GRAPH_POOL_SIZE", "20"))
+    GRAPH_TIMEOUT = float(os.getenv("GRAPH_TIMEOUT", "10"))
+    GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "3"))
+    GRAPH_BACKOFF_BASE = float(os.getenv("GRAPH_BACKOFF_BASE", "0.25"))
+    GRAPH_BACKOFF_MAX = float(os.getenv("GRAPH_BACKOFF_MAX", "8"))
+    GRAPH_RETRY_BUDGET = float(os.getenv("GRAPH_RETRY_BUDGET", "20"))   # seconds for all attempts of one call
+    GRAPH_BREAKER_THRESHOLD = int(os.getenv("GRAPH_BREAKER_THRESHOLD", "5"))
+    GRAPH_BREAKER_COOLDOWN = float(os.getenv("GRAPH_BREAKER_COOLDOWN", "30"))
+
+    # Settings (KVStore) cache: max staleness for changes made by other workers
+    SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "1.0"))
+
+    # EventLog retention: rows past the max age / beyond the newest max rows go to gzip NDJSON segments
+    # off unless an operator opts in; ARCHIVE_DIR must be on persistent storage (not an ephemeral deploy disk)
+    RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))    # 0 = no age limit
+    RETENTION_MAX_ROWS = int(os.getenv("RETENTION_MAX_ROWS", "0"))             # 0 = no row cap
+    RETENTION_CHUNK_ROWS = int(os.getenv("RETENTION_CHUNK_ROWS", "2000"))
+    RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "300"))         # seconds; 0 = CLI only
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+    # Admin live stream (/admin/api/stream): each open stream holds one gthread worker thread
+    SSE_INTERVAL = float(os.getenv("SSE_INTERVAL", "1.0"))
+    SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", "8"))
+    SSE_QUEUE_MAX = int(os.getenv("SSE_QUEUE_MAX", "500"))
+    SSE_MAX_AGE = float(os.getenv("SSE_MAX_AGE", "300"))
+
+    # Rendered shop page cache (keyed on path, args and catalog version)
+    PAGE_CACHE_MAX = int(os.getenv("PAGE_CACHE_MAX", "256"))
+    PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "300"))
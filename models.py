@@ -2,14 +2,20 @@ from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from extensions import db, login_manager
+from utils.settings_cache import SettingsCache
 
 class KVStore(db.Model):
     __tablename__ = "kvstore"
+    GENERATION_KEY = "settings_generation"
     key = db.Column(db.String(128), primary_key=True)
     value = db.Column(db.Text, nullable=True)
 
     @staticmethod
     def get(key, default=None):
+        return settings_cache.get(key, default)
+
+    @staticmethod
+    def get_raw(key, default=None):
         item = KVStore.query.get(key)
         return item.value if item else default
 
@@ -21,7 +27,24 @@ class KVStore(db.Model):
         else:
             existing = KVStore(key=key, value=value)
             db.session.add(existing)
+        # bump the generation stamp so other workers reload their settings cache
+        gen_key = KVStore.GENERATION_KEY
+        bumped = db.session.execute(
+            KVStore.__table__.update().where(KVStore.key == gen_key)
+            .values(value=db.cast(db.cast(KVStore.value, db.Integer) + 1, db.Text))).rowcount
+        if not bumped:
+            db.session.add(KVStore(key=gen_key, value="1"))
         db.session.commit()
+        settings_cache.put(key, value, KVStore._generation())
+
+    @staticmethod
+    def _generation():
+        try: return int(KVStore.get_raw(KVStore.GENERATION_KEY, 0) or 0)
+        except (TypeError, ValueError): return 0
+
+settings_cache = SettingsCache(
+    load_all=lambda: db.session.query(KVStore.key, KVStore.value).all(),
+    load_generation=KVStore._generation)
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -47,6 +70,28 @@ def ensure_seed_admin():
         db.session.add(u)
         db.session.commit()
 
+def ensure_schema():
+    # create_all() skips columns and indexes on tables that already exist; add them here.
+    # Every worker/shard runs this at boot, so losing the race to another process is fine.
+    from sqlalchemy.exc import DatabaseError
+    insp = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in have: continue
+            ctype = col.type.compile(dialect=db.engine.dialect)
+            try:
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {ctype}')
+            except DatabaseError:
+                # "duplicate column name": another process added it first
+                if col.name not in {c["name"] for c in db.inspect(db.engine).get_columns(table.name)}: raise
+        for idx in table.indexes:
+            try:
+                idx.create(bind=db.engine, checkfirst=True)
+            except DatabaseError:
+                if idx.name not in {i["name"] for i in db.inspect(db.engine).get_indexes(table.name)}: raise
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     sku = db.Column(db.String(64), unique=True, nullable=False)
@@ -57,6 +102,10 @@ class Product(db.Model):
     image_url = db.Column(db.String(512), default="")
 
 class EventLog(db.Model):
+    __table_args__ = (
+        db.Index("ix_eventlog_event_id_channel", "event_id", "channel"),
+        db.Index("ix_eventlog_ts", "ts"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     ts = db.Column(db.DateTime, default=datetime.utcnow)
     channel = db.Column(db.String(16))    # 'pixel' or 'capi'
@@ -65,7 +114,95 @@ class EventLog(db.Model):
     status = db.Column(db.String(64))
     latency_ms = db.Column(db.Integer)
     payload = db.Column(db.Text)
+    payload_z = db.Column(db.LargeBinary)   # compressed payload (utils/payload_codec.py); payload is then NULL
+    error = db.Column(db.Text)
+
+class ArchiveSegment(db.Model):
+    # one gzip NDJSON file of EventLog rows moved out by retention (utils/retention.py)
+    __tablename__ = "archive_segment"
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(512), unique=True, nullable=False)   # relative to ARCHIVE_DIR
+    day = db.Column(db.Date, index=True, nullable=False)
+    min_ts = db.Column(db.DateTime, nullable=False)
+    max_ts = db.Column(db.DateTime, nullable=False)
+    min_id = db.Column(db.Integer)
+    max_id = db.Column(db.Integer)
+    rows = db.Column(db.Integer, default=0)
+    bytes = db.Column(db.Integer, default=0)
+    bloom = db.Column(db.LargeBinary)          # event_id bloom filter
+    bloom_k = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Lease(db.Model):
+    # named cross-process lock (utils/lease.py); a holder that stops renewing loses it at expires_at
+    __tablename__ = "lease"
+    name = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(128))
+    expires_at = db.Column(db.DateTime)
+
+class CapiJob(db.Model):
+    # manual CAPI send run on a dispatch executor (utils/capi_jobs.py); shared so any worker can answer a poll
+    __tablename__ = "capi_job"
+    __table_args__ = (db.Index("ix_capi_job_created", "created"), db.Index("ix_capi_job_finished", "finished"))
+    id = db.Column(db.String(32), primary_key=True)
+    state = db.Column(db.String(16), nullable=False)   # queued | running | done | failed
+    created = db.Column(db.Float, nullable=False)      # epoch seconds
+    started = db.Column(db.Float)
+    finished = db.Column(db.Float)
+    status = db.Column(db.String(64))
+    http_status = db.Column(db.Integer)
+    latency_ms = db.Column(db.Integer)
     error = db.Column(db.Text)
+    meta = db.Column(db.Text)                          # JSON: event_name, event_id, ...
+
+class RunnerControl(db.Model):
+    # desired automation state written by any web worker, read by `flask automation-runner`
+    __tablename__ = "runner_control"
+    id = db.Column(db.Integer, primary_key=True)   # single row, id=1
+    desired = db.Column(db.String(16), default="stopped")
+    generation = db.Column(db.Integer, default=0)  # bumped on every start
+    config = db.Column(db.Text)                    # JSON: rates, max_concurrency, arrivals
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    supervisor = db.Column(db.String(64))          # host:pid of the runner
+    supervisor_seen = db.Column(db.DateTime)
+
+class RunnerShard(db.Model):
+    # heartbeat + progress of one runner process
+    __tablename__ = "runner_shard"
+    shard = db.Column(db.Integer, primary_key=True)
+    pid = db.Column(db.Integer)
+    generation = db.Column(db.Integer)
+    state = db.Column(db.String(16))
+    started_at = db.Column(db.DateTime)
+    heartbeat = db.Column(db.DateTime)
+    stats = db.Column(db.Text)                     # JSON: AutomationScheduler.status()
+
+class ParamCoverage(db.Model):
+    __tablename__ = "param_coverage"
+    channel = db.Column(db.String(16), primary_key=True)
+    event_name = db.Column(db.String(64), primary_key=True)
+    param = db.Column(db.String(32), primary_key=True)   # "_events" holds the per-event total
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+class EventRollup(db.Model):
+    # per-minute ("1m") and per-hour ("1h") EventLog aggregates (utils/rollups.py); several
+    # partial rows may share a key until compaction merges them into one `final` row
+    __tablename__ = "event_rollup"
+    __table_args__ = (db.Index("ix_event_rollup_res_bucket", "res", "bucket"),)
+    id = db.Column(db.Integer, primary_key=True)
+    res = db.Column(db.String(4), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)
+    channel = db.Column(db.String(16), nullable=False)
+    event_name = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(64), nullable=False)
+    final = db.Column(db.Boolean, default=False, nullable=False)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    value_sum = db.Column(db.Float, default=0.0, nullable=False)
+    margin_sum = db.Column(db.Float, default=0.0, nullable=False)
+    pltv_sum = db.Column(db.Float, default=0.0, nullable=False)
+    latency_sum = db.Column(db.Integer, default=0, nullable=False)   # ms
+    latency_max = db.Column(db.Integer, default=0, nullable=False)
+    sketch = db.Column(db.Text)   # JSON {log-bucket index: count}
 
 class RequestLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -1,20 +1,30 @@
-import math, random, uuid, time, json
+import math, random, uuid, time, json, zlib
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, current_app, abort
 from sqlalchemy import func
 from config import Config
 from extensions import db
-from models import Product, Counters, KVStore, EventLog
+from models import Product, KVStore, EventLog
+from utils.eventlog_writer import writer as eventlog_writer
+from utils.dedup import dedup_window
+from utils.counters import counters
+from utils.coverage import coverage
+from utils.catalog import catalog
+from utils.page_cache import page_cache
 
 shop_bp = Blueprint("shop", __name__)
 
 def fmt_currency(value, currency="USD", locale="en_US"):
     return f"{currency} {value:,.2f}"
 
-def ensure_seed_products():
-    if Product.query.count() == 0:
+def ensure_seed_products(count=12, reset=False):
+    """Seed demo products when the catalog is empty (startup, `flask seed-catalog`)."""
+    if reset:
+        Product.query.delete()
+        db.session.commit()
+    if reset or Product.query.count() == 0:
         import random as _r
-        for i in range(1, 12+1):
+        for i in range(1, count+1):
             p = Product(
                 sku=f"SKU{i:03d}",
                 name=f"Product {i}",
@@ -25,31 +35,28 @@ def ensure_seed_products():
             )
             db.session.add(p)
         db.session.commit()
-
-@shop_bp.before_app_request
-def _seed():
-    ensure_seed_products()
-    Counters.get_or_create()
+        catalog.bump()
 
 @shop_bp.route("/")
+@page_cache.cached(version=catalog.current_version)
 def home():
-    products = Product.query.all()
-    return render_template("shop/home.html", products=products, cfg=Config)
+    return render_template("shop/home.html", products=catalog.all(), cfg=Config)
 
 @shop_bp.route("/product/<sku>")
+@page_cache.cached(version=catalog.current_version)
 def product_detail(sku):
-    p = Product.query.filter_by(sku=sku).first_or_404()
+    p = catalog.get(sku)
+    if p is None: abort(404)
     return render_template("shop/product.html", p=p, cfg=Config)
 
+def _cart_items(cart):
+    found = catalog.lookup(cart)
+    items = [(found[sku], qty) for sku, qty in cart.items() if sku in found]
+    return items, sum(prod.price * qty for prod, qty in items)
+
 @shop_bp.route("/cart")
 def cart():
-    cart = session.get("cart", {})
-    items, total = [], 0.0
-    for sku, qty in cart.items():
-        prod = Product.query.filter_by(sku=sku).first()
-        if prod:
-            items.append((prod, qty))
-            total += prod.price * qty
+    items, total = _cart_items(session.get("cart", {}))
     return render_template("shop/cart.html", items=items, total=total, fmt=fmt_currency, cfg=Config)
 
 @shop_bp.route("/add_to_cart/<sku>")
@@ -62,13 +69,7 @@ def add_to_cart(sku):
 
 @shop_bp.route("/checkout", methods=["GET", "POST"])
 def checkout():
-    cart = session.get("cart", {})
-    items, total = [], 0.0
-    for sku, qty in cart.items():
-        prod = Product.query.filter_by(sku=sku).first()
-        if prod:
-            items.append((prod, qty))
-            total += prod.price * qty
+    items, total = _cart_items(session.get("cart", {}))
 
     if request.method == "POST":
         session["cart"] = {}
@@ -81,37 +82,86 @@ def thankyou():
     return render_template("shop/thankyou.html", cfg=Config)
 
 @shop_bp.route("/about")
+@page_cache.cached(version=catalog.current_version)
 def about():
     return render_template("shop/about.html", cfg=Config)
 
 @shop_bp.route("/faq")
+@page_cache.cached(version=catalog.current_version)
 def faq():
     return render_template("shop/faq.html", cfg=Config)
 
 @shop_bp.route("/contact")
+@page_cache.cached(version=catalog.current_version)
 def contact():
     return render_template("shop/contact.html", cfg=Config)
 
 # -------- Pixel beacon collector (client JS sends navigator.sendBeacon/fetch) --------
+# Beacon v1: one JSON event per POST, answered with {"ok": true}.
+# Beacon v2: {"v": 2, "events": [...]} (or a bare array), optionally gzip
+# (Content-Encoding or magic bytes, since sendBeacon cannot set headers),
+# validated in one pass, enqueued in bulk and answered with 204.
+BEACON_MAX_BYTES = 64 * 1024          # on the wire
+BEACON_MAX_INFLATED = 1024 * 1024     # after gunzip
+BEACON_MAX_EVENTS = 200
+
+class BeaconError(ValueError):
+    def __init__(self, msg, status=400):
+        super().__init__(msg); self.status = status
+
+def _beacon_body():
+    if (request.content_length or 0) > BEACON_MAX_BYTES: raise BeaconError("beacon too large", 413)
+    raw = request.get_data(cache=False)
+    if len(raw) > BEACON_MAX_BYTES: raise BeaconError("beacon too large", 413)
+    gzipped = request.headers.get("Content-Encoding", "").lower() == "gzip" or raw[:2] == b"\x1f\x8b"
+    if gzipped:
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try: raw = d.decompress(raw, BEACON_MAX_INFLATED)
+        except zlib.error: raise BeaconError("bad gzip body")
+        if d.unconsumed_tail: raise BeaconError("beacon too large", 413)
+    try: return json.loads(raw or b"{}")
+    except ValueError:
+        if gzipped: raise BeaconError("bad json")
+        return {}   # v1 never rejected an unparseable body: it is logged as an empty beacon
+
+def _beacon_events(body):
+    """(events, is_v2): events are validated dicts with event_name and event_id."""
+    if isinstance(body, list): items, v2 = body, True
+    elif isinstance(body, dict) and isinstance(body.get("events"), list): items, v2 = body["events"], True
+    elif isinstance(body, dict): items, v2 = [body], False
+    else: raise BeaconError("bad beacon")
+    events, rejected = [], 0
+    for ev in items[:BEACON_MAX_EVENTS]:
+        if not isinstance(ev, dict): rejected += 1; continue
+        name, eid = ev.get("event_name") or "PageView", ev.get("event_id") or str(uuid.uuid4())
+        if not isinstance(name, str) or len(name) > 64 or not isinstance(eid, str) or len(eid) > 64:
+            rejected += 1; continue
+        ev["event_name"], ev["event_id"] = name, eid
+        events.append(ev)
+    return events, v2, rejected + max(0, len(items) - BEACON_MAX_EVENTS)
+
 @shop_bp.route("/pixel-collect", methods=["POST"])
 def pixel_collect():
     try:
         start = time.time()
-        payload = request.get_json(force=True, silent=True) or {}
-        eid = payload.get("event_id") or str(uuid.uuid4())
-        event_name = payload.get("event_name","PageView")
+        events, v2, rejected = _beacon_events(_beacon_body())
         latency = int((time.time()-start)*1000)
-        ev = EventLog(ts=datetime.utcnow(), channel="pixel", event_name=event_name,
-                      event_id=eid, status="beacon", latency_ms=latency, payload=json.dumps(payload))
-        db.session.add(ev)
-        c = Counters.get_or_create()
-        c.pixel += 1
-        # dedup check
-        from models import EventLog as EL
-        dup = EL.query.filter_by(event_id=eid, channel="capi").first()
-        if dup:
-            c.dedup += 1
-        db.session.commit()
-        return jsonify({"ok": True})
+        rows = [{"channel": "pixel", "event_name": ev["event_name"], "event_id": ev["event_id"],
+                 "status": "beacon", "latency_ms": latency, "payload": json.dumps(ev)} for ev in events]
+        # a full writer queue takes a prefix of the batch; only what it took is counted
+        accepted = eventlog_writer.record_many(rows)
+        rejected += len(events) - accepted
+        events = events[:accepted]
+        for ev in events: coverage.observe("pixel", ev["event_name"], ev)
+        # dedup check: one lookup for the whole batch
+        dups = dedup_window.check_many([ev["event_id"] for ev in events], "pixel", "capi")
+        counters.incr(pixel=accepted, dedup=sum(dups))
+        if not v2: return jsonify({"ok": True})
+        resp = current_app.response_class(status=204)
+        resp.headers["X-Beacon-Accepted"] = str(accepted)
+        if rejected: resp.headers["X-Beacon-Rejected"] = str(rejected)
+        return resp
+    except BeaconError as e:
+        return jsonify({"ok": False, "error": str(e)}), e.status
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)[:200]}), 400
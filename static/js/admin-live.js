@@ -1,6 +1,58 @@
 (function(){
   const $ = (sel)=>document.querySelector(sel);
 
+  const COVERAGE_PARAMS = ['margin','pltv','value','currency','em','ph','fbp','fbc','client_ip_address','client_user_agent'];
+  function renderCoverage(cov) {
+    const tbody = $('#coverageTable');
+    if (!tbody || !cov || !cov.totals) return;
+    const cell = (ch, p) => {
+      const t = cov.totals[ch] || {}, n = t[p] || 0, total = t._events || 0;
+      return total ? `${n} (${Math.round(100 * n / total)}%)` : '0';
+    };
+    tbody.innerHTML = COVERAGE_PARAMS.map(p =>
+      `<tr><td>${p}</td><td>${cell('pixel', p)}</td><td>${cell('capi', p)}</td></tr>`).join('');
+  }
+
+  const set = (id,val)=>{ const el=$(id); if(el) el.textContent = val; };
+
+  function applyCounters(c) {
+    set('#countPixel', c.pixel);
+    set('#countCapi', c.capi);
+    set('#countDedup', c.dedup);
+    set('#countMarginEvents', c.margin_events || 0);
+    set('#countPLTVEvents', c.pltv_events || 0);
+    renderCoverage(c.coverage);
+  }
+
+  function applyAutomation(s) {
+    const st = $('#autoStatus');
+    if (st) {
+      st.className = 'badge ' + (s.running ? 'text-bg-success' : 'text-bg-secondary');
+      st.textContent = 'Automation: ' + (s.running ? 'Running' : 'Stopped');
+    }
+    const ap = $('#autoPixel'); if (ap) ap.checked = !!s.automation_pixel;
+    const ac = $('#autoCapi');  if (ac) ac.checked = !!s.automation_capi;
+  }
+
+  function applyRates(running, rates) {
+    const el = $('#autoRates');
+    if (!el) return;
+    el.textContent = running ? Object.entries(rates || {}).map(([n, r]) =>
+      `${n} ${r.achieved}/${+r.requested.toFixed(3)} eps` + (r.lagged ? ` (${r.lagged} lagged)` : '')).join(' · ') : '';
+  }
+
+  const esc = (v) => String(v == null ? '' : v).replace(/[&<>"]/g, ch => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}[ch]));
+  function prependRecent(r) {
+    const tbody = $('#recentTable');
+    if (!tbody) return;
+    const tr = document.createElement('tr');
+    tr.innerHTML = `<td>${esc((r.ts || '').replace('T', ' ').slice(0, 19))}</td><td>${esc(r.channel)}</td>` +
+      `<td>${esc(r.event_name)}</td><td>${esc(r.status)}</td><td>${esc(r.latency_ms)}ms</td>`;
+    tbody.prepend(tr);
+    while (tbody.children.length > 20) tbody.lastElementChild.remove();
+  }
+
+  // Fallback when the live stream is unavailable (no EventSource, or server at its subscriber cap)
   async function poll() {
     try {
       const [cRes, sRes] = await Promise.all([
@@ -9,24 +61,8 @@
       ]);
       const c = await cRes.json();
       const s = await sRes.json();
-
-      if (c && c.ok) {
-        const set = (id,val)=>{ const el=$(id); if(el) el.textContent = val; };
-        set('#countPixel', c.pixel);
-        set('#countCapi', c.capi);
-        set('#countDedup', c.dedup);
-        set('#countMarginEvents', c.margin_events || 0);
-        set('#countPLTVEvents', c.pltv_events || 0);
-      }
-      if (s && s.ok) {
-        const st = $('#autoStatus');
-        if (st) {
-          st.className = 'badge ' + (s.running ? 'text-bg-success' : 'text-bg-secondary');
-          st.textContent = 'Automation: ' + (s.running ? 'Running' : 'Stopped');
-        }
-        const ap = $('#autoPixel'); if (ap) ap.checked = !!s.automation_pixel;
-        const ac = $('#autoCapi');  if (ac) ac.checked = !!s.automation_capi;
-      }
+      if (c && c.ok) applyCounters(c);
+      if (s && s.ok) { applyAutomation(s); applyRates(s.running, s.rates); }
     } catch(e) {
       // ignore
     } finally {
@@ -34,6 +70,23 @@
     }
   }
 
+  // One server-side producer pushes counters, automation state, rates and new rows
+  function stream() {
+    if (!window.EventSource) return poll();
+    let automationRunning = false, opened = false;
+    const es = new EventSource('/admin/api/stream');
+    const on = (name, fn) => es.addEventListener(name, (e) => { try { fn(JSON.parse(e.data)); } catch(err) {} });
+    es.onopen = () => { opened = true; };
+    on('counters', applyCounters);
+    on('automation', (s) => { automationRunning = s.running; applyAutomation(s); if (!s.running) applyRates(false); });
+    on('rates', (r) => applyRates(automationRunning, r.automation));
+    on('events', prependRecent);
+    es.onerror = () => {
+      // a refused connection (503, 401) closes the source for good; transient drops reconnect by themselves
+      if (es.readyState === EventSource.CLOSED || !opened) { es.close(); poll(); }
+    };
+  }
+
   function gatherIntervals() {
     const names = ['PageView','ViewContent','AddToCart','InitiateCheckout','AddPaymentInfo','Purchase'];
     const obj = {};
@@ -84,6 +137,6 @@
     }
   });
 
-  // Start polling
-  poll();
+  // Start live updates
+  stream();
 })();
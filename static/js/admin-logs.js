@@ -0,0 +1,86 @@
+(function(){
+  // Infinite scroll over /admin/api/logs (keyset cursor); payloads load on row click.
+  const table = document.getElementById('logTable');
+  if (!table) return;
+  const tbody = table.querySelector('tbody');
+  const sentinel = document.getElementById('logSentinel');
+  const form = document.getElementById('logFilters');
+  const limit = table.dataset.limit || 100;
+  const inspector = !!table.dataset.inspector;
+  let cursor = null, done = false, loading = false, gen = 0;
+
+  const esc = (s) => String(s == null ? '' : s).replace(/[&<>"]/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}[c]));
+
+  function params() {
+    const p = new URLSearchParams({limit});
+    if (form) new FormData(form).forEach((v, k) => { if (v) p.set(k, v); });
+    if (cursor) p.set('cursor', cursor);
+    return p;
+  }
+
+  function row(r) {
+    const tr = document.createElement('tr');
+    tr.dataset.id = r.id;
+    if (inspector) tr.style.cursor = 'pointer';
+    tr.innerHTML = `<td>${esc(r.ts)}</td><td>${esc(r.channel)}</td><td>${esc(r.event_name)}</td>` +
+      `<td class="text-truncate" style="max-width:320px">${esc(r.event_id)}</td>` +
+      `<td${r.has_error ? ' class="text-danger"' : ''}>${esc(r.status)}</td><td>${esc(r.latency_ms)}ms</td>`;
+    return tr;
+  }
+
+  async function load() {
+    if (loading || done) return;
+    loading = true; sentinel.textContent = 'Loading…';
+    const mine = gen;
+    try {
+      const res = await fetch('/admin/api/logs?' + params(), {credentials: 'same-origin'});
+      const d = await res.json();
+      if (mine !== gen) return;
+      if (!d.ok) { sentinel.textContent = d.error || 'Error'; done = true; return; }
+      const frag = document.createDocumentFragment();
+      d.rows.forEach(r => frag.appendChild(row(r)));
+      tbody.appendChild(frag);
+      cursor = d.next; done = !d.next;
+      sentinel.textContent = done ? (tbody.children.length ? 'End of log' : 'No rows') : '';
+    } catch (e) {
+      sentinel.textContent = 'Error loading rows';
+    } finally {
+      loading = false;
+      if (!done && mine === gen && sentinel.getBoundingClientRect().top < window.innerHeight) load();
+    }
+  }
+
+  async function toggleDetail(tr) {
+    const next = tr.nextElementSibling;
+    if (next && next.classList.contains('log-detail')) { next.remove(); return; }
+    const detail = document.createElement('tr');
+    detail.className = 'log-detail';
+    detail.innerHTML = '<td colspan="6" class="small text-muted">Loading…</td>';
+    tr.after(detail);
+    try {
+      const d = await (await fetch('/admin/api/logs/' + tr.dataset.id, {credentials: 'same-origin'})).json();
+      const payload = typeof d.payload === 'string' ? d.payload : JSON.stringify(d.payload, null, 2);
+      detail.innerHTML = `<td colspan="6"><pre class="small mb-1 text-wrap">${esc(payload)}</pre>` +
+        (d.error ? `<div class="small text-danger">${esc(d.error)}</div>` : '') + '</td>';
+    } catch (e) {
+      detail.innerHTML = '<td colspan="6" class="small text-danger">Failed to load payload</td>';
+    }
+  }
+
+  tbody.addEventListener('click', (e) => {
+    const tr = e.target.closest('tr[data-id]');
+    if (tr) toggleDetail(tr);
+  });
+
+  if (form) form.addEventListener('submit', (e) => {
+    e.preventDefault();
+    gen++; cursor = null; done = false; loading = false;
+    tbody.innerHTML = '';
+    load();
+  });
+
+  new IntersectionObserver((entries) => {
+    if (entries.some(en => en.isIntersecting)) load();
+  }).observe(sentinel);
+  load();
+})();
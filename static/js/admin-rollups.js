@@ -0,0 +1,36 @@
+(function(){
+  // Trends card: events per bucket for pixel/CAPI plus CAPI p95 latency, from /admin/api/rollups.
+  const svg = document.getElementById('trendChart');
+  if (!svg) return;
+  const summary = document.getElementById('trendSummary');
+  const range = document.getElementById('trendRange');
+  const W = 600, H = 140, COLORS = {pixel: '#0d6efd', capi: '#198754', p95: '#dc3545'};
+
+  function path(values, max){
+    if (!values.length || !max) return '';
+    const dx = values.length > 1 ? W / (values.length - 1) : 0;
+    return values.map((v, i) => `${i ? 'L' : 'M'}${(i * dx).toFixed(1)},${(H - 4 - (v || 0) / max * (H - 12)).toFixed(1)}`).join('');
+  }
+
+  async function load(){
+    const [res, buckets] = (range ? range.value : '1m:60').split(':');
+    let d;
+    try { d = await (await fetch(`/admin/api/rollups?res=${res}&buckets=${buckets}`)).json(); } catch(e){ return; }
+    if (!d.ok) return;
+    const s = d.series;
+    const col = (ch, k) => s.map(b => (b.channels[ch] || {})[k] || 0);
+    const pixel = col('pixel', 'count'), capi = col('capi', 'count'), p95 = col('capi', 'p95');
+    const max = Math.max(1, ...pixel, ...capi), maxLat = Math.max(1, ...p95);
+    svg.innerHTML = [['pixel', pixel, max], ['capi', capi, max], ['p95', p95, maxLat]]
+      .map(([k, v, m]) => `<path d="${path(v, m)}" fill="none" stroke="${COLORS[k]}" stroke-width="1.5"${k === 'p95' ? ' stroke-dasharray="4 3"' : ''}/>`).join('');
+    const sum = a => a.reduce((x, y) => x + y, 0);
+    const errors = sum(col('capi', 'errors')), total = sum(capi);
+    summary.innerHTML = `<span style="color:${COLORS.pixel}">pixel</span> ${sum(pixel)} · ` +
+      `<span style="color:${COLORS.capi}">capi</span> ${total} (errors ${total ? (100 * errors / total).toFixed(1) : 0}%) · ` +
+      `<span style="color:${COLORS.p95}">capi p95</span> peak ${maxLat > 1 ? maxLat + ' ms' : '—'} · max ${max}/${res === '1h' ? 'hour' : 'min'}`;
+  }
+
+  if (range) range.addEventListener('change', load);
+  load();
+  setInterval(load, 30000);
+})();
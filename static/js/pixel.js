@@ -1,20 +1,54 @@
 (function(){
   const url = "/pixel-collect";
+  // Beacon v2: events are buffered and sent as {v:2, events:[...]} when the
+  // buffer fills, after a short timer, or when the page is hidden/unloaded.
+  const MAX_EVENTS = 20, FLUSH_MS = 2000, GZIP_MIN_BYTES = 1024;
+  let buf = [], timer = null;
+
+  function newId(){
+    return crypto.randomUUID ? crypto.randomUUID() : String(Date.now()) + Math.random();
+  }
+
+  async function post(text){
+    let body = new Blob([text], {type: "application/json"});
+    const headers = {"Content-Type": "application/json"};
+    if (window.CompressionStream && text.length >= GZIP_MIN_BYTES){
+      try {
+        body = await new Response(new Blob([text]).stream().pipeThrough(new CompressionStream("gzip"))).blob();
+        headers["Content-Encoding"] = "gzip";
+      } catch(e){ /* send uncompressed */ }
+    }
+    return fetch(url, {method:"POST", headers, body, keepalive: true, credentials: "same-origin"});
+  }
+
+  function flush(unloading){
+    if (timer){ clearTimeout(timer); timer = null; }
+    if (!buf.length) return;
+    const text = JSON.stringify({v: 2, events: buf});
+    buf = [];
+    try {
+      // while the page goes away only a synchronous sendBeacon reliably leaves
+      if (unloading && navigator.sendBeacon &&
+          navigator.sendBeacon(url, new Blob([text], {type: "application/json"}))) return;
+      post(text).catch(()=>{});
+    } catch(e){ /* swallow */ }
+  }
+
   function send(evtName, meta){
     const data = Object.assign({
       event_name: evtName || "PageView",
-      event_id: crypto.randomUUID ? crypto.randomUUID() : String(Date.now()) + Math.random()
+      event_id: newId()
     }, meta || {});
-    try {
-      if (navigator.sendBeacon){
-        const blob = new Blob([JSON.stringify(data)], {type: "application/json"});
-        navigator.sendBeacon(url, blob);
-      } else {
-        fetch(url, {method:"POST", headers:{"Content-Type":"application/json"}, body: JSON.stringify(data)});
-      }
-    } catch(e){ /* swallow */ }
+    buf.push(data);
+    if (buf.length >= MAX_EVENTS) flush(false);
+    else if (!timer) timer = setTimeout(()=>flush(false), FLUSH_MS);
+    return data.event_id;
   }
   window.demoPixel = send;
+  window.demoPixel.flush = ()=>flush(false);
+  document.addEventListener("visibilitychange", ()=>{ if (document.visibilityState === "hidden") flush(true); });
+  window.addEventListener("pagehide", ()=>flush(true));
+
   // Auto-fire PageView after fetching settings (to respect toggles remotely)
   try {
     fetch('/admin/api/settings').then(r=>r.json()).then(s=>{
@@ -0,0 +1,66 @@
+import hashlib
+import pytest
+from utils.user_data import UserData, _hash, identity_from, normalize
+
+def sha(s): return hashlib.sha256(s.encode()).hexdigest()
+
+@pytest.mark.parametrize("key, raw, expected", [
+    ("em", "  John.Doe@Example.COM ", "john.doe@example.com"),
+    ("ph", "+1 (555) 010-9999", "15550109999"),
+    ("ph", "0044 20 7946 0958", "442079460958"),
+    ("fn", "  Jöhn! ", "jöhn"),
+    ("ln", "O'Brien-Smith", "obriensmith"),
+    ("ct", "San Francisco", "sanfrancisco"),
+    ("ge", "Female", "f"),
+    ("ge", "M", "m"),
+    ("ge", "x", ""),
+    ("db", "1990-01-31", "19900131"),
+    ("db", "19900131", "19900131"),
+    ("db", "01/15/1990", "19900115"),
+    ("db", "01151990", "19900115"),
+    ("db", "31.01.1990", "19900131"),
+    ("db", "31/01/1990", "19900131"),
+    ("db", "1990-13-45", ""),
+    ("db", "2999-01-01", ""),
+    ("st", "CA", "ca"),
+    ("st", "Texas", "tx"),
+    ("st", "New York", "ny"),
+    ("st", "Île-de-France", "îledefrance"),
+    ("st", "Bavaria", "bavaria"),
+    ("zp", "94103-1234", "94103"),
+    ("zp", "941031234", "94103"),
+    ("zp", "SW1A 1AA", "sw1a1aa"),
+    ("country", "US ", "us"),
+    ("country", "United States", "us"),
+    ("country", "USA", "us"),
+    ("country", "Atlantis", ""),
+    ("external_id", " user-42 ", "user-42"),
+])
+def test_normalize(key, raw, expected):
+    assert normalize(key, raw) == expected
+
+@pytest.mark.parametrize("key, raw, expected", [
+    ("em", "A@B.com", sha("a@b.com")),
+    ("st", "Texas", sha("tx")),
+    ("db", "01/15/1990", sha("19900115")),
+    ("em", sha("a@b.com"), sha("a@b.com")),   # already hashed: passed through
+    ("country", "Atlantis", None),            # nothing usable: dropped
+    ("ge", "unknown", None),
+])
+def test_hash(key, raw, expected):
+    assert _hash(key, raw) == expected
+
+def test_identity_aliases_and_blanks():
+    assert identity_from({"email": "a@b.com", "zip": "10001", "phone": "", "foo": 1}) == {"em": "a@b.com", "zp": "10001"}
+
+def test_build_hashes_identity_and_keeps_browser_params():
+    ud = UserData().build({"em": "A@B.com", "country": "Atlantis"}, ua="UA", ip="203.0.113.7", fbp="fb.1.1.1")
+    assert ud == {"client_ip_address": "203.0.113.7", "client_user_agent": "UA", "fbp": "fb.1.1.1", "em": sha("a@b.com")}
+
+def test_hash_many_and_cache_stats():
+    u = UserData(cache_size=8)
+    out = u.hash_many([{"em": "a@b.com"}] * 3 + [{"email": "c@d.com", "ph": ""}])
+    assert out == [{"em": sha("a@b.com")}] * 3 + [{"em": sha("c@d.com")}]
+    u.hash("em", "a@b.com")
+    st = u.stats()
+    assert (st["misses"], st["hits"]) == (2, 1)
@@ -0,0 +1,216 @@
+import gzip, json, os, platform, random, threading, time, uuid
+from datetime import datetime, timedelta
+import requests
+from requests.adapters import BaseAdapter
+from sqlalchemy import func, select
+
+from extensions import db
+from models import EventLog
+from utils.loadgen import percentile
+from utils.payload_codec import payload_codec
+
+# Hot-path benchmarks against an EventLog seeded to each target size.
+# Every case is timed call-by-call (latency percentiles) and then driven
+# from `threads` workers for `seconds` (sustained calls/sec). Graph calls
+# never leave the process: a stub adapter is mounted on the shared
+# graph_transport session for the duration of the run. Point DATABASE_URL
+# at a throwaway database; seeding only ever adds rows.
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+SEED_EVENTS = ["PageView", "ViewContent", "AddToCart", "InitiateCheckout", "AddPaymentInfo", "Purchase"]
+BENCH_HEADERS = {"User-Agent": "Mozilla/5.0 (bench)", "X-Forwarded-For": "203.0.113.7"}
+
+def parse_size(s):
+    s = s.strip().lower()
+    return SIZES[s] if s in SIZES else int(s.replace("_", ""))
+
+# -------------------- Graph stub --------------------
+class StubGraphAdapter(BaseAdapter):
+    """Answers every Graph POST with 200 and events_received after `latency_ms`."""
+    def __init__(self, latency_ms=20.0):
+        super().__init__()
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+
+    def send(self, request, **kw):
+        self.calls += 1
+        if self.latency: time.sleep(self.latency)
+        try: received = len(json.loads(request.body or b"{}").get("data") or [])
+        except Exception: received = 0
+        resp = requests.Response()
+        resp.status_code, resp.url, resp.request = 200, request.url, request
+        resp._content = json.dumps({"events_received": received, "messages": [],
+                                    "fbtrace_id": uuid.uuid4().hex[:11]}).encode()
+        resp.headers["Content-Type"] = "application/json"
+        return resp
+
+    def close(self): pass
+
+# -------------------- Seeding --------------------
+def _seed_row(now, i):
+    name, eid = random.choice(SEED_EVENTS), str(uuid.uuid4())
+    channel = "pixel" if i % 2 else "capi"
+    custom = {"currency": "USD", "value": round(random.uniform(10, 99), 2)}
+    payload = {"event_name": name, "event_id": eid, **custom} if channel == "pixel" else \
+              {"data": [{"event_name": name, "event_id": eid, "action_source": "website",
+                         "user_data": {"client_user_agent": BENCH_HEADERS["User-Agent"]}, "custom_data": custom}]}
+    return {"ts": now - timedelta(seconds=random.randint(0, 30 * 86400)), "channel": channel, "event_name": name,
+            "event_id": eid, "status": "ok" if channel == "pixel" else "dry_run",
+            "latency_ms": random.randint(1, 200), "payload": json.dumps(payload), "error": None}
+
+def eventlog_count():
+    return db.session.execute(select(func.count()).select_from(EventLog.__table__)).scalar() or 0
+
+def seed_eventlog(target, chunk=20_000, echo=None):
+    have = eventlog_count()
+    now, table = datetime.utcnow(), EventLog.__table__
+    while have < target:
+        n = min(chunk, target - have)
+        db.session.execute(table.insert(), [payload_codec.pack(_seed_row(now, have + i)) for i in range(n)])
+        db.session.commit()
+        have += n
+        if echo: echo(f"  seeded {have}/{target}")
+    return have
+
+# -------------------- Cases --------------------
+def _cases(app, client):
+    from admin.routes import send_pixel, send_capi
+    from utils.events import send_capi_event
+
+    def ctx(): return app.test_request_context("/", headers=BENCH_HEADERS)
+    def event(name="Purchase"): return {"event_name": name, "event_id": str(uuid.uuid4()), "currency": "USD", "value": 42.5}
+
+    def check(ok, what):
+        if not ok: raise RuntimeError(f"bench call failed: {what}")
+
+    def pixel():
+        with ctx(): status, _, err = send_pixel(event())
+        check(status == "ok", err)
+    def capi_dry_run():
+        with ctx(): status, _, err = send_capi(event())
+        check(status == "dry_run", err or status)
+    def capi_event():
+        with ctx(): r = send_capi_event("Purchase", str(uuid.uuid4()), {"currency": "USD", "value": 42.5})
+        check(r.get("ok"), r)
+    def pixel_collect():
+        r = client.post("/pixel-collect", json=event(), headers=BENCH_HEADERS); check(r.status_code < 400, r.status_code)
+    def pixel_collect_v2():
+        body = gzip.compress(json.dumps({"v": 2, "events": [event() for _ in range(20)]}).encode())
+        r = client.post("/pixel-collect", data=body, headers={**BENCH_HEADERS, "Content-Type": "application/json",
+                                                              "Content-Encoding": "gzip"})
+        check(r.status_code == 204, r.status_code)
+    def api_counters():
+        r = client.get("/admin/api/counters"); check(r.status_code == 200, r.status_code)
+    def logs():
+        # the page shell plus the first page of rows it fetches
+        r = client.get("/admin/logs"); check(r.status_code == 200, r.status_code)
+        r = client.get("/admin/api/logs?limit=100"); check(r.status_code == 200, r.status_code)
+
+    return {"send_pixel": pixel, "send_capi_dry_run": capi_dry_run, "send_capi_event": capi_event,
+            "pixel_collect": pixel_collect, "pixel_collect_v2": pixel_collect_v2, "api_counters": api_counters, "admin_logs": logs}
+
+def _latency(fn, calls):
+    vals = []
+    for _ in range(calls):
+        t0 = time.perf_counter(); fn()
+        vals.append((time.perf_counter() - t0) * 1000)
+    vals.sort()
+    return {"calls": calls, "mean_ms": round(sum(vals) / len(vals), 3),
+            **{f"p{p}_ms": round(percentile(vals, p), 3) for p in (50, 95, 99)}}
+
+def _throughput(fn, threads, seconds):
+    done, errors, lock = [0], [0], threading.Lock()
+    deadline = time.perf_counter() + seconds
+    def worker():
+        n = e = 0
+        while time.perf_counter() < deadline:
+            try: fn()
+            except Exception: e += 1
+            n += 1
+        with lock: done[0] += n; errors[0] += e
+    started = time.perf_counter()
+    ts = [threading.Thread(target=worker, daemon=True) for _ in range(threads)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    elapsed = time.perf_counter() - started
+    return {"threads": threads, "seconds": round(elapsed, 3), "calls": done[0], "errors": errors[0],
+            "per_sec": round(done[0] / elapsed, 3) if elapsed else 0.0}
+
+class _BenchEnv:
+    """Graph stub, uncapped limiters and a dry-run/live split for the duration of a run."""
+    def __init__(self, graph_latency_ms):
+        self.stub = StubGraphAdapter(graph_latency_ms)
+
+    def __enter__(self):
+        from config import Config
+        from utils.graph_transport import graph_transport
+        from utils.rate_limit import pixel_bucket, capi_bucket
+        from utils.events import graph_base
+        self.session = graph_transport.session
+        # mounted on both bases: send_capi reads Config, send_capi_event reads the environment
+        self.prefixes = {Config.GRAPH_BASE_URL, graph_base()}
+        for prefix in self.prefixes: self.session.mount(prefix, self.stub)
+        # the admin send_capi path dry-runs without Config creds; send_capi_event reads env first
+        self.saved_config = {k: getattr(Config, k, "") for k in ("PIXEL_ID", "ACCESS_TOKEN")}
+        for k in self.saved_config: setattr(Config, k, "")
+        self.saved_env = {k: os.environ.get(k) for k in ("PIXEL_ID", "ACCESS_TOKEN")}
+        os.environ["PIXEL_ID"], os.environ["ACCESS_TOKEN"] = "1234567890", "bench-token"
+        # measure the code, not the configured QPS caps
+        self.buckets = [(b, b.qps, b.capacity) for b in (pixel_bucket, capi_bucket)]
+        for b, _, _ in self.buckets: b.qps, b.capacity, b.tokens = 1e9, 10**9, 10**9
+        return self
+
+    def __exit__(self, *exc):
+        from config import Config
+        for prefix in self.prefixes: self.session.adapters.pop(prefix, None)
+        for k, v in self.saved_config.items(): setattr(Config, k, v)
+        for k, v in self.saved_env.items():
+            if v is None: os.environ.pop(k, None)
+            else: os.environ[k] = v
+        for b, qps, cap in self.buckets: b.qps, b.capacity, b.tokens = qps, cap, cap
+
+def run_bench(app, sizes, calls=200, seconds=5.0, threads=4, cases=None, graph_latency_ms=20.0, echo=None):
+    from utils.eventlog_writer import writer as eventlog_writer
+    client = app.test_client()
+    client.post("/admin/login", data={"username": app.config["ADMIN_USER"], "password": app.config["ADMIN_PASS"]})
+    all_cases = _cases(app, client)
+    selected = {k: v for k, v in all_cases.items() if not cases or k in cases}
+    results = {}
+    with _BenchEnv(graph_latency_ms) as env:
+        for size in sorted(sizes):
+            if echo: echo(f"EventLog -> {size} rows")
+            seed_eventlog(size, echo=echo)
+            eventlog_writer.flush()
+            results[str(size)] = per_size = {}
+            for name, fn in selected.items():
+                fn()   # warm-up
+                lat = _latency(fn, calls)
+                tp = _throughput(fn, threads, seconds)
+                # keep the rows this case produced out of the next one's measurements
+                eventlog_writer.flush()
+                per_size[name] = {"latency": lat, "throughput": tp}
+                if echo: echo(f"  {name}: p50={lat['p50_ms']}ms p95={lat['p95_ms']}ms {tp['per_sec']}/s")
+            per_size["_rows_after"] = eventlog_count()
+        graph_calls = env.stub.calls
+    return {"meta": {"started": datetime.utcnow().isoformat() + "Z", "python": platform.python_version(),
+                     "db": db.engine.url.get_backend_name(), "calls": calls, "seconds": seconds,
+                     "threads": threads, "graph_latency_ms": graph_latency_ms, "graph_stub_calls": graph_calls},
+            "results": results}
+
+# -------------------- Baseline comparison --------------------
+def compare(current, baseline, threshold=0.2):
+    """Regressions where p95 latency grew or throughput fell by more than `threshold` (a fraction)."""
+    regressions = []
+    for size, cases in (current.get("results") or {}).items():
+        base_cases = (baseline.get("results") or {}).get(size) or {}
+        for name, cur in cases.items():
+            base = base_cases.get(name)
+            if name.startswith("_") or not base: continue
+            b95, c95 = base["latency"]["p95_ms"], cur["latency"]["p95_ms"]
+            if b95 and c95 > b95 * (1 + threshold):
+                regressions.append({"size": size, "case": name, "metric": "p95_ms", "baseline": b95, "current": c95,
+                                    "change": round(c95 / b95 - 1, 4)})
+            bt, ct = base["throughput"]["per_sec"], cur["throughput"]["per_sec"]
+            if bt and ct < bt * (1 - threshold):
+                regressions.append({"size": size, "case": name, "metric": "per_sec", "baseline": bt, "current": ct,
+                                    "change": round(ct / bt - 1, 4)})
+    return regressions
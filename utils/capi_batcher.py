@@ -0,0 +1,201 @@
+import atexit, json, re, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from utils.rate_limit import capi_bucket
+from utils.graph_transport import graph_transport, CircuitOpenError
+from utils.metrics import metrics
+
+GRAPH_MAX_BATCH = 1000  # Graph /events accepts at most 1,000 events per call
+_EVENT_INDEX = re.compile(r"\b(?:event|index)\s*#?(\d+)|data\[(\d+)\]", re.I)
+# (#100) subcodes Graph uses when an event fails validation. Other 400s
+# (190 bad token, 10/200 permissions, 100/33 unknown pixel, too many events)
+# apply to the whole call, and splitting the batch would only repeat them.
+PER_EVENT_SUBCODES = {2804050}
+
+def rejected_index(body, n):
+    """Index of the event a Graph 400 names (error_user_msg / message), or None."""
+    err = body.get("error") if isinstance(body, dict) else None
+    if not isinstance(err, dict): return None
+    for text in (err.get("error_user_msg"), err.get("message")):
+        m = _EVENT_INDEX.search(text or "")
+        if m:
+            i = int(m.group(1) or m.group(2))
+            if 0 <= i < n: return i
+    return None
+
+def per_event_error(body):
+    """True when a Graph 400 is an event validation error, i.e. worth splitting the batch for."""
+    err = body.get("error") if isinstance(body, dict) else None
+    return isinstance(err, dict) and err.get("code") == 100 and err.get("error_subcode") in PER_EVENT_SUBCODES
+
+# Groups pending CAPI events per (events URL i.e. pixel ID, token, test code)
+# and posts them as one `data: [...]` request when a group reaches
+# CAPI_BATCH_SIZE or its oldest event has waited CAPI_BATCH_LINGER_MS. Each event gets its own result
+# (status, http_status, latency_ms, error) via a Future and an optional
+# on_done callback that runs inside the app context (EventLog/counters).
+# Graph rejects a whole call when one event is invalid, so on a 400 the
+# named event (or, for a validation error naming none, each half of the
+# batch) is split off and the rest resent: only the bad events end up as
+# http_400. Splits stop CAPI_SPLIT_DEPTH levels down; whole-call errors
+# (token, permissions, pixel) fail the batch with one request.
+class CapiBatcher:
+    def __init__(self, max_batch=100, linger_ms=100, workers=4, limiter=None, split_depth=4):
+        self.max_batch = max_batch
+        self.split_depth = split_depth
+        self.linger = linger_ms / 1000.0
+        self.workers = workers
+        self.limiter = limiter
+        self.app = None
+        self.thread = None
+        self.pool = None
+        self._groups = {}   # key -> [item, ...]
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self.batches = self.events = self.failed_batches = self.resent = 0
+        self.last_batch_size = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.max_batch = max(1, min(GRAPH_MAX_BATCH, int(app.config.get("CAPI_BATCH_SIZE", self.max_batch))))
+        self.linger = float(app.config.get("CAPI_BATCH_LINGER_MS", self.linger * 1000)) / 1000.0
+        self.workers = int(app.config.get("CAPI_BATCH_WORKERS", self.workers))
+        self.split_depth = max(0, int(app.config.get("CAPI_SPLIT_DEPTH", self.split_depth)))
+        if self.thread is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="capi-batch")
+            self.thread = threading.Thread(target=self._run, name="capi-batcher", daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    @property
+    def result_timeout(self):
+        """How long a caller should wait on a submitted event: linger, the transport's retry budget,
+        the limiter wait for the most requests a split batch can make, and slack."""
+        posts = 2 ** (self.split_depth + 1) - 1
+        wait = posts / self.limiter.qps if self.limiter is not None else 0.0
+        return self.linger + graph_transport.budget + wait + 10
+
+    def submit(self, url, token, event, test_event_code="", on_done=None):
+        fut = Future()
+        item = {"event": event, "future": fut, "on_done": on_done, "queued": time.time()}
+        key = (url, token, test_event_code or "")
+        with self._cond:
+            group = self._groups.setdefault(key, [])
+            group.append(item)
+            if len(group) >= self.max_batch: self._cond.notify()
+        if self.thread is None:
+            self.flush()
+        return fut
+
+    # -------------------- Dispatch --------------------
+    def _take_ready(self, force=False):
+        now, ready, wait = time.time(), [], self.linger
+        for key, items in list(self._groups.items()):
+            while items and (force or len(items) >= self.max_batch or now - items[0]["queued"] >= self.linger):
+                ready.append((key, items[:self.max_batch]))
+                del items[:self.max_batch]
+            if items:
+                wait = min(wait, max(0.0, items[0]["queued"] + self.linger - now))
+            else:
+                del self._groups[key]
+        return ready, wait
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                ready, wait = self._take_ready()
+                if not ready:
+                    self._cond.wait(timeout=max(wait, 0.001))
+                    continue
+            for key, batch in ready:
+                self.pool.submit(self._send, key, batch)
+
+    def flush(self):
+        with self._cond:
+            ready, _ = self._take_ready(force=True)
+        for key, batch in ready:
+            self._send(key, batch)
+
+    def _post(self, url, token, test_event_code, batch):
+        data = {"data": [it["event"] for it in batch]}
+        if test_event_code: data["test_event_code"] = test_event_code
+        if self.limiter is not None:
+            self.limiter.acquire()
+        http_status, status, err, body, text = None, "ok", None, {}, ""
+        sent = time.perf_counter()
+        try:
+            resp = graph_transport.post(url, params={"access_token": token}, json=data)
+            http_status, text = resp.status_code, (resp.text or "")[:2000]
+            try: body = resp.json()
+            except Exception: body = {}
+            if not 200 <= resp.status_code < 300:
+                status, err = f"http_{resp.status_code}", text[:1000]
+            elif isinstance(body, dict) and body.get("events_received") not in (None, len(batch)):
+                err = f"events_received={body.get('events_received')} of {len(batch)}"
+        except CircuitOpenError as e:
+            status, err = "circuit_open", str(e)[:1000]
+        except Exception as e:
+            status, err = "error", str(e)[:1000]
+        metrics.capi_latency.observe(time.perf_counter() - sent, status)
+        with self._cond:
+            self.batches += 1; self.last_batch_size = len(batch)
+            if status != "ok": self.failed_batches += 1
+        fbtrace_id = body.get("fbtrace_id") if isinstance(body, dict) else None
+        return {"status": status, "http_status": http_status, "error": err, "fbtrace_id": fbtrace_id,
+                "resp": text, "batch_size": len(batch), "body": body}
+
+    def _send(self, key, batch):
+        url, token, test_event_code = key
+        pending, outcomes, resent = [(batch, 0)], [], set()
+        while pending:
+            part, depth = pending.pop()
+            r = self._post(url, token, test_event_code, part)
+            bad = rejected_index(r["body"], len(part))
+            if r["http_status"] != 400 or len(part) == 1 or depth >= self.split_depth or \
+                    (bad is None and not per_event_error(r["body"])):
+                outcomes += [(it, r) for it in part]
+                continue
+            if bad is not None:
+                outcomes.append((part[bad], r))
+                part = part[:bad] + part[bad + 1:]
+                pending.append((part, depth + 1))
+            else:   # a validation error that names no event: bisect
+                mid = len(part) // 2
+                pending += [(part[mid:], depth + 1), (part[:mid], depth + 1)]
+            resent.update(id(it) for it in part)   # each event counted once however often it is resent
+        with self._cond: self.events += len(batch); self.resent += len(resent)
+        done, by_status = time.time(), {}
+        for _, r in outcomes: by_status[r["status"]] = by_status.get(r["status"], 0) + 1
+        for st, n in by_status.items(): metrics.capi_events.inc(st, n=n)
+        for it, r in outcomes:
+            # EventLog keeps the single-event envelope, as before batching
+            payload = {"data": [it["event"]]}
+            if test_event_code: payload["test_event_code"] = test_event_code
+            result = {k: v for k, v in r.items() if k != "body"}
+            result.update(latency_ms=int((done - it["queued"]) * 1000), payload=json.dumps(payload))
+            self._finish(it, result)
+
+    def _finish(self, it, result):
+        try:
+            if it["on_done"] is not None:
+                if self.app is not None:
+                    with self.app.app_context(): it["on_done"](result)
+                else:
+                    it["on_done"](result)
+        except Exception:
+            pass
+        finally:
+            it["future"].set_result(result)
+
+    def stop(self):
+        self._stop.set()
+        with self._cond: self._cond.notify_all()
+        self.flush()
+        if self.pool is not None: self.pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._cond:
+            pending = sum(len(v) for v in self._groups.values())
+        return {"pending": pending, "batches": self.batches, "events": self.events,
+                "failed_batches": self.failed_batches, "resent": self.resent, "last_batch_size": self.last_batch_size,
+                "max_batch": self.max_batch, "linger_ms": int(self.linger * 1000)}
+
+capi_batcher = CapiBatcher(limiter=capi_bucket)
@@ -0,0 +1,122 @@
+import atexit, json, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from extensions import db
+from models import CapiJob
+
+COLUMNS = ("id", "state", "created", "started", "finished", "status", "http_status", "latency_ms", "error")
+
+# CAPI sends requested from a web request (manual send) run on a dedicated
+# executor instead of the gthread worker that received them: the request
+# returns a job ID at once. The job runs in the worker that accepted it, but
+# its state lives in the capi_job table (bounded to CAPI_JOBS_MAX rows), so
+# with several gunicorn workers any of them can answer a poll, and every
+# worker's live stream picks up finished jobs through the "job" bus source.
+class CapiJobs:
+    def __init__(self, workers=4, max_jobs=1000):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.app = None
+        self.pool = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._announced = {}      # job id -> finished, for the bus source cursor
+        self._cursor = None
+        self.submitted = self.completed = self.failed = 0
+
+    def init_app(self, app, bus=None):
+        self.app = app
+        self.workers = int(app.config.get("CAPI_DISPATCH_WORKERS", self.workers))
+        self.max_jobs = int(app.config.get("CAPI_JOBS_MAX", self.max_jobs))
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="capi-dispatch")
+            atexit.register(self.stop)
+        if bus is not None: bus.add_source("job", self.finished_since, snapshot=False)
+
+    def _write(self, job_id, **values):
+        t = CapiJob.__table__
+        with db.engine.begin() as conn:
+            conn.execute(t.update().where(t.c.id == job_id).values(**values))
+
+    def submit(self, fn, **meta):
+        """Run fn() -> result dict in the app context; returns the job dict (state "queued")."""
+        job = {"id": uuid.uuid4().hex, "state": "queued", "created": time.time(), "started": None,
+               "finished": None, "status": None, "http_status": None, "latency_ms": None, "error": None}
+        t = CapiJob.__table__
+        with db.engine.begin() as conn:
+            conn.execute(t.insert().values(**job, meta=json.dumps(meta)))
+        with self._lock:
+            self.submitted += 1; self._inflight += 1
+            prune = self.submitted % 50 == 0
+        if prune: self._prune()
+        if self.pool is None: self._run(job["id"], fn)
+        else: self.pool.submit(self._run, job["id"], fn)
+        return {**job, **meta}
+
+    def _run(self, job_id, fn):
+        ctx = self.app.app_context() if self.app is not None else None
+        if ctx is not None: ctx.push()
+        try:
+            self._write(job_id, state="running", started=time.time())
+            values = {}
+            try:
+                result = fn()
+                values = {k: result.get(k) for k in ("status", "http_status", "latency_ms", "error")}
+                values["state"] = "done"
+            except Exception as e:
+                values = {"state": "failed", "status": "error", "error": str(e)[:1000]}
+            self._write(job_id, finished=time.time(), **values)
+            with self._lock:
+                if values["state"] == "done": self.completed += 1
+                else: self.failed += 1
+        finally:
+            with self._lock: self._inflight -= 1
+            if ctx is not None: ctx.pop()
+
+    def _prune(self):
+        t = CapiJob.__table__
+        with db.engine.begin() as conn:
+            cut = conn.execute(db.select(t.c.created).order_by(t.c.created.desc())
+                               .offset(self.max_jobs).limit(1)).scalar()
+            if cut is not None: conn.execute(t.delete().where(t.c.created <= cut))
+
+    @staticmethod
+    def view(row):
+        out = {k: row[k] for k in COLUMNS}
+        out.update(json.loads(row["meta"] or "{}"))
+        if row["started"]: out["queue_ms"] = int((row["started"] - row["created"]) * 1000)
+        if row["finished"]: out["total_ms"] = int((row["finished"] - row["created"]) * 1000)
+        return out
+
+    def get(self, job_id):
+        t = CapiJob.__table__
+        row = db.session.execute(t.select().where(t.c.id == job_id)).mappings().first()
+        return self.view(row) if row else None
+
+    def recent(self, limit=50):
+        t = CapiJob.__table__
+        rows = db.session.execute(t.select().order_by(t.c.created.desc()).limit(limit)).mappings().all()
+        return [self.view(r) for r in rows]
+
+    def finished_since(self):
+        """Bus source: jobs finished (by any worker) since the last poll of this process."""
+        t = CapiJob.__table__
+        now = time.time()
+        if self._cursor is None: self._cursor = now
+        # a few seconds of overlap covers jobs committed after a later-finishing one
+        rows = db.session.execute(t.select().where(t.c.finished >= self._cursor - 5)
+                                  .order_by(t.c.finished)).mappings().all()
+        out = [self.view(r) for r in rows if r["id"] not in self._announced]
+        for r in rows: self._announced[r["id"]] = r["finished"]
+        self._announced = {k: f for k, f in self._announced.items() if f >= self._cursor - 10}
+        if rows: self._cursor = max(self._cursor, rows[-1]["finished"])
+        return out
+
+    def stop(self):
+        if self.pool is not None: self.pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self._inflight, "submitted": self.submitted, "completed": self.completed,
+                    "failed": self.failed, "workers": self.workers}
+
+capi_jobs = CapiJobs()
@@ -0,0 +1,59 @@
+import threading, uuid
+from collections import namedtuple
+from models import KVStore, Product
+from extensions import db
+
+CatalogItem = namedtuple("CatalogItem", "id sku name description price currency image_url")
+
+# Whole Product table held in memory as immutable rows. The version stamp is
+# a KVStore key, so checking it is a settings-cache read (no query); any
+# catalog edit calls bump() and every worker reloads on its next lookup.
+class CatalogCache:
+    VERSION_KEY = "catalog_version"
+
+    def __init__(self):
+        self.version = None
+        self._items = []
+        self._by_sku = {}
+        self._lock = threading.Lock()
+        self.hits = self.reloads = 0
+
+    def current_version(self):
+        return KVStore.get(self.VERSION_KEY, "0")
+
+    def _snapshot(self):
+        version = self.current_version()
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    t = Product.__table__
+                    rows = db.session.execute(db.select(*(t.c[f] for f in CatalogItem._fields))
+                                              .order_by(t.c.id)).all()
+                    items = [CatalogItem(*r) for r in rows]
+                    self._items, self._by_sku = items, {it.sku: it for it in items}
+                    self.version = version
+                    self.reloads += 1
+                    return self._items, self._by_sku
+        self.hits += 1
+        return self._items, self._by_sku
+
+    def all(self):
+        return self._snapshot()[0]
+
+    def get(self, sku):
+        return self._snapshot()[1].get(sku)
+
+    def lookup(self, skus):
+        """sku -> item for every known sku, from one snapshot."""
+        by_sku = self._snapshot()[1]
+        return {sku: by_sku[sku] for sku in skus if sku in by_sku}
+
+    def bump(self):
+        """Call after any Product insert/update/delete has been committed."""
+        # a fresh token rather than n+1, so two concurrent edits cannot write the same stamp
+        KVStore.set(self.VERSION_KEY, uuid.uuid4().hex)
+
+    def stats(self):
+        return {"version": self.version, "items": len(self._items), "hits": self.hits, "reloads": self.reloads}
+
+catalog = CatalogCache()
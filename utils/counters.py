@@ -0,0 +1,105 @@
+import abc, threading, time
+from extensions import db
+from models import Counters
+
+COUNTER_FIELDS = ("pixel", "capi", "dedup", "margin_sum", "pltv_sum")
+
+# Per-thread delta shards persisted by the EventLog writer as a flush hook.
+# add() only touches the calling thread's shard (an uncontended lock);
+# prepare() drains every shard, the subclass's apply() writes the merged
+# deltas with atomic `x = x + ?` statements in the flush transaction, and
+# read() pairs the persisted values with the unflushed deltas under a small
+# seqlock so readers never double count a flush in progress.
+class ShardedDeltas(abc.ABC):
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        self._inflight = {}   # taken from the shards, not committed yet
+        self._epoch = 0       # odd while a flush is between prepare() and finish()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {"lock": threading.Lock(), "deltas": {},
+                                         "thread": threading.current_thread()}
+            with self._lock: self._shards.append(shard)
+        return shard
+
+    def add(self, deltas):
+        shard = self._shard()
+        with shard["lock"]:
+            d = shard["deltas"]
+            for k, v in deltas.items():
+                if v: d[k] = d.get(k, 0) + v
+
+    def pending(self):
+        total = {}
+        with self._lock:
+            shards = list(self._shards)
+            for k, v in self._inflight.items(): total[k] = total.get(k, 0) + v
+        for shard in shards:
+            with shard["lock"]:
+                for k, v in shard["deltas"].items(): total[k] = total.get(k, 0) + v
+        return total
+
+    def read(self, load_persisted, retries=20):
+        for _ in range(retries):
+            epoch = self._epoch
+            if epoch % 2 == 0:
+                persisted, pending = load_persisted(), self.pending()
+                if epoch == self._epoch: return persisted, pending
+            time.sleep(0.002)
+        return load_persisted(), self.pending()
+
+    # -------------------- EventLog writer flush hook --------------------
+    def prepare(self):
+        taken = {}
+        self._epoch += 1
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            with shard["lock"]:
+                deltas, shard["deltas"] = shard["deltas"], {}
+            for k, v in deltas.items(): taken[k] = taken.get(k, 0) + v
+        with self._lock:
+            for k, v in taken.items(): self._inflight[k] = self._inflight.get(k, 0) + v
+            # forget shards of threads that have exited once they are drained
+            self._shards = [s for s in self._shards if s["thread"].is_alive() or s["deltas"]]
+        if not taken: self._epoch += 1
+        return taken
+
+    @abc.abstractmethod
+    def apply(self, session, taken):
+        """Write the merged deltas inside the writer's flush transaction."""
+
+    def finish(self, taken, ok):
+        with self._lock:
+            for k, v in taken.items():
+                self._inflight[k] -= v
+                if not self._inflight[k]: del self._inflight[k]
+        if not ok:
+            self.add(taken)   # keep the deltas for the next flush
+        self._epoch += 1
+
+# Lifetime pixel/capi/dedup counters on the singleton Counters row (id=1).
+class ShardedCounters(ShardedDeltas):
+    def incr(self, **deltas):
+        self.add(deltas)
+
+    def _persisted(self):
+        table = Counters.__table__
+        row = db.session.execute(table.select().where(table.c.id == 1)).mappings().first()
+        return {k: ((row[k] if row else 0) or 0) for k in COUNTER_FIELDS}
+
+    def totals(self):
+        persisted, pending = self.read(self._persisted)
+        return {k: persisted[k] + pending.get(k, 0) for k in COUNTER_FIELDS}
+
+    def apply(self, session, taken):
+        table = Counters.__table__
+        values = {k: getattr(table.c, k) + v for k, v in taken.items()}
+        if not session.execute(table.update().where(table.c.id == 1).values(**values)).rowcount:
+            session.add(Counters(id=1, **{k: taken.get(k, 0) for k in COUNTER_FIELDS}))
+
+counters = ShardedCounters()
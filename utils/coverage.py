@@ -0,0 +1,99 @@
+import json
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models import ParamCoverage
+from utils.counters import ShardedDeltas
+
+EVENTS_KEY = "_events"
+CUSTOM_PARAMS = {"margin": "profit_margin", "pltv": "pltv", "value": "value", "currency": "currency"}
+USER_PARAMS = ("em", "ph", "fbp", "fbc", "client_ip_address", "client_user_agent")
+PARAMS = tuple(CUSTOM_PARAMS) + USER_PARAMS
+
+def params_present(payload):
+    """Coverage params carried by a CAPI envelope or a flat pixel payload."""
+    if isinstance(payload, str):
+        try: payload = json.loads(payload)
+        except Exception: return []
+    if not isinstance(payload, dict): return []
+    data = payload.get("data")
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        custom = data[0].get("custom_data") or {}
+        user = data[0].get("user_data") or {}
+    else:
+        custom = user = payload
+    if not isinstance(custom, dict): custom = {}
+    if not isinstance(user, dict): user = {}
+    found = [p for p, key in CUSTOM_PARAMS.items() if custom.get(key) not in (None, "")]
+    found += [p for p in USER_PARAMS if user.get(p) not in (None, "")]
+    return found
+
+# Per-parameter coverage, counted once per event at send time and kept per
+# (channel, event_name). The persisted table is bounded by
+# channels x event names x params, so reading it is O(1) in the log size.
+class Coverage(ShardedDeltas):
+    def observe(self, channel, event_name, payload):
+        deltas = {(channel, event_name, EVENTS_KEY): 1}
+        for p in params_present(payload):
+            deltas[(channel, event_name, p)] = 1
+        self.add(deltas)
+
+    def _persisted(self):
+        rows = db.session.query(ParamCoverage.channel, ParamCoverage.event_name,
+                                ParamCoverage.param, ParamCoverage.count).all()
+        return {(c, e, p): n for c, e, p, n in rows}
+
+    def counts(self):
+        persisted, pending = self.read(self._persisted)
+        for k, v in pending.items(): persisted[k] = persisted.get(k, 0) + v
+        return persisted
+
+    def snapshot(self):
+        """{channel: {event_name: {param: count, "_events": total}}} plus per-channel totals."""
+        by_event, totals = {}, {}
+        for (channel, event_name, param), n in self.counts().items():
+            by_event.setdefault(channel, {}).setdefault(event_name, {})[param] = n
+            t = totals.setdefault(channel, {})
+            t[param] = t.get(param, 0) + n
+        return {"by_event": by_event, "totals": totals}
+
+    def param_total(self, param):
+        return sum(n for (_, _, p), n in self.counts().items() if p == param)
+
+    def apply(self, session, taken):
+        rows = [{"channel": c, "event_name": e or "", "param": p, "count": n} for (c, e, p), n in taken.items()]
+        dialect = session.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert = (sqlite if dialect == "sqlite" else postgresql).insert
+            stmt = insert(ParamCoverage.__table__)
+            stmt = stmt.on_conflict_do_update(index_elements=["channel", "event_name", "param"],
+                                              set_={"count": ParamCoverage.__table__.c.count + stmt.excluded.count})
+            session.execute(stmt, rows)
+            return
+        table = ParamCoverage.__table__
+        for r in rows:
+            upd = table.update().where(table.c.channel == r["channel"], table.c.event_name == r["event_name"],
+                                       table.c.param == r["param"]).values(count=table.c.count + r["count"])
+            if not session.execute(upd).rowcount:
+                session.execute(table.insert(), [r])
+
+    def backfill(self, chunk=5000):
+        """Rebuild the table from existing EventLog payloads (one pass, by id)."""
+        from models import EventLog
+        from utils.payload_codec import payload_codec
+        ParamCoverage.query.delete(); db.session.commit()
+        counts, last_id, scanned = {}, 0, 0
+        while True:
+            rows = (db.session.query(EventLog.id, EventLog.channel, EventLog.event_name,
+                                     EventLog.payload, EventLog.payload_z)
+                    .filter(EventLog.id > last_id).order_by(EventLog.id).limit(chunk).all())
+            if not rows: break
+            for rid, channel, event_name, payload, payload_z in rows:
+                for p in (EVENTS_KEY, *params_present(payload_codec.text(payload, payload_z))):
+                    k = (channel or "", event_name or "", p)
+                    counts[k] = counts.get(k, 0) + 1
+            last_id, scanned = rows[-1][0], scanned + len(rows)
+        if counts:
+            self.apply(db.session, counts); db.session.commit()
+        return scanned
+
+coverage = Coverage()
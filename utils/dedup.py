@@ -0,0 +1,80 @@
+import threading, time
+from collections import OrderedDict
+from models import EventLog
+
+# Time-windowed Pixel/CAPI dedup map: event_id -> channels seen. The first
+# sighting of an event_id costs one indexed lookup (its partner may have been
+# logged by another worker or before a restart); the partner is then answered
+# from memory. Entries are evicted by TTL and size, after which the
+# (event_id, channel) index answers again.
+class DedupWindow:
+    def __init__(self, ttl=900, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # event_id -> (first_seen, set(channels))
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def init_app(self, app):
+        self.ttl = float(app.config.get("DEDUP_WINDOW_TTL", self.ttl))
+        self.max_entries = int(app.config.get("DEDUP_WINDOW_MAX", self.max_entries))
+
+    def _evict(self, now):
+        while self._entries:
+            eid, (seen, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - seen < self.ttl: break
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def check(self, event_id, channel, partner):
+        """Record `channel` for `event_id`; True if `partner` was already seen."""
+        if not event_id: return False
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(event_id)
+            if entry is not None:
+                self.hits += 1
+                entry[1].add(channel)
+                return partner in entry[1]
+            self.misses += 1
+            chans = {channel}
+            self._entries[event_id] = (now, chans)
+            self._evict(now)
+        found = EventLog.query.with_entities(EventLog.id).filter_by(event_id=event_id, channel=partner).first() is not None
+        if found:
+            with self._lock: chans.add(partner)
+        return found
+
+    def check_many(self, event_ids, channel, partner):
+        """check() for a batch: misses are resolved with a single IN lookup."""
+        now, out, missed = time.time(), [], {}
+        with self._lock:
+            for eid in event_ids:
+                if not eid:
+                    out.append(False); continue
+                entry = self._entries.get(eid)
+                if entry is not None:
+                    self.hits += 1
+                    entry[1].add(channel)
+                    out.append(partner in entry[1])
+                    continue
+                self.misses += 1
+                chans = {channel}
+                self._entries[eid] = (now, chans)
+                missed[eid] = chans
+                out.append(None)
+            self._evict(now)
+        found = set()
+        if missed:
+            found = {r[0] for r in EventLog.query.with_entities(EventLog.event_id)
+                     .filter(EventLog.channel == partner, EventLog.event_id.in_(list(missed))).all()}
+            with self._lock:
+                for eid in found: missed[eid].add(partner)
+        return [eid in found if seen is None else seen for eid, seen in zip(event_ids, out)]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "ttl": self.ttl, "max_entries": self.max_entries}
+
+dedup_window = DedupWindow()
@@ -0,0 +1,139 @@
+import json, threading, time
+from collections import deque
+
+# One producer, many SSE subscribers. Sources are polled once per tick by a
+# single thread (and only while someone is subscribed), whatever the number of
+# open dashboards. "Snapshot" topics (counters, automation, rates) are
+# coalesced per subscriber: a slow client only ever gets the newest value.
+# "Stream" topics (new EventLog rows) go into a bounded per-subscriber deque;
+# when it overflows the oldest items are dropped and the client is told how
+# many it missed instead of the producer blocking or memory growing.
+class Subscriber:
+    def __init__(self, max_items):
+        self.cond = threading.Condition()
+        self.snapshots = {}
+        self.items = deque()
+        self.max_items = max_items
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, topic, data, snapshot):
+        with self.cond:
+            if snapshot:
+                self.snapshots[topic] = data
+            else:
+                self.items.append((topic, data))
+                while len(self.items) > self.max_items:
+                    self.items.popleft(); self.dropped += 1
+            self.cond.notify()
+
+    def get(self, timeout):
+        """Pending (topic, data) messages, or [] after `timeout` seconds idle."""
+        with self.cond:
+            if not (self.snapshots or self.items or self.dropped or self.closed):
+                self.cond.wait(timeout)
+            out = list(self.snapshots.items())
+            self.snapshots = {}
+            if self.dropped:
+                out.append(("lagged", {"dropped": self.dropped})); self.dropped = 0
+            while self.items: out.append(self.items.popleft())
+            return out
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+class EventBus:
+    def __init__(self, interval=1.0, max_subscribers=8, max_items=500, max_age=300.0):
+        self.interval = interval
+        self.max_subscribers = max_subscribers
+        self.max_items = max_items
+        self.max_age = max_age   # seconds before a stream is closed so its worker thread is recycled
+        self.app = None
+        self.thread = None
+        self.sources = []        # (topic, fn, snapshot)
+        self.subscribers = set()
+        self.last = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.published = self.rejected = 0
+
+    def init_app(self, app):
+        self.app = app
+        cfg = app.config
+        self.interval = float(cfg.get("SSE_INTERVAL", self.interval))
+        self.max_subscribers = int(cfg.get("SSE_MAX_SUBSCRIBERS", self.max_subscribers))
+        self.max_items = int(cfg.get("SSE_QUEUE_MAX", self.max_items))
+        self.max_age = float(cfg.get("SSE_MAX_AGE", self.max_age))
+
+    def add_source(self, topic, fn, snapshot=True):
+        """fn() -> data for `topic` (None = nothing to send); stream sources return a list of items."""
+        self.sources.append((topic, fn, snapshot))
+
+    # -------------------- Subscribers --------------------
+    def subscribe(self):
+        with self._lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            sub = Subscriber(self.max_items)
+            # a new client starts from the current state rather than waiting for a change
+            for topic, data in self.last.items(): sub.offer(topic, data, True)
+            self.subscribers.add(sub)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+                self.thread.start()
+        self._wake.set()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock: self.subscribers.discard(sub)
+        sub.close()
+
+    def publish(self, topic, data, snapshot=True):
+        if snapshot: self.last[topic] = data
+        with self._lock: subs = list(self.subscribers)
+        for sub in subs: sub.offer(topic, data, snapshot)
+        self.published += 1
+
+    # -------------------- Producer --------------------
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.subscribers:
+                self._wake.clear()
+                self._wake.wait(self.interval * 5)
+                continue
+            start = time.time()
+            with self.app.app_context():
+                for topic, fn, snapshot in self.sources:
+                    try: data = fn()
+                    except Exception: continue
+                    if data is None: continue
+                    if snapshot:
+                        if data != self.last.get(topic): self.publish(topic, data)
+                    else:
+                        for item in data: self.publish(topic, item, snapshot=False)
+            self._stop.wait(max(0.0, self.interval - (time.time() - start)))
+
+    def stream(self, sub, keepalive=15.0):
+        """SSE frames for one subscriber until max_age, then the browser reconnects."""
+        deadline = time.time() + self.max_age
+        try:
+            yield f"retry: {int(self.interval * 3000)}\n\n"
+            while time.time() < deadline and not sub.closed:
+                msgs = sub.get(timeout=min(keepalive, max(0.1, deadline - time.time())))
+                if not msgs:
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(f"event: {topic}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+                              for topic, data in msgs)
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self):
+        return {"subscribers": len(self.subscribers), "max_subscribers": self.max_subscribers,
+                "published": self.published, "rejected": self.rejected, "interval": self.interval}
+
+bus = EventBus()
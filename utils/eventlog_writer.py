@@ -0,0 +1,197 @@
+import atexit, queue, threading, time
+from datetime import datetime
+from sqlalchemy.exc import OperationalError
+from extensions import db
+from models import EventLog
+from utils.payload_codec import payload_codec
+from utils.metrics import metrics
+
+# Write-behind EventLog writer: request and automation threads enqueue rows,
+# one background thread bulk-inserts them (executemany) on a size/time threshold.
+# Flush hooks (objects with prepare()/apply(session, state)/finish(state, ok),
+# and optionally observe_rows(rows) to see each batch before prepare())
+# persist their own in-memory aggregates in the same transaction. Payloads
+# are compressed here, on the writer thread, not by the caller.
+# A failed flush loses nothing it can keep: on OperationalError (e.g. SQLite
+# "database is locked") the batch is kept and retried with backoff, on any
+# other error its rows are inserted one at a time so a bad row only costs
+# itself. Rows dropped that way are taken back out of observe_rows() hooks
+# (forget_rows), so rollups stay in step with EventLog.
+EVENTLOG_COLUMNS = ("ts", "channel", "event_name", "event_id", "status", "latency_ms", "payload", "payload_z", "error")
+
+class EventLogWriter:
+    def __init__(self, max_queue=20000, batch_rows=500, flush_interval=0.5):
+        self.max_queue = max_queue
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.q = queue.Queue(maxsize=max_queue)
+        self.app = None
+        self.thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.hooks = []
+        self._retry = []      # observed rows of a batch that failed transiently, flushed first next time
+        self._backoff = 0.0
+        self.max_backoff = 10.0
+        self.dropped = self.written = self.flushes = self.errors = self.retries = self.rejected = 0
+        self.last_flush_ms = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_rows = int(app.config.get("EVENTLOG_BATCH_ROWS", self.batch_rows))
+        self.flush_interval = float(app.config.get("EVENTLOG_FLUSH_INTERVAL", self.flush_interval))
+        max_queue = int(app.config.get("EVENTLOG_QUEUE_MAX", self.max_queue))
+        if max_queue != self.max_queue and self.q.empty():
+            self.max_queue = max_queue
+            self.q = queue.Queue(maxsize=max_queue)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="eventlog-writer", daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    # -------------------- Producers --------------------
+    def record(self, **row):
+        row.setdefault("ts", datetime.utcnow())
+        row = {k: row.get(k) for k in EVENTLOG_COLUMNS}
+        if self.thread is None:
+            # Not started (scripts, shell): keep the old synchronous behaviour
+            db.session.add(EventLog(**payload_codec.pack(row))); db.session.commit()
+            return True
+        try:
+            self.q.put_nowait(row)
+        except queue.Full:
+            with self._lock: self.dropped += 1
+            return False
+        if self.q.qsize() >= self.batch_rows:
+            self._wake.set()
+        return True
+
+    def record_many(self, rows):
+        """Enqueue several rows at once; returns how many were accepted."""
+        if self.thread is None:
+            for row in rows: self.record(**row)
+            return len(rows)
+        accepted, now = 0, datetime.utcnow()
+        for row in rows:
+            row.setdefault("ts", now)
+            try:
+                self.q.put_nowait({k: row.get(k) for k in EVENTLOG_COLUMNS})
+                accepted += 1
+            except queue.Full:
+                break
+        if accepted < len(rows):
+            with self._lock: self.dropped += len(rows) - accepted
+        if self.q.qsize() >= self.batch_rows:
+            self._wake.set()
+        return accepted
+
+    def add_flush_hook(self, hook):
+        if hook not in self.hooks: self.hooks.append(hook)
+
+    # -------------------- Flushing --------------------
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try: self.flush()
+            except Exception: pass
+            if self._backoff: self._stop.wait(self._backoff)
+
+    def _drain(self, limit):
+        rows = []
+        while len(rows) < limit:
+            try: rows.append(self.q.get_nowait())
+            except queue.Empty: break
+        return rows
+
+    def flush(self):
+        if self.app is None: return 0
+        with self._flush_lock:
+            fresh = self._drain(max(0, self.max_queue - len(self._retry)))
+            for h in self.hooks:
+                if fresh and hasattr(h, "observe_rows"):
+                    try: h.observe_rows(fresh)
+                    except Exception: pass
+            rows, self._retry = self._retry + [payload_codec.pack(r) for r in fresh], []
+            states = [(h, h.prepare()) for h in self.hooks]
+            if not rows and not any(st for _, st in states): return 0
+            start, ok, failure = time.time(), False, None
+            with self.app.app_context():
+                try:
+                    for i in range(0, len(rows), self.batch_rows):
+                        db.session.execute(EventLog.__table__.insert(), rows[i:i + self.batch_rows])
+                    for h, st in states:
+                        if st: h.apply(db.session, st)
+                    db.session.commit()
+                    ok = True
+                    metrics.flush_latency.observe(time.time() - start)
+                    metrics.flush_rows.inc(n=len(rows))
+                    with self._lock:
+                        self.written += len(rows); self.flushes += 1
+                except Exception as e:
+                    db.session.rollback()
+                    failure = e
+                    with self._lock: self.errors += 1
+                finally:
+                    for h, st in states:   # on failure the hooks keep their deltas for the next flush
+                        if st: h.finish(st, ok)
+                if ok or not rows:
+                    self._backoff = 0.0
+                elif isinstance(failure, OperationalError):
+                    self._requeue(rows)
+                else:
+                    self._insert_each(rows)
+            self.last_flush_ms = int((time.time() - start) * 1000)
+            return len(rows)
+
+    def _requeue(self, rows):
+        """Keep a transiently failed batch for the next flush and back off."""
+        self._retry = rows
+        self._backoff = min(self.max_backoff, max(self.flush_interval, self._backoff * 2))
+        with self._lock: self.retries += 1
+
+    def _insert_each(self, rows):
+        """Insert rows one per transaction after a batch failed on a bad row; drop only the rows that fail."""
+        bad = []
+        for i, row in enumerate(rows):
+            try:
+                db.session.execute(EventLog.__table__.insert(), [row])
+                db.session.commit()
+                with self._lock: self.written += 1
+            except OperationalError:
+                db.session.rollback()
+                self._requeue(rows[i:])
+                break
+            except Exception:
+                db.session.rollback()
+                bad.append(row)
+        else:
+            self._backoff = 0.0
+        if not bad: return
+        for h in self.hooks:
+            if hasattr(h, "forget_rows"):
+                try: h.forget_rows(bad)
+                except Exception: pass
+        with self._lock:
+            self.rejected += len(bad); self.dropped += len(bad)
+
+    def stop(self):
+        self._stop.set(); self._wake.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+        self.thread = None
+        for _ in range(3):   # a locked database gets a few tries before exit
+            self.flush()
+            if not self._retry: break
+            time.sleep(self._backoff)
+
+    def stats(self):
+        with self._lock:
+            return {"queue_depth": self.q.qsize(), "queue_max": self.max_queue,
+                    "dropped": self.dropped, "written": self.written, "flushes": self.flushes,
+                    "errors": self.errors, "retries": self.retries, "retrying": len(self._retry),
+                    "rejected": self.rejected, "last_flush_ms": self.last_flush_ms}
+
+writer = EventLogWriter()
@@ -1,17 +1,26 @@
 
 import os, json, time, random, uuid, requests
+from concurrent.futures import TimeoutError as FutureTimeout
 from urllib.parse import urljoin
 from flask import request
 from extensions import db
 from models import KVStore, EventLog
+from utils.eventlog_writer import writer as eventlog_writer
+from utils.capi_batcher import capi_batcher
+from utils.graph_transport import graph_transport
+from utils.coverage import coverage
+from utils.user_data import user_data, HASHED
 
 STANDARD_EVENTS = [
     "PageView","ViewContent","AddToCart","InitiateCheckout","Purchase",
     "Search","Lead","CompleteRegistration","AddPaymentInfo","Contact","Subscribe"
 ]
 
+def graph_base():
+    return (os.getenv('GRAPH_BASE_URL') or 'https://graph.facebook.com/').rstrip('/') + '/'
+
 def graph_url(path=''):
-    base = 'https://graph.facebook.com/'
+    base = graph_base()
     ver = (os.getenv('GRAPH_VER') or KVStore.get('graph_ver','v18.0') or 'v18.0')
     ver = 'v' + str(ver).lstrip('v')
     return urljoin(base, ver + '/' + path.lstrip('/'))
@@ -55,14 +64,10 @@ def build_user_data():
     except Exception: ip = '127.0.0.1'
     fbp = request.cookies.get('_fbp')
     fbc = request.args.get('fbclid')
-    ud = {"client_ip_address": ip, "client_user_agent": ua}
-    if fbp: ud["fbp"] = fbp
-    if fbc: ud["fbc"] = f"fb.1.{int(time.time())}.{fbc}"
-    email = request.args.get('em') or request.form.get('em') or KVStore.get('default_em')
-    phone = request.args.get('ph') or request.form.get('ph') or KVStore.get('default_ph')
-    if email: ud["em"] = email
-    if phone: ud["ph"] = phone
-    return ud
+    identity = {k: request.args.get(k) or request.form.get(k) for k in HASHED}
+    identity["em"] = identity["em"] or KVStore.get('default_em')
+    identity["ph"] = identity["ph"] or KVStore.get('default_ph')
+    return user_data.build(identity, ua=ua, ip=ip, fbp=fbp, fbc=f"fb.1.{int(time.time())}.{fbc}" if fbc else None)
 
 def send_capi_event(event_name, event_id, custom_data, dry_run=False):
     if chaos_behavior().get("drop"):
@@ -83,11 +88,22 @@ def send_capi_event(event_name, event_id, custom_data, dry_run=False):
     tec = get_test_event_code()
     if tec: payload["test_event_code"] = tec
     if chaos_behavior().get("malformed"): payload = {"oops": "bad"}
+    coverage.observe("app" if dry_run else "capi", event_name, payload)
     if dry_run:
         _log("app", event_name, event_id, "dry_run", 0, json.dumps(payload), ""); return {"ok": True, "dry_run": True, "payload": payload}
+    if "data" in payload:
+        fut = capi_batcher.submit(url, token, payload["data"][0], tec,
+            on_done=lambda r: _log("capi", event_name, event_id, "exception" if r["status"] == "error" else r["status"],
+                                   r["latency_ms"], r["payload"], r["error"] or ""))
+        try: r = fut.result(timeout=capi_batcher.result_timeout)
+        except FutureTimeout:   # still in flight; on_done logs the outcome when it lands
+            return {"ok": False, "error": f"no CAPI result within {capi_batcher.result_timeout:.0f}s"}
+        if r["status"] == "error": return {"ok": False, "error": r["error"]}
+        return {"ok": r["status"] == "ok", "status": r["http_status"], "resp": r["resp"]}
+    # chaos_malformed envelopes cannot share a batch; send them on their own
     t0 = time.time()
     try:
-        r = requests.post(url, params={"access_token": token}, json=payload, timeout=8)
+        r = graph_transport.post(url, params={"access_token": token}, json=payload, timeout=8)
         dt = int((time.time()-t0)*1000); ok = r.status_code in (200,201)
         _log("capi", event_name, event_id, "ok" if ok else f"http_{r.status_code}", dt, json.dumps(payload), "" if ok else r.text[:2000])
         return {"ok": ok, "status": r.status_code, "resp": r.text}
@@ -96,7 +112,6 @@ def send_capi_event(event_name, event_id, custom_data, dry_run=False):
 
 def _log(channel, event_name, event_id, status, latency_ms, payload, error):
     try:
-        row = EventLog(channel=channel, event_name=event_name, event_id=event_id, status=str(status),
-                       latency_ms=int(latency_ms or 0), payload=payload, error=error)
-        db.session.add(row); db.session.commit()
+        eventlog_writer.record(channel=channel, event_name=event_name, event_id=event_id, status=str(status),
+                               latency_ms=int(latency_ms or 0), payload=payload, error=error)
     except Exception: pass
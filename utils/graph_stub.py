@@ -0,0 +1,164 @@
+import json, math, random, threading, time, uuid
+from flask import Flask, request
+from utils.rate_limit import TokenBucket
+
+# Local stand-in for Graph `POST /{ver}/{pixel_id}/events`, run with
+# `flask graph-stub` and targeted through GRAPH_BASE_URL, so the real HTTP
+# path (pooled session, batching, retries, breaker) can be benchmarked and
+# soak-tested offline. Per request: a latency drawn from a configurable
+# distribution (plus a per-event cost), optional 429/5xx/4xx injection,
+# Graph-style usage headers from a token bucket, batch-size checks and a
+# schema check of every event, answered with Graph-shaped JSON.
+ACTION_SOURCES = {"website", "app", "email", "phone_call", "chat", "physical_store",
+                  "system_generated", "business_messaging", "other"}
+USER_KEYS = {"em", "ph", "fn", "ln", "ge", "db", "ct", "st", "zp", "country", "external_id",
+             "client_ip_address", "client_user_agent", "fbc", "fbp", "subscription_id", "lead_id"}
+MAX_BATCH = 1000
+
+def parse_latency(spec):
+    """"fixed:MS", "uniform:LO,HI", "normal:MEAN,SD", "lognormal:MEDIAN,SIGMA" or "exp:MEAN" -> fn() -> seconds."""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    a = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+    dists = {
+        "fixed": lambda: a[0],
+        "uniform": lambda: random.uniform(a[0], a[1] if len(a) > 1 else a[0]),
+        "normal": lambda: random.gauss(a[0], a[1] if len(a) > 1 else 0.0),
+        "lognormal": lambda: a[0] * math.exp(random.gauss(0.0, a[1] if len(a) > 1 else 0.5)),
+        "exp": lambda: random.expovariate(1.0 / a[0]) if a[0] > 0 else 0.0,
+    }
+    if kind not in dists: raise ValueError(f"unknown latency distribution {kind!r}")
+    return lambda: max(0.0, dists[kind]()) / 1000.0
+
+def graph_error(status, message, code, subcode=None, transient=False, user_msg=None):
+    err = {"message": message, "type": "OAuthException", "code": code,
+           "is_transient": transient, "fbtrace_id": uuid.uuid4().hex[:11]}
+    if subcode: err["error_subcode"] = subcode
+    if user_msg: err["error_user_msg"] = user_msg
+    return {"error": err}, status
+
+def validate_event(ev, now=None):
+    """Problem with one event as Graph would report it, or None."""
+    now = now or time.time()
+    if not isinstance(ev, dict): return "event must be an object"
+    if not isinstance(ev.get("event_name"), str) or not ev["event_name"]: return "event_name is required"
+    t = ev.get("event_time")
+    if not isinstance(t, int) or isinstance(t, bool): return "event_time must be a unix timestamp in seconds"
+    if t > now + 60: return "event_time is in the future"
+    if t < now - 7 * 86400: return "event_time is more than 7 days old"
+    if ev.get("action_source") not in ACTION_SOURCES: return "action_source is missing or invalid"
+    ud = ev.get("user_data")
+    if not isinstance(ud, dict) or not USER_KEYS.intersection(k for k, v in ud.items() if v):
+        return "user_data needs at least one customer information parameter"
+    if ev["action_source"] == "website" and not ud.get("client_user_agent"):
+        return "client_user_agent is required for website events"
+    cd = ev.get("custom_data")
+    if cd is not None:
+        if not isinstance(cd, dict): return "custom_data must be an object"
+        if "value" in cd:
+            if not isinstance(cd["value"], (int, float)) or isinstance(cd["value"], bool): return "custom_data.value must be a number"
+            if not (isinstance(cd.get("currency"), str) and len(cd["currency"]) == 3): return "custom_data.currency must be an ISO 4217 code"
+    return None
+
+class GraphStub:
+    def __init__(self, latency="lognormal:40,0.5", per_event_ms=0.05, p429=0.0, p5xx=0.0, p4xx=0.0,
+                 rate_limit=0.0, validate=True, retry_after=1):
+        self.latency = parse_latency(latency)
+        self.latency_spec = latency
+        self.per_event = per_event_ms / 1000.0
+        self.p429, self.p5xx, self.p4xx = p429, p5xx, p4xx
+        self.validate = validate
+        self.retry_after = retry_after
+        self.bucket = TokenBucket(rate_limit, name="graph-stub") if rate_limit > 0 else None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.requests, self.events, self.by_status = 0, 0, {}
+
+    def _usage(self, pixel_id):
+        # Graph reports usage as a percentage of the allowance
+        pct = 0
+        if self.bucket is not None:
+            pct = int(round(100 * (1 - max(0.0, self.bucket.tokens) / self.bucket.capacity)))
+        usage = {"call_count": pct, "total_cputime": pct // 2, "total_time": pct // 2}
+        return {"X-App-Usage": json.dumps(usage),
+                "X-Business-Use-Case-Usage": json.dumps({pixel_id: [{
+                    "type": "ads_management", **usage,
+                    "estimated_time_to_regain_access": self.retry_after if pct >= 100 else 0}]})}
+
+    def handle(self, pixel_id, body, token):
+        """(json body, status, extra headers) for one /events call."""
+        if not token: return (*graph_error(400, "An access token is required to request this resource.", 104), {})
+        data = body.get("data") if isinstance(body, dict) else None
+        if not isinstance(data, list) or not data:
+            return (*graph_error(400, "(#100) The parameter data is required", 100), {})
+        if len(data) > MAX_BATCH:
+            return (*graph_error(400, f"(#100) Too many events: at most {MAX_BATCH} per request", 100, 2804019), {})
+        time.sleep(self.latency() + self.per_event * len(data))
+        headers = self._usage(pixel_id)
+        if self.bucket is not None and not self.bucket.take():
+            return (*graph_error(429, "(#4) Application request limit reached", 4, transient=True),
+                    {**headers, "Retry-After": str(self.retry_after)})
+        roll = random.random()
+        if roll < self.p429:
+            return (*graph_error(429, "(#80004) There have been too many calls to this ad-account", 80004, 2446079,
+                                 transient=True), {**headers, "Retry-After": str(self.retry_after)})
+        roll -= self.p429
+        if roll < self.p5xx:
+            status = random.choice((500, 502, 503))
+            return (*graph_error(status, "An unexpected error has occurred. Please retry your request later.", 2,
+                                 transient=True), headers)
+        roll -= self.p5xx
+        if roll < self.p4xx:
+            return (*graph_error(400, "(#100) Invalid parameter", 100, 2804003), headers)
+        messages = []
+        if self.validate:
+            now = time.time()
+            for i, ev in enumerate(data):
+                problem = validate_event(ev, now)
+                if problem:
+                    return (*graph_error(400, "(#100) Invalid parameter", 100, 2804050,
+                                         user_msg=f"event {i}: {problem}"), headers)
+                # Graph accepts these but reports them as diagnostics
+                if ev["action_source"] == "website" and not ev.get("event_source_url"):
+                    messages.append(f"event {i}: event_source_url is recommended for website events")
+        return {"events_received": len(data), "messages": messages, "fbtrace_id": uuid.uuid4().hex[:11]}, 200, headers
+
+    def record(self, status, events):
+        with self._lock:
+            self.requests += 1
+            self.by_status[status] = self.by_status.get(status, 0) + 1
+            if status == 200: self.events += events
+
+    def stats(self):
+        with self._lock:
+            elapsed = max(1e-9, time.time() - self.started)
+            return {"requests": self.requests, "events": self.events, "by_status": dict(self.by_status),
+                    "requests_per_sec": round(self.requests / elapsed, 2), "events_per_sec": round(self.events / elapsed, 2),
+                    "latency": self.latency_spec, "p429": self.p429, "p5xx": self.p5xx, "p4xx": self.p4xx}
+
+def make_app(stub):
+    app = Flask("graph_stub")
+
+    @app.post("/<ver>/<pixel_id>/events")
+    def events(ver, pixel_id):
+        body = request.get_json(silent=True)
+        if body is None and request.form: body = {k: json.loads(v) if k == "data" else v for k, v in request.form.items()}
+        token = request.args.get("access_token") or (body or {}).get("access_token") or \
+            request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        out, status, headers = stub.handle(pixel_id, body or {}, token)
+        stub.record(status, len((body or {}).get("data") or []))
+        return out, status, headers
+
+    @app.get("/_stub/stats")
+    def stats():
+        return stub.stats()
+
+    @app.post("/_stub/reset")
+    def reset():
+        stub.reset()
+        return {"ok": True}
+
+    return app
@@ -0,0 +1,144 @@
+import random, threading, time, requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+# closed -> open after `threshold` consecutive failures; open fast-fails for
+# `cooldown` seconds, then lets a single half-open probe through.
+class CircuitBreaker:
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == "closed": return True
+            if self.state == "open" and time.time() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record(self, ok):
+        with self.lock:
+            self.probing = False
+            if ok:
+                self.state, self.failures = "closed", 0
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state, self.opened_at = "open", time.time()
+
+# One pooled keep-alive session shared by every thread (requests' adapters and
+# urllib3 pools are thread-safe), exponential backoff with full jitter on
+# 429/5xx/connection errors, and a circuit breaker per host. All attempts and
+# backoffs of one call fit in `budget` seconds, so callers waiting on a result
+# (capi_batcher.result_timeout) never give up on a send that is still retrying.
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+class GraphTransport:
+    def __init__(self, pool_size=20, max_retries=3, backoff_base=0.25, backoff_max=8.0,
+                 breaker_threshold=5, breaker_cooldown=30.0, timeout=10.0, budget=20.0):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.timeout = timeout
+        self.budget = budget
+        self._session = None
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.requests = self.retries = self.fast_fails = 0
+
+    def init_app(self, app):
+        cfg = app.config
+        self.pool_size = int(cfg.get("GRAPH_POOL_SIZE", self.pool_size))
+        self.max_retries = int(cfg.get("GRAPH_MAX_RETRIES", self.max_retries))
+        self.backoff_base = float(cfg.get("GRAPH_BACKOFF_BASE", self.backoff_base))
+        self.backoff_max = float(cfg.get("GRAPH_BACKOFF_MAX", self.backoff_max))
+        self.breaker_threshold = int(cfg.get("GRAPH_BREAKER_THRESHOLD", self.breaker_threshold))
+        self.breaker_cooldown = float(cfg.get("GRAPH_BREAKER_COOLDOWN", self.breaker_cooldown))
+        self.timeout = float(cfg.get("GRAPH_TIMEOUT", self.timeout))
+        self.budget = float(cfg.get("GRAPH_RETRY_BUDGET", self.budget))
+        with self._lock:
+            self._session = None
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+                s.mount("https://", adapter); s.mount("http://", adapter)
+                self._session = s
+            return self._session
+
+    def breaker(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            b = self._breakers.get(host)
+            if b is None:
+                b = self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+            return b
+
+    def _backoff(self, attempt, resp=None):
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        try:
+            if retry_after: return min(self.backoff_max, float(retry_after))
+        except ValueError: pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, retries=None, **kw):
+        breaker = self.breaker(url)
+        if not breaker.allow():
+            with self._lock: self.fast_fails += 1
+            raise CircuitOpenError(f"circuit open for {urlsplit(url).netloc}")
+        timeout = kw.pop("timeout", self.timeout)
+        retries = self.max_retries if retries is None else retries
+        deadline = time.monotonic() + self.budget
+        resp, exc, ok = None, None, False
+        try:
+            for attempt in range(retries + 1):
+                if attempt:
+                    pause = self._backoff(attempt - 1, resp)
+                    if time.monotonic() + pause >= deadline - 0.5: break   # no time left for another try
+                    with self._lock: self.retries += 1
+                    time.sleep(pause)
+                left = max(0.5, deadline - time.monotonic())
+                with self._lock: self.requests += 1
+                try:
+                    resp, exc = self.session.request(method, url, timeout=min(timeout, left), **kw), None
+                except TRANSIENT_ERRORS as e:
+                    resp, exc = None, e
+                    continue
+                if resp.status_code not in RETRY_STATUSES:
+                    ok = True
+                    return resp
+            if exc is not None: raise exc
+            return resp
+        finally:
+            # also on unexpected errors, so a half-open probe never stays claimed
+            breaker.record(ok)
+
+    def post(self, url, **kw): return self.request("POST", url, **kw)
+    def get(self, url, **kw): return self.request("GET", url, **kw)
+
+    def stats(self):
+        with self._lock:
+            breakers = {host: b.state for host, b in self._breakers.items()}
+            return {"requests": self.requests, "retries": self.retries, "fast_fails": self.fast_fails,
+                    "pool_size": self.pool_size, "breakers": breakers}
+
+graph_transport = GraphTransport()
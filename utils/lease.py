@@ -0,0 +1,34 @@
+import os, socket, threading
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Lease
+
+# Named leases in the `lease` table, so a background job that every process
+# starts (retention, ...) runs in one of them at a time. acquire() both takes
+# a free or expired lease and renews one already held; a holder that dies
+# simply stops renewing and the lease expires after `ttl` seconds.
+def owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+def acquire(name, owner, ttl):
+    t = Lease.__table__
+    now = datetime.utcnow()
+    until = now + timedelta(seconds=ttl)
+    try:
+        n = db.session.execute(t.update().where(
+            t.c.name == name, or_(t.c.owner == owner, t.c.owner.is_(None), t.c.expires_at < now))
+            .values(owner=owner, expires_at=until)).rowcount
+        if not n:
+            db.session.execute(t.insert().values(name=name, owner=owner, expires_at=until))
+        db.session.commit()
+        return True
+    except IntegrityError:   # the row exists and someone else holds it
+        db.session.rollback()
+        return False
+
+def release(name, owner):
+    t = Lease.__table__
+    db.session.execute(t.update().where(t.c.name == name, t.c.owner == owner).values(owner=None, expires_at=None))
+    db.session.commit()
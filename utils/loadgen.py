@@ -0,0 +1,139 @@
+import math, random, threading, time, uuid
+
+# Funnel-shaped synthetic traffic: N virtual shoppers walk the real shop routes
+# PageView -> ViewContent -> AddToCart -> InitiateCheckout -> AddPaymentInfo
+# -> Purchase, dropping off between steps. Each visit keeps one fbp/IP/UA;
+# every step fires a /pixel-collect beacon and a CAPI send (via
+# /admin/api/manual_send with channels=["capi"]) that share one event_id.
+FUNNEL = ["PageView", "ViewContent", "AddToCart", "InitiateCheckout", "AddPaymentInfo", "Purchase"]
+DEFAULT_CONVERSION = {"ViewContent": 0.7, "AddToCart": 0.35, "InitiateCheckout": 0.6,
+                      "AddPaymentInfo": 0.75, "Purchase": 0.8}
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Mobile Safari/537.36",
+]
+
+def percentile(sorted_vals, pct):
+    if not sorted_vals: return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(pct / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+# -------------------- Clients --------------------
+class HttpClient:
+    """One visitor's cookie jar against a running server."""
+    def __init__(self, base_url, session_cookies=None):
+        import requests
+        self.base = base_url.rstrip("/")
+        self.s = requests.Session()
+        self.etags = {}   # revalidate pages like a browser cache would
+        for k, v in (session_cookies or {}).items(): self.s.cookies.set(k, v)
+
+    def get(self, path, headers=None):
+        headers = dict(headers or {})
+        if path in self.etags: headers["If-None-Match"] = self.etags[path]
+        resp = self.s.get(self.base + path, headers=headers, allow_redirects=False, timeout=30)
+        if resp.headers.get("ETag"): self.etags[path] = resp.headers["ETag"]
+        return resp.status_code
+    def post(self, path, json=None, data=None, headers=None, cookies=None):
+        return self.s.post(self.base + path, json=json, data=data, headers=headers, cookies=cookies,
+                           allow_redirects=False, timeout=30).status_code
+    def cookies(self): return self.s.cookies.get_dict()
+
+class AppClient:
+    """In-process client (Flask test client) for runs without a server."""
+    def __init__(self, app, session_cookies=None):
+        self.c = app.test_client()
+        for k, v in (session_cookies or {}).items(): self.c.set_cookie(k, v)
+
+    def get(self, path, headers=None): return self.c.get(path, headers=headers).status_code
+    def post(self, path, json=None, data=None, headers=None, cookies=None):
+        for k, v in (cookies or {}).items(): self.c.set_cookie(k, v)
+        return self.c.post(path, json=json, data=data, headers=headers).status_code
+    def cookies(self):
+        found = {k: self.c.get_cookie(k) for k in ("session", "remember_token")}
+        return {k: c.value for k, c in found.items() if c is not None}
+
+# -------------------- Shoppers --------------------
+class LoadGenerator:
+    def __init__(self, make_client, shoppers=10, duration=60.0, conversion=None, think=(0.5, 2.0),
+                 skus=None, admin_user="admin", admin_pass="changeme"):
+        self.make_client = make_client
+        self.shoppers = shoppers
+        self.duration = duration
+        self.conversion = {**DEFAULT_CONVERSION, **(conversion or {})}
+        self.think = think
+        self.skus = skus or [f"SKU{i:03d}" for i in range(1, 13)]
+        self.admin_user, self.admin_pass = admin_user, admin_pass
+        self._lock = threading.Lock()
+        self.latencies = {step: [] for step in FUNNEL}
+        self.errors = {step: 0 for step in FUNNEL}
+        self.visits = 0
+
+    def _admin_cookies(self):
+        c = self.make_client()
+        c.post("/admin/login", data={"username": self.admin_user, "password": self.admin_pass})
+        return c.cookies()
+
+    def _visitor(self):
+        return {"fbp": f"fb.1.{int(time.time() * 1000)}.{random.randint(1000000000, 9999999999)}",
+                "ip": f"{random.randint(11, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}",
+                "ua": random.choice(USER_AGENTS)}
+
+    def _step(self, shop, admin, visitor, step, sku, price):
+        headers = {"User-Agent": visitor["ua"], "X-Forwarded-For": visitor["ip"]}
+        event_id = str(uuid.uuid4())
+        custom = {"currency": "USD", "value": price if step in ("AddToCart", "InitiateCheckout", "AddPaymentInfo", "Purchase") else 0}
+        if step == "PageView": codes = [shop.get("/", headers)]
+        elif step == "ViewContent": codes = [shop.get(f"/product/{sku}", headers)]
+        elif step == "AddToCart": codes = [shop.get(f"/add_to_cart/{sku}", headers)]
+        elif step == "Purchase": codes = [shop.post("/checkout", data={}, headers=headers)]
+        else: codes = [shop.get("/checkout", headers)]
+        beacon = shop.post("/pixel-collect", json={"event_name": step, "event_id": event_id, "fbp": visitor["fbp"], **custom},
+                           headers=headers)
+        capi = admin.post("/admin/api/manual_send", json={"event_name": step, "event_id": event_id, "channels": ["capi"], **custom},
+                          headers=headers, cookies={"_fbp": visitor["fbp"]})
+        # a redirect from the admin API means the login cookie was rejected
+        return all(c < 400 for c in codes) and 200 <= beacon < 300 and capi in (200, 202)
+
+    def _shopper(self, deadline, admin_cookies):
+        admin = self.make_client(admin_cookies)
+        while time.time() < deadline:
+            shop, visitor = self.make_client(), self._visitor()
+            sku, price = random.choice(self.skus), round(random.uniform(10, 99), 2)
+            with self._lock: self.visits += 1
+            for i, step in enumerate(FUNNEL):
+                if i and random.random() > self.conversion.get(step, 1.0): break
+                t0 = time.perf_counter()
+                try: ok = self._step(shop, admin, visitor, step, sku, price)
+                except Exception: ok = False
+                ms = (time.perf_counter() - t0) * 1000
+                with self._lock:
+                    self.latencies[step].append(ms)
+                    if not ok: self.errors[step] += 1
+                if time.time() >= deadline: return
+                time.sleep(random.uniform(*self.think))
+
+    def run(self):
+        admin_cookies = self._admin_cookies()
+        started = time.time()
+        deadline = started + self.duration
+        threads = [threading.Thread(target=self._shopper, args=(deadline, admin_cookies), daemon=True)
+                   for _ in range(self.shoppers)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        return self.report(time.time() - started)
+
+    def report(self, elapsed):
+        steps, total = {}, 0
+        for step in FUNNEL:
+            vals = sorted(self.latencies[step]); total += len(vals)
+            steps[step] = {"count": len(vals), "errors": self.errors[step],
+                           "per_sec": round(len(vals) / elapsed, 3) if elapsed else 0.0,
+                           "p50_ms": percentile(vals, 50), "p95_ms": percentile(vals, 95), "p99_ms": percentile(vals, 99)}
+            for k in ("p50_ms", "p95_ms", "p99_ms"):
+                if steps[step][k] is not None: steps[step][k] = round(steps[step][k], 2)
+        return {"shoppers": self.shoppers, "elapsed_s": round(elapsed, 2), "visits": self.visits,
+                "steps_total": total, "steps_per_sec": round(total / elapsed, 3) if elapsed else 0.0,
+                "steps": steps}
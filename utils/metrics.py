@@ -0,0 +1,133 @@
+import bisect, hmac, threading, time
+from flask import g, request, Response
+from flask_login import current_user
+
+# In-process counters and histograms rendered in the Prometheus text format
+# at /metrics. Recording is a dict lookup, a bisect and an increment under
+# a per-metric lock; there is no client library and no background thread.
+# Values are per process: with several gunicorn workers each scrape sees the
+# worker that answered it (the `pid` label tells them apart).
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs: return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, n=1):
+        with self._lock: self._values[label_values] = self._values.get(label_values, 0) + n
+
+    def samples(self):
+        with self._lock: items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in sorted(items)]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None: s = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            s[i] += 1; s[-1] += value
+
+    def samples(self):
+        with self._lock: items = [(k, list(v)) for k, v in self._series.items()]
+        out = []
+        for k, s in sorted(items):
+            cum = 0
+            for le, n in zip((*self.buckets, "+Inf"), s[:-1]):
+                cum += n
+                out.append(f"{self.name}_bucket{_labels(self.labels, k, [('le', le)])} {cum}")
+            out.append(f"{self.name}_sum{_labels(self.labels, k)} {round(s[-1], 6)}")
+            out.append(f"{self.name}_count{_labels(self.labels, k)} {cum}")
+        return out
+
+class Gauge:
+    """Read at scrape time from fn() -> number or {label values tuple: number}."""
+    kind = "gauge"
+
+    def __init__(self, name, doc, fn, labels=()):
+        self.name, self.doc, self.fn, self.labels = name, doc, fn, tuple(labels)
+
+    def samples(self):
+        try: v = self.fn()
+        except Exception: return []
+        if isinstance(v, dict):
+            return [f"{self.name}{_labels(self.labels, k)} {n}" for k, n in sorted(v.items()) if n is not None]
+        return [] if v is None else [f"{self.name} {v}"]
+
+class Metrics:
+    def __init__(self):
+        self._metrics = {}
+        self.token = ""
+        self.pid = None
+        self.http_latency = self.histogram("shop_http_request_duration_seconds",
+            "Request latency by endpoint", ("method", "endpoint", "status"))
+        self.capi_latency = self.histogram("shop_capi_request_duration_seconds",
+            "Graph /events round trip by result status", ("status",))
+        self.capi_events = self.counter("shop_capi_events_total", "CAPI events sent, by result status", ("status",))
+        self.flush_latency = self.histogram("shop_eventlog_flush_duration_seconds",
+            "EventLog writer transaction time (insert + flush hooks + commit)")
+        self.flush_rows = self.counter("shop_eventlog_rows_written_total", "EventLog rows committed")
+        self.ratelimit_wait = self.histogram("shop_ratelimit_wait_seconds",
+            "Time spent waiting for a rate-limit token", ("bucket",), buckets=(0, *LATENCY_BUCKETS))
+
+    def _add(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, doc, labels=()): return self._add(Counter(name, doc, labels))
+    def histogram(self, name, doc, labels=(), buckets=LATENCY_BUCKETS): return self._add(Histogram(name, doc, labels, buckets))
+    def gauge(self, name, doc, fn, labels=()): return self._add(Gauge(name, doc, fn, labels))
+
+    def init_app(self, app):
+        import os
+        self.token = app.config.get("METRICS_TOKEN", "")
+        self.pid = os.getpid()
+        app.before_request(self._start)
+        app.after_request(self._observe)
+        app.add_url_rule("/metrics", "metrics", self.view)
+
+    def _start(self):
+        g._metrics_t0 = time.perf_counter()
+
+    def _observe(self, resp):
+        t0 = g.get("_metrics_t0")
+        if t0 is not None:
+            # endpoint names, not paths, keep the label set bounded
+            self.http_latency.observe(time.perf_counter() - t0, request.method,
+                                      request.endpoint or "unmatched", resp.status_code)
+        return resp
+
+    def render(self):
+        lines = []
+        for m in self._metrics.values():
+            samples = m.samples()
+            if not samples: continue
+            lines += [f"# HELP {m.name} {m.doc}", f"# TYPE {m.name} {m.kind}", *samples]
+        lines.append(f"shop_process_info{_labels(('pid',), (self.pid,))} 1")
+        return "\n".join(lines) + "\n"
+
+    def view(self):
+        # a signed-in admin, or a scraper sending METRICS_TOKEN; closed when neither applies
+        sent = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        allowed = current_user.is_authenticated or bool(self.token and hmac.compare_digest(sent, self.token))
+        if not allowed: return Response("unauthorized\n", 401, mimetype="text/plain")
+        return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+metrics = Metrics()
@@ -0,0 +1,109 @@
+import functools, hashlib, os, threading, time
+from collections import OrderedDict
+from flask import request, make_response
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Rendered-page cache for anonymous shop pages. Entries are keyed on path,
+# query args and a content version (the catalog stamp), hold the body plus a
+# strong ETag, and answer If-None-Match with 304. Static URLs built with
+# url_for('static', ...) carry ?v=<content hash> and are served immutable.
+class PageCache:
+    def __init__(self, max_entries=256, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (stored_at, body, etag, mimetype)
+        self._lock = threading.Lock()
+        self._static = {}                # path -> (mtime, hash)
+        self.static_folder = None
+        self.hits = self.misses = self.not_modified = 0
+
+    def init_app(self, app):
+        self.max_entries = int(app.config.get("PAGE_CACHE_MAX", self.max_entries))
+        self.ttl = float(app.config.get("PAGE_CACHE_TTL", self.ttl))
+        self.static_folder = app.static_folder
+        app.url_defaults(self._fingerprint)
+        app.after_request(self._static_headers)
+
+    # -------------------- Static fingerprints --------------------
+    def static_hash(self, filename):
+        path = os.path.join(self.static_folder, filename)
+        try: mtime = os.stat(path).st_mtime
+        except OSError: return None
+        cached = self._static.get(path)
+        if cached and cached[0] == mtime: return cached[1]
+        with open(path, "rb") as f: digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        self._static[path] = (mtime, digest)
+        return digest
+
+    def _fingerprint(self, endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            digest = self.static_hash(values["filename"])
+            if digest: values["v"] = digest
+
+    def _static_headers(self, resp):
+        if request.endpoint == "static" and resp.status_code in (200, 304):
+            v = request.args.get("v")
+            if v and v == self.static_hash(request.view_args.get("filename", "")):
+                resp.headers["Cache-Control"] = IMMUTABLE
+            else:
+                resp.headers["Cache-Control"] = "no-cache"   # revalidate via ETag/Last-Modified
+        return resp
+
+    # -------------------- Pages --------------------
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None: return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+
+    def cached(self, version=lambda: None):
+        """Cache a GET view's 200 responses; `version()` is part of the key."""
+        def deco(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != "GET": return view(*args, **kwargs)
+                key = (request.path, tuple(sorted(request.args.items(multi=True))), version())
+                entry = self._get(key)
+                if entry is None:
+                    self.misses += 1
+                    resp = make_response(view(*args, **kwargs))
+                    if resp.status_code != 200 or resp.is_streamed: return resp
+                    body = resp.get_data()
+                    entry = (time.monotonic(), body, hashlib.sha256(body).hexdigest()[:32], resp.mimetype)
+                    self._put(key, entry)
+                else:
+                    self.hits += 1
+                _, body, etag, mimetype = entry
+                if request.if_none_match.contains(etag):
+                    self.not_modified += 1
+                    resp = make_response("", 304)
+                else:
+                    resp = make_response(body)
+                    resp.mimetype = mimetype
+                resp.set_etag(etag)
+                resp.headers["Cache-Control"] = "no-cache"
+                return resp
+            return wrapper
+        return deco
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "not_modified": self.not_modified, "hit_rate": round(self.hits / total, 4) if total else None,
+                "ttl": self.ttl}
+
+page_cache = PageCache()
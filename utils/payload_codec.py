@@ -0,0 +1,104 @@
+import threading, zlib
+
+# Compact EventLog payload storage. Payloads are deflated with a preset
+# dictionary holding the boilerplate every envelope repeats (keys,
+# action_source, event_source_url, common user agents, fbp/fbc prefixes),
+# so even a single ~400-byte row compresses well; there is no per-row
+# template to keep in sync. Stored blobs carry a one-byte dictionary version
+# so the dictionary can change without rewriting old rows. Rows whose blob
+# would not be smaller keep plain text in `payload`.
+VERSION = 1
+
+# zlib favours matches near the end of the dictionary: most common strings last
+_ZDICT_V1 = (
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Mobile Safari/537.36'
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148'
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15'
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36'
+    '"Mozilla/5.0 (Server Automation)", "python-requests/2.x", "Mozilla/5.0"'
+    '"ViewContent", "AddToCart", "InitiateCheckout", "AddPaymentInfo", "Purchase", "Lead", "Search", '
+    '"Contact", "Subscribe", "CompleteRegistration", "PageView", "path": "/", "fbp": "fb.1.17'
+    '{"oops": "bad"}{"data": [{"event_name": "PageView", "event_time": 17, "event_id": "", '
+    '"action_source": "website", "event_source_url": "https://example.com", "user_data": '
+    '{"client_ip_address": "127.0.0.1", "client_user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+    'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36", "em": "", "ph": "", '
+    '"fbc": "fb.1.17", "fbp": "fb.1.17"}, "custom_data": {"currency": "USD", "value": 0.0, '
+    '"profit_margin": , "pltv": }}], "test_event_code": "TEST'
+    '{"event_name": "PageView", "event_id": "", "currency": "USD", "value": 0.0, "profit_margin": , "pltv": }'
+).encode()
+_ZDICTS = {1: _ZDICT_V1}
+
+class PayloadCodec:
+    def __init__(self, mode="zlib", level=6):
+        self.mode = mode      # "zlib" | "off"
+        self.level = level
+        self._lock = threading.Lock()
+        self.rows = self.raw_bytes = self.stored_bytes = 0
+
+    def init_app(self, app):
+        self.mode = app.config.get("PAYLOAD_COMPRESSION", self.mode)
+        self.level = int(app.config.get("PAYLOAD_COMPRESSION_LEVEL", self.level))
+
+    @property
+    def enabled(self):
+        return self.mode == "zlib"
+
+    def encode(self, text):
+        """Compressed blob for `text`, or None when it is not worth storing compressed."""
+        if not text: return None
+        raw = text.encode("utf-8")
+        c = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=_ZDICTS[VERSION])
+        blob = bytes([VERSION]) + c.compress(raw) + c.flush()
+        return blob if len(blob) < len(raw) else None
+
+    def decode(self, blob):
+        d = zlib.decompressobj(-15, zdict=_ZDICTS[blob[0]])
+        return (d.decompress(blob[1:]) + d.flush()).decode("utf-8")
+
+    def text(self, payload, payload_z):
+        """The payload of a row, whichever column holds it."""
+        if payload_z: return self.decode(bytes(payload_z))
+        return payload
+
+    def pack(self, row):
+        """Move row["payload"] into row["payload_z"] when compression pays off (in place)."""
+        text = row.get("payload")
+        if not self.enabled or not text or row.get("payload_z"): return row
+        blob = self.encode(text)
+        with self._lock:
+            self.rows += 1
+            self.raw_bytes += len(text.encode("utf-8"))
+            self.stored_bytes += len(blob) if blob else len(text.encode("utf-8"))
+        if blob: row["payload"], row["payload_z"] = None, blob
+        return row
+
+    def stats(self):
+        with self._lock: rows, raw, stored = self.rows, self.raw_bytes, self.stored_bytes
+        return {"mode": self.mode, "rows": rows, "raw_bytes": raw, "stored_bytes": stored,
+                "saved_per_row": round((raw - stored) / rows, 1) if rows else None,
+                "ratio": round(stored / raw, 3) if raw else None}
+
+payload_codec = PayloadCodec()
+
+def compact_eventlog(chunk=2000, echo=None):
+    """Compress plain-text EventLog payloads in place, chunk by chunk; returns (rows, raw_bytes, stored_bytes)."""
+    from extensions import db
+    from models import EventLog
+    t = EventLog.__table__
+    upd = t.update().where(t.c.id == db.bindparam("_id")).values(payload=None, payload_z=db.bindparam("_z"))
+    last_id = rows = raw = stored = 0
+    while True:
+        batch = db.session.execute(db.select(t.c.id, t.c.payload).where(t.c.id > last_id, t.c.payload_z.is_(None),
+                                   t.c.payload.isnot(None)).order_by(t.c.id).limit(chunk)).all()
+        if not batch: break
+        changes = []
+        for rid, text in batch:
+            n = len(text.encode("utf-8")); raw += n; rows += 1
+            blob = payload_codec.encode(text)
+            stored += len(blob) if blob else n
+            if blob: changes.append({"_id": rid, "_z": blob})
+        if changes: db.session.execute(upd, changes)
+        db.session.commit()
+        last_id = batch[-1][0]
+        if echo: echo(f"  {rows} rows, {raw - stored} bytes saved")
+    return rows, raw, stored
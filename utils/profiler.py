@@ -0,0 +1,172 @@
+import contextlib, cProfile, itertools, marshal, os, pstats, random, threading, time
+from collections import deque
+from datetime import datetime
+from flask import g, request
+
+# On-demand cProfile captures, switched on from Admin -> Profiler. Triggers:
+# a sample rate of requests, a request header (X-Profile), or a time window
+# over automation_worker calls (those are merged into one capture per window).
+# Settings live in KVStore, so every worker picks them up; each worker reads
+# them at most once a second, and when nothing is armed the hooks only compare
+# a timestamp. Captures are kept in a bounded per-process ring. With
+# AUTOMATION_RUNNER=process, automation_worker runs in the runner's shard
+# processes, whose rings the web UI cannot read, so the window is disabled.
+HEADER = "X-Profile"
+_NULL = contextlib.nullcontext()
+
+class Profiler:
+    def __init__(self, ring=50):
+        self.ring = deque(maxlen=ring)
+        self.token = ""
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._next_refresh = 0.0
+        self.rate, self.header, self.window_until = 0.0, False, 0.0
+        self._window = None   # {"until", "started", "stats", "calls", "ms"} while a window is collecting
+        self.captured = self.busy = 0
+        self.window_enabled = True
+
+    def init_app(self, app):
+        self.ring = deque(maxlen=int(app.config.get("PROFILE_RING", self.ring.maxlen)))
+        self.token = app.config.get("PROFILE_TOKEN", "")
+        self.window_enabled = app.config.get("AUTOMATION_RUNNER", "thread") != "process"
+        app.before_request(self._before)
+        app.teardown_request(self._teardown)
+
+    # -------------------- Settings --------------------
+    def _refresh(self):
+        now = time.monotonic()
+        if now < self._next_refresh: return
+        self._next_refresh = now + 1.0
+        from models import KVStore
+        try:
+            self.rate = float(KVStore.get("profile_rate", "0") or 0)
+            self.header = KVStore.get("profile_header", "0") == "1"
+            self.window_until = float(KVStore.get("profile_automation_until", "0") or 0)
+        except Exception:
+            pass
+
+    def configure(self, rate=None, header=None, window_seconds=None):
+        """Persist trigger settings (rate is a fraction of requests, 0 = off)."""
+        from models import KVStore
+        if rate is not None: KVStore.set("profile_rate", str(max(0.0, min(1.0, float(rate)))))
+        if header is not None: KVStore.set("profile_header", "1" if header else "0")
+        if window_seconds is not None and (self.window_enabled or window_seconds <= 0):
+            KVStore.set("profile_automation_until", str(time.time() + float(window_seconds) if window_seconds > 0 else 0))
+        self._next_refresh = 0.0
+        self._refresh()
+
+    def settings(self):
+        self._refresh()
+        left = self.window_until - time.time()
+        return {"rate": self.rate, "header": self.header, "window_enabled": self.window_enabled,
+                "window_left": round(left, 1) if left > 0 and self.window_enabled else 0}
+
+    # -------------------- Requests --------------------
+    def _wanted(self):
+        if self.header and HEADER in request.headers:
+            return not self.token or request.headers[HEADER] == self.token
+        return self.rate > 0 and random.random() < self.rate
+
+    def _before(self):
+        self._refresh()
+        if not (self.rate > 0 or self.header) or request.endpoint in ("static", "metrics"): return
+        if not self._wanted(): return
+        prof = cProfile.Profile()
+        try: prof.enable()
+        except ValueError:   # Python 3.12+: only one profiler can be active at a time
+            self.busy += 1; return
+        g._profile = (prof, time.perf_counter())
+
+    def _teardown(self, exc):
+        cap = g.pop("_profile", None)
+        if cap is None: return
+        prof, t0 = cap
+        prof.disable()
+        self._store("request", f"{request.method} {request.path}", pstats.Stats(prof),
+                    (time.perf_counter() - t0) * 1000, 1, datetime.utcnow())
+
+    # -------------------- Automation window --------------------
+    def automation(self):
+        """Context manager for one automation_worker call; a no-op outside a window."""
+        if not self.window_enabled: return _NULL
+        self._refresh()
+        if self.window_until <= time.time():
+            if self._window is not None: self._close_window()
+            return _NULL
+        return self._profiled_call()
+
+    @contextlib.contextmanager
+    def _profiled_call(self):
+        prof = cProfile.Profile()
+        try: prof.enable()
+        except ValueError:
+            self.busy += 1; yield; return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            prof.disable()
+            ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                w = self._window
+                if w is None or w["until"] != self.window_until:
+                    if w is not None: self._close_window(locked=True)
+                    w = self._window = {"until": self.window_until, "started": datetime.utcnow(),
+                                        "stats": pstats.Stats(prof), "calls": 0, "ms": 0.0}
+                else:
+                    w["stats"].add(prof)
+                w["calls"] += 1; w["ms"] += ms
+
+    def _close_window(self, locked=False):
+        with (contextlib.nullcontext() if locked else self._lock):
+            w, self._window = self._window, None
+        if w is not None:
+            self._store("automation", f"automation_worker x{w['calls']}", w["stats"], w["ms"], w["calls"], w["started"])
+
+    # -------------------- Ring --------------------
+    def _store(self, kind, label, stats, ms, calls, started):
+        entry = {"id": next(self._ids), "kind": kind, "label": label, "started": started.isoformat(),
+                 "duration_ms": round(ms, 1), "calls": calls, "functions": len(stats.stats), "_stats": stats}
+        self.ring.append(entry)
+        self.captured += 1
+
+    def entries(self):
+        if self._window is not None and self.window_until <= time.time(): self._close_window()
+        return [{k: v for k, v in e.items() if k != "_stats"} for e in reversed(self.ring)]
+
+    def _stats(self, ids=None):
+        picked = [e["_stats"] for e in list(self.ring) if ids is None or e["id"] in ids]
+        if not picked: return None
+        agg = pstats.Stats()
+        agg.add(*picked)
+        return agg
+
+    def dump(self, profile_id):
+        """pstats file contents (marshal of Stats.stats) for one capture, or None."""
+        st = self._stats({profile_id})
+        return marshal.dumps(st.stats) if st else None
+
+    def top(self, ids=None, sort="cumulative", limit=30):
+        """Aggregated top functions across the selected captures (all if ids is None)."""
+        st = self._stats(ids)
+        if st is None: return []
+        root = os.getcwd() + os.sep
+        rows = []
+        for (filename, line, name), (cc, nc, tt, ct, _) in st.stats.items():
+            where = filename[len(root):] if filename.startswith(root) else \
+                os.sep.join(filename.split(os.sep)[-2:]) if filename.startswith(os.sep) else filename
+            rows.append({"function": f"{where}:{line}({name})" if line else name,
+                         "ncalls": nc, "primitive": cc, "tottime": round(tt, 6), "cumtime": round(ct, 6),
+                         "percall_ms": round(ct / nc * 1000, 3) if nc else 0})
+        key = "tottime" if sort in ("self", "tottime") else "cumtime"
+        rows.sort(key=lambda r: r[key], reverse=True)
+        return rows[:limit]
+
+    def clear(self):
+        self.ring.clear()
+
+    def stats(self):
+        return {"captures": len(self.ring), "captured": self.captured, "busy": self.busy, **self.settings()}
+
+profiler = Profiler()
@@ -0,0 +1,117 @@
+import hashlib, os, struct, tempfile, time, threading
+from config import Config
+from utils.metrics import metrics
+try:
+    import fcntl, mmap
+except ImportError:   # non-POSIX: only the in-process bucket is available
+    fcntl = mmap = None
+
+# take() is the non-blocking check. acquire() claims the next token and
+# sleeps exactly until it is due: tokens may go negative, so concurrent
+# callers queue up behind each other instead of spin-polling take().
+class _Bucket:
+    def take(self):
+        return self._locked(lambda t: (True, t - 1) if t >= 1 else (False, t))
+
+    def wait_time(self):
+        """Seconds until a token is available (0.0 = now); claims nothing."""
+        return self._locked(lambda t: (max(0.0, (1 - t) / self.qps), t))
+
+    def reserve(self, max_wait=None):
+        """Claim the next token; seconds to wait before using it, or None if that exceeds max_wait."""
+        def claim(t):
+            wait = max(0.0, (1 - t) / self.qps)
+            if max_wait is not None and wait > max_wait: return None, t
+            return wait, t - 1
+        return self._locked(claim)
+
+    def acquire(self, timeout=None):
+        wait = self.reserve(timeout)
+        if wait is None: return False
+        if wait > 0: time.sleep(wait)
+        metrics.ratelimit_wait.observe(wait, self.name)
+        return True
+
+class TokenBucket(_Bucket):
+    def __init__(self, qps, burst=None, name="default"):
+        self.name = name
+        self.qps = float(qps or 1.0)
+        self.capacity = burst or max(1, int(self.qps * 2))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _locked(self, fn):
+        with self.lock:
+            now = time.monotonic()
+            result, self.tokens = fn(min(self.capacity, self.tokens + (now - self.updated) * self.qps))
+            self.updated = now
+            return result
+
+# Same bucket, but its state (tokens, last refill) lives in a small mmap'd
+# file shared by every gunicorn worker and automation process on the host,
+# so the QPS cap is global rather than per process. Each bucket owns one
+# 64-byte slot guarded by an fcntl record lock (other processes) plus a
+# thread lock (record locks do not exclude threads of the same process).
+# The refill clock is CLOCK_MONOTONIC, which is system-wide.
+SLOT = 64
+_SLOT_FMT = "dd"   # tokens, updated (0.0 = not initialised yet)
+SLOTS = {"pixel": 0, "capi": 1}
+
+def default_limiter_path():
+    tag = hashlib.sha1(str(getattr(Config, "SQLALCHEMY_DATABASE_URI", "")).encode()).hexdigest()[:10]
+    return os.path.join(tempfile.gettempdir(), f"shop-ratelimit-{tag}.bin")
+
+class SharedTokenBucket(_Bucket):
+    def __init__(self, path, slot, qps, burst=None, name="default"):
+        self.name = name
+        self.qps = float(qps or 1.0)
+        self.capacity = burst or max(1, int(self.qps * 2))
+        self.offset = slot * SLOT
+        self.lock = threading.Lock()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < self.offset + SLOT:
+                fcntl.lockf(fd, fcntl.LOCK_EX)
+                try:
+                    size = max(4096, self.offset + SLOT)
+                    if os.fstat(fd).st_size < size: os.ftruncate(fd, size)
+                finally:
+                    fcntl.lockf(fd, fcntl.LOCK_UN)
+            self.map = mmap.mmap(fd, 0)
+        except Exception:
+            os.close(fd); raise
+        self.fd = fd
+
+    def _locked(self, fn):
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, SLOT, self.offset)
+            try:
+                tokens, updated = struct.unpack_from(_SLOT_FMT, self.map, self.offset)
+                now = time.monotonic()
+                if updated == 0.0: tokens, updated = float(self.capacity), now
+                result, tokens = fn(min(self.capacity, tokens + max(0.0, now - updated) * self.qps))
+                struct.pack_into(_SLOT_FMT, self.map, self.offset, tokens, now)
+                return result
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, SLOT, self.offset)
+
+    @property
+    def tokens(self):
+        return self._locked(lambda t: (t, t))
+
+    @tokens.setter
+    def tokens(self, value):
+        self._locked(lambda t: (None, float(value)))
+
+def make_bucket(name, qps, backend=None, path=None):
+    """Shared bucket when RATE_LIMIT_BACKEND is "shared" and the platform allows it, else in-process."""
+    backend = backend or getattr(Config, "RATE_LIMIT_BACKEND", "shared")
+    if backend == "shared" and fcntl is not None:
+        try: return SharedTokenBucket(path or getattr(Config, "RATE_LIMIT_FILE", "") or default_limiter_path(),
+                                      SLOTS[name], qps, name=name)
+        except OSError: pass
+    return TokenBucket(qps, name=name)
+
+pixel_bucket = make_bucket("pixel", float(getattr(Config, "RATE_LIMIT_QPS_PIXEL", 5)))
+capi_bucket  = make_bucket("capi", float(getattr(Config, "RATE_LIMIT_QPS_CAPI", 5)))
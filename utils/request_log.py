@@ -0,0 +1,74 @@
+import random, threading, time
+from datetime import datetime
+from urllib.parse import urlencode
+from flask import g, request
+from models import RequestLog
+from utils.user_data import HASHED, ALIASES
+
+# Samples requests into RequestLog. after_request only appends a dict to an
+# in-memory buffer; the rows are inserted by the EventLog writer as a flush
+# hook, in the same transaction as its EventLog batch, so there is no commit
+# per request. 5xx responses are always kept; the buffer is bounded.
+# Query values that can carry customer data (em=, ph=, ... and fbclid) are
+# redacted before the path is stored.
+REDACTED_PARAMS = frozenset(HASHED) | frozenset(ALIASES) | {"fbclid"}
+
+def logged_path():
+    """request.full_path with the values of REDACTED_PARAMS replaced."""
+    if not request.query_string: return request.path
+    args = [(k, "redacted" if k.lower() in REDACTED_PARAMS else v) for k, v in request.args.items(multi=True)]
+    return f"{request.path}?{urlencode(args)}"
+
+class RequestSampler:
+    def __init__(self, rate=0.01, body_max=2000, max_buffer=5000):
+        self.rate = rate
+        self.body_max = body_max
+        self.max_buffer = max_buffer
+        self._rows = []
+        self._lock = threading.Lock()
+        self.sampled = self.written = self.dropped = 0
+
+    def init_app(self, app, writer):
+        self.rate = float(app.config.get("REQUEST_LOG_SAMPLE", self.rate))
+        self.body_max = int(app.config.get("REQUEST_LOG_BODY_MAX", self.body_max))
+        app.after_request(self._after)
+        writer.add_flush_hook(self)
+
+    def _after(self, resp):
+        if resp.status_code < 500 and (self.rate <= 0 or random.random() >= self.rate): return resp
+        if request.endpoint == "static": return resp
+        t0 = g.get("_metrics_t0")   # set by utils/metrics.py
+        body = None
+        # JSON bodies only: no login forms (passwords) and no gzip beacons
+        if request.mimetype == "application/json" and not request.content_encoding and self.body_max > 0:
+            body = request.get_data(as_text=True)[:self.body_max] or None
+        row = {"ts": datetime.utcnow(), "method": request.method, "path": logged_path()[:256],
+               "status": resp.status_code, "error": None, "body": body,
+               "latency_ms": None if t0 is None else int((time.perf_counter() - t0) * 1000)}
+        with self._lock:
+            if len(self._rows) >= self.max_buffer:
+                self.dropped += 1
+            else:
+                self._rows.append(row); self.sampled += 1
+        return resp
+
+    # -------------------- Flush hook --------------------
+    def prepare(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        return rows
+
+    def apply(self, session, rows):
+        session.execute(RequestLog.__table__.insert(), rows)
+
+    def finish(self, rows, ok):
+        with self._lock:
+            if ok: self.written += len(rows)
+            else: self.dropped += len(rows)
+
+    def stats(self):
+        with self._lock:
+            return {"rate": self.rate, "buffered": len(self._rows), "sampled": self.sampled,
+                    "written": self.written, "dropped": self.dropped}
+
+request_sampler = RequestSampler()
@@ -0,0 +1,203 @@
+import gzip, hashlib, json, math, os, threading, time
+from datetime import datetime, timedelta
+from sqlalchemy import or_, select
+from extensions import db
+from models import EventLog, ArchiveSegment
+from utils.payload_codec import payload_codec
+from utils import lease
+
+# Bloom filter over event_ids so a lookup only opens segments that may hold it.
+class BloomFilter:
+    def __init__(self, bits, k):
+        self.bits = bytearray(bits)
+        self.m = len(self.bits) * 8
+        self.k = k
+
+    @classmethod
+    def for_capacity(cls, n, error_rate=0.01):
+        m = max(64, int(-max(1, n) * math.log(error_rate) / (math.log(2) ** 2)))
+        k = max(1, round(m / max(1, n) * math.log(2)))
+        return cls(bytes((m + 7) // 8), k)
+
+    def _positions(self, value):
+        h = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        a, b = int.from_bytes(h[:8], "little"), int.from_bytes(h[8:], "little") | 1
+        return ((a + i * b) % self.m for i in range(self.k))
+
+    def add(self, value):
+        for p in self._positions(value): self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(value))
+
+# Moves EventLog rows past the max age (or beyond the newest max_rows) into
+# gzip NDJSON segments under ARCHIVE_DIR/YYYY/MM/DD/, one file per day per
+# chunk, indexed by ArchiveSegment (time range, id range, event_id bloom).
+# Every chunk is its own short transaction: write + fsync the file, then
+# insert the index row and delete the archived ids in one commit. A crash
+# in between leaves a file that the next run rewrites under the same name.
+# Every process starts the loop; a `retention` lease (renewed per chunk)
+# lets only one of them archive at a time.
+LEASE = "retention"
+
+class Retention:
+    def __init__(self, max_age_days=0, max_rows=0, chunk_rows=2000, interval=300, archive_dir="archive", pause=0.05):
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.chunk_rows = chunk_rows
+        self.interval = interval
+        self.archive_dir = archive_dir
+        self.pause = pause   # between chunks, so request-path writes are not starved
+        self.app = None
+        self.thread = None
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+        self.runs = self.archived = self.segments = self.errors = self.conflicts = self.skipped = 0
+        self.last_run = self.last_ms = None
+
+    def init_app(self, app):
+        self.app = app
+        cfg = app.config
+        self.max_age_days = float(cfg.get("RETENTION_MAX_AGE_DAYS", self.max_age_days))
+        self.max_rows = int(cfg.get("RETENTION_MAX_ROWS", self.max_rows))
+        self.chunk_rows = int(cfg.get("RETENTION_CHUNK_ROWS", self.chunk_rows))
+        self.interval = float(cfg.get("RETENTION_INTERVAL", self.interval))
+        self.archive_dir = cfg.get("ARCHIVE_DIR", self.archive_dir)
+        if self.enabled and self.interval > 0 and self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="eventlog-retention", daemon=True)
+            self.thread.start()
+
+    @property
+    def enabled(self):
+        return self.max_age_days > 0 or self.max_rows > 0
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context(): self.run()
+            except Exception:
+                self.errors += 1
+
+    def stop(self):
+        self._stop.set()
+
+    # -------------------- Archiving --------------------
+    def _expired(self):
+        """WHERE clause for rows outside the policy, or None if nothing qualifies."""
+        t = EventLog.__table__
+        conds = []
+        if self.max_age_days > 0:
+            conds.append(t.c.ts < datetime.utcnow() - timedelta(days=self.max_age_days))
+        if self.max_rows > 0:
+            cut = db.session.execute(select(t.c.id).order_by(t.c.id.desc())
+                                     .offset(self.max_rows).limit(1)).scalar()
+            if cut is not None: conds.append(t.c.id <= cut)
+        return or_(*conds) if conds else None
+
+    def run(self, max_chunks=None):
+        """Archive expired rows chunk by chunk; returns the number of rows moved."""
+        if not self._run_lock.acquire(blocking=False): return 0
+        start, moved, chunks = time.time(), 0, 0
+        owner, ttl = lease.owner_id(), max(60.0, self.interval)
+        try:
+            if not lease.acquire(LEASE, owner, ttl):
+                self.skipped += 1   # another process is archiving
+                return 0
+            t = EventLog.__table__
+            # once per run: the max_rows cutoff is an OFFSET scan and only moves forward
+            where = self._expired()
+            while where is not None and (max_chunks is None or chunks < max_chunks):
+                if chunks and not lease.acquire(LEASE, owner, ttl): break
+                rows = db.session.execute(select(t).where(where).order_by(t.c.id)
+                                          .limit(self.chunk_rows)).mappings().all()
+                db.session.commit()   # end the read transaction before writing files
+                if not rows: break
+                by_day = {}
+                for r in rows: by_day.setdefault((r["ts"] or datetime.utcnow()).date(), []).append(dict(r))
+                for day, day_rows in sorted(by_day.items()):
+                    moved += self._archive(day, day_rows)
+                chunks += 1
+                if self.pause: time.sleep(self.pause)
+            self.runs += 1
+            return moved
+        except Exception:
+            db.session.rollback()
+            self.errors += 1
+            raise
+        finally:
+            try: lease.release(LEASE, owner)
+            except Exception: db.session.rollback()
+            self.last_run, self.last_ms = datetime.utcnow().isoformat(), int((time.time() - start) * 1000)
+            self._run_lock.release()
+
+    def _archive(self, day, rows):
+        """Write one segment and delete its rows; returns rows moved (0 if another process had them)."""
+        ids = [r["id"] for r in rows]
+        stamps = [r["ts"] for r in rows if r["ts"]] or [datetime.combine(day, datetime.min.time())]
+        rel = f"{day:%Y/%m/%d}/eventlog-{min(ids)}-{max(ids)}.ndjson.gz"
+        path = os.path.join(self.archive_dir, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        bloom = BloomFilter.for_capacity(len(rows))
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                for r in rows:
+                    if r["event_id"]: bloom.add(r["event_id"])
+                    r["ts"] = r["ts"].isoformat() if r["ts"] else None
+                    # archives keep plain-text payloads; gzip does the compressing there
+                    r["payload"] = payload_codec.text(r["payload"], r.pop("payload_z", None))
+                    gz.write(json.dumps(r, separators=(",", ":")).encode() + b"\n")
+            raw.flush(); os.fsync(raw.fileno())
+        try:
+            # delete first: a short count means another process already archived these rows,
+            # and its segment file must not be replaced
+            t = EventLog.__table__
+            deleted = sum(db.session.execute(t.delete().where(t.c.id.in_(ids[i:i + 500]))).rowcount
+                          for i in range(0, len(ids), 500))
+            if deleted != len(ids):
+                db.session.rollback(); os.remove(tmp)
+                self.conflicts += 1
+                return 0
+            os.replace(tmp, path)
+            db.session.query(ArchiveSegment).filter_by(path=rel).delete()
+            db.session.add(ArchiveSegment(path=rel, day=day, min_ts=min(stamps), max_ts=max(stamps),
+                min_id=min(ids), max_id=max(ids), rows=len(rows), bytes=os.path.getsize(path),
+                bloom=bytes(bloom.bits), bloom_k=bloom.k))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        self.archived += len(rows); self.segments += 1
+        return len(rows)
+
+    # -------------------- Lookup --------------------
+    def search(self, event_id=None, start=None, end=None, limit=500):
+        """Archived rows matching event_id and/or the [start, end] time range."""
+        q = ArchiveSegment.query
+        if start is not None: q = q.filter(ArchiveSegment.max_ts >= start)
+        if end is not None: q = q.filter(ArchiveSegment.min_ts <= end)
+        out = []
+        for seg in q.order_by(ArchiveSegment.min_ts).all():
+            if event_id and seg.bloom and event_id not in BloomFilter(seg.bloom, seg.bloom_k): continue
+            path = os.path.join(self.archive_dir, seg.path)
+            if not os.path.exists(path): continue
+            with gzip.open(path, "rt") as f:
+                for line in f:
+                    r = json.loads(line)
+                    if event_id and r.get("event_id") != event_id: continue
+                    ts = datetime.fromisoformat(r["ts"]) if r.get("ts") else None
+                    if start is not None and (ts is None or ts < start): continue
+                    if end is not None and (ts is None or ts > end): continue
+                    out.append(r)
+                    if len(out) >= limit: return out
+        return out
+
+    def stats(self):
+        return {"enabled": self.enabled, "max_age_days": self.max_age_days, "max_rows": self.max_rows,
+                "chunk_rows": self.chunk_rows, "interval": self.interval, "runs": self.runs,
+                "archived": self.archived, "segments": self.segments, "errors": self.errors,
+                "conflicts": self.conflicts, "skipped": self.skipped,
+                "last_run": self.last_run, "last_ms": self.last_ms}
+
+retention = Retention()
@@ -0,0 +1,277 @@
+import json, math, threading
+from datetime import datetime, timedelta
+from extensions import db
+from models import EventLog, EventRollup
+from utils.payload_codec import payload_codec
+
+# Latency sketch: counts per logarithmic bucket (bucket i holds
+# (GAMMA^(i-1), GAMMA^i] ms, i = 0 holds <= 1 ms), so quantiles are within
+# ~4% relative error and two sketches merge by adding counts.
+GAMMA = 1.08
+_LOG_GAMMA = math.log(GAMMA)
+
+def sketch_index(ms):
+    return 0 if ms <= 1 else int(math.ceil(math.log(ms) / _LOG_GAMMA))
+
+def sketch_quantile(sketch, q):
+    total = sum(sketch.values())
+    if not total: return None
+    rank, seen = q * (total - 1), 0
+    for i in sorted(sketch):
+        seen += sketch[i]
+        if seen > rank: return round(0.0 if i == 0 else 2 * GAMMA ** i / (GAMMA + 1), 1)
+
+def is_error(status):
+    return status in ("error", "exception", "circuit_open") or status.startswith("http_")
+
+_KEYS = ("count", "value_sum", "margin_sum", "pltv_sum", "latency_sum", "latency_max")
+
+def _new():
+    return {"count": 0, "value_sum": 0.0, "margin_sum": 0.0, "pltv_sum": 0.0,
+            "latency_sum": 0, "latency_max": 0, "sketch": {}}
+
+def _merge(agg, other):
+    for k in ("count", "value_sum", "margin_sum", "pltv_sum", "latency_sum"): agg[k] += other[k]
+    agg["latency_max"] = max(agg["latency_max"], other["latency_max"])
+    for i, n in other["sketch"].items(): agg["sketch"][i] = agg["sketch"].get(i, 0) + n
+
+def _from_row(r):
+    agg = {k: r[k] or 0 for k in _KEYS}
+    agg["sketch"] = {int(i): n for i, n in json.loads(r["sketch"] or "{}").items()}
+    return agg
+
+def _values(payload):
+    """(value, profit_margin, pltv) from a flat pixel payload or a CAPI envelope."""
+    if not payload or not ('"value"' in payload or '"pltv"' in payload or '"profit_margin"' in payload):
+        return 0.0, 0.0, 0.0
+    try: d = json.loads(payload)
+    except ValueError: return 0.0, 0.0, 0.0
+    if isinstance(d, dict) and isinstance(d.get("data"), list) and d["data"] and isinstance(d["data"][0], dict):
+        d = d["data"][0].get("custom_data") or {}
+    if not isinstance(d, dict): return 0.0, 0.0, 0.0
+    def num(k):
+        try: return float(d.get(k) or 0)
+        except (TypeError, ValueError): return 0.0
+    return num("value"), num("profit_margin"), num("pltv")
+
+def floor_minute(ts): return ts.replace(second=0, microsecond=0)
+def floor_hour(ts): return ts.replace(minute=0, second=0, microsecond=0)
+
+# Per-minute aggregates of EventLog keyed by (minute, channel, event_name,
+# status): counts, value/margin/PLTV sums and a latency sketch. The EventLog
+# writer hands every flushed batch to observe_rows() and persists the deltas
+# as new partial rows in the same transaction (an append, so processes never
+# race on a read-modify-write). compact() later folds the partial rows of
+# settled minutes into one row per key, and minutes older than
+# ROLLUP_MINUTE_HOURS into hourly rows. Reads touch only the buckets asked for.
+class Rollups:
+    def __init__(self, interval=60.0, minute_hours=24, settle_seconds=120):
+        self.interval = interval
+        self.minute_hours = minute_hours
+        self.settle = timedelta(seconds=settle_seconds)
+        self.app = None
+        self.thread = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.rows_seen = self.compactions = self.conflicts = self.errors = 0
+
+    def init_app(self, app, writer):
+        self.app = app
+        self.interval = float(app.config.get("ROLLUP_COMPACT_INTERVAL", self.interval))
+        self.minute_hours = int(app.config.get("ROLLUP_MINUTE_HOURS", self.minute_hours))
+        writer.add_flush_hook(self)
+        if self.interval > 0 and self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="rollup-compactor", daemon=True)
+            self.thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context(): self.compact()
+            except Exception:
+                self.errors += 1
+
+    # -------------------- Recording (EventLog writer flush hook) --------------------
+    def observe_rows(self, rows):
+        local = self._aggregate(rows)
+        with self._lock:
+            self.rows_seen += len(rows)
+            for key, agg in local.items():
+                if key in self._pending: _merge(self._pending[key], agg)
+                else: self._pending[key] = agg
+
+    def forget_rows(self, rows):
+        """Take back rows the writer observed but then dropped (latency_max cannot be undone)."""
+        with self._lock:
+            self.rows_seen -= len(rows)
+            for key, agg in self._aggregate(rows).items():
+                cur = self._pending.get(key)
+                if cur is None: continue
+                for k in ("count", "value_sum", "margin_sum", "pltv_sum", "latency_sum"): cur[k] -= agg[k]
+                for i, n in agg["sketch"].items():
+                    cur["sketch"][i] = cur["sketch"].get(i, 0) - n
+                    if cur["sketch"][i] <= 0: del cur["sketch"][i]
+                if cur["count"] <= 0: del self._pending[key]
+
+    @staticmethod
+    def _aggregate(rows):
+        local = {}
+        for r in rows:
+            ts = r.get("ts") or datetime.utcnow()
+            key = (floor_minute(ts), r.get("channel") or "", r.get("event_name") or "", str(r.get("status") or ""))
+            agg = local.get(key)
+            if agg is None: agg = local[key] = _new()
+            value, margin, pltv = _values(payload_codec.text(r.get("payload"), r.get("payload_z")))
+            ms = int(r.get("latency_ms") or 0)
+            agg["count"] += 1; agg["value_sum"] += value; agg["margin_sum"] += margin; agg["pltv_sum"] += pltv
+            agg["latency_sum"] += ms; agg["latency_max"] = max(agg["latency_max"], ms)
+            i = sketch_index(ms); agg["sketch"][i] = agg["sketch"].get(i, 0) + 1
+        return local
+
+    def prepare(self):
+        with self._lock:
+            taken, self._pending = self._pending, {}
+        return taken
+
+    def apply(self, session, taken):
+        session.execute(EventRollup.__table__.insert(), [self._row("1m", key, agg, False) for key, agg in taken.items()])
+
+    def finish(self, taken, ok):
+        if ok or not taken: return
+        with self._lock:   # keep the deltas for the next flush
+            for key, agg in taken.items():
+                if key in self._pending: _merge(self._pending[key], agg)
+                else: self._pending[key] = agg
+
+    @staticmethod
+    def _row(res, key, agg, final):
+        bucket, channel, event_name, status = key
+        return {"res": res, "bucket": bucket, "channel": channel, "event_name": event_name, "status": status,
+                "final": final, **{k: agg[k] for k in _KEYS}, "sketch": json.dumps(agg["sketch"], separators=(",", ":"))}
+
+    # -------------------- Compaction --------------------
+    def _fold(self, rows, res, bucket_fn):
+        merged = {}
+        for r in rows:
+            key = (bucket_fn(r["bucket"]), r["channel"], r["event_name"], r["status"])
+            if key in merged: _merge(merged[key], _from_row(r))
+            else: merged[key] = _from_row(r)
+        return [self._row(res, key, agg, True) for key, agg in merged.items()]
+
+    def _replace(self, rows, new_rows):
+        """Swap `rows` for `new_rows` in one transaction; False if another process got there first."""
+        t = EventRollup.__table__
+        ids, deleted = [r["id"] for r in rows], 0
+        try:
+            for i in range(0, len(ids), 500):
+                deleted += db.session.execute(t.delete().where(t.c.id.in_(ids[i:i + 500]))).rowcount
+            if deleted != len(ids):
+                db.session.rollback(); self.conflicts += 1
+                return False
+            if new_rows: db.session.execute(t.insert(), new_rows)
+            db.session.commit()
+            return True
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def compact(self, now=None):
+        """Fold settled minutes into one row per key and old minutes into hours; returns rows folded."""
+        if not self._compact_lock.acquire(blocking=False): return 0
+        t, folded = EventRollup.__table__, 0
+        try:
+            now = now or datetime.utcnow()
+            before = floor_minute(now - self.settle)
+            while True:   # partial minute rows, one hour of buckets per transaction
+                lo = db.session.execute(db.select(db.func.min(t.c.bucket)).where(
+                    t.c.res == "1m", t.c.final.is_(False), t.c.bucket < before)).scalar()
+                if lo is None: break
+                hi = min(floor_hour(lo) + timedelta(hours=1), before)
+                rows = db.session.execute(db.select(t).where(t.c.res == "1m", t.c.bucket >= lo, t.c.bucket < hi)).mappings().all()
+                dirty = {(r["bucket"], r["channel"], r["event_name"], r["status"]) for r in rows if not r["final"]}
+                rows = [r for r in rows if (r["bucket"], r["channel"], r["event_name"], r["status"]) in dirty]
+                if not self._replace(rows, self._fold(rows, "1m", lambda b: b)): break
+                folded += len(rows)
+            cutoff = floor_hour(now - timedelta(hours=self.minute_hours))
+            while True:   # minute rows past ROLLUP_MINUTE_HOURS, one hour per transaction
+                lo = db.session.execute(db.select(db.func.min(t.c.bucket)).where(
+                    t.c.res == "1m", t.c.bucket < cutoff)).scalar()
+                if lo is None: break
+                hour = floor_hour(lo)
+                rows = db.session.execute(db.select(t).where(db.or_(
+                    db.and_(t.c.res == "1m", t.c.bucket >= hour, t.c.bucket < hour + timedelta(hours=1)),
+                    db.and_(t.c.res == "1h", t.c.bucket == hour)))).mappings().all()
+                if not self._replace(rows, self._fold(rows, "1h", floor_hour)): break
+                folded += len(rows)
+            self.compactions += 1
+            return folded
+        finally:
+            db.session.commit()
+            self._compact_lock.release()
+
+    def rebuild(self, chunk=5000, echo=None):
+        """Recompute every rollup from EventLog (after upgrading); returns rows scanned."""
+        t = EventLog.__table__
+        # Delete and take the id mark in one transaction. Writers flush EventLog rows and
+        # their rollup partials together, so rows up to the mark lost their partials here and
+        # are rescanned, and later rows keep the partials the writer hook gives them.
+        db.session.execute(EventRollup.__table__.delete())
+        mark = db.session.execute(db.select(db.func.max(t.c.id))).scalar() or 0
+        db.session.commit()
+        last_id = scanned = 0
+        while True:
+            rows = db.session.execute(db.select(t.c.id, t.c.ts, t.c.channel, t.c.event_name, t.c.status,
+                                                t.c.latency_ms, t.c.payload, t.c.payload_z)
+                                      .where(t.c.id > last_id, t.c.id <= mark)
+                                      .order_by(t.c.id).limit(chunk)).mappings().all()
+            if not rows: break
+            batch = [{**r, "payload": payload_codec.text(r["payload"], r["payload_z"])} for r in rows]
+            local = Rollups(); local.observe_rows(batch)
+            taken = local.prepare()
+            if taken: self.apply(db.session, taken)
+            db.session.commit()
+            last_id, scanned = rows[-1]["id"], scanned + len(rows)
+            if echo: echo(f"  {scanned} rows")
+        self.compact()
+        return scanned
+
+    # -------------------- Reads --------------------
+    def series(self, res="1m", buckets=60, channel=None, event_name=None, now=None):
+        """One entry per bucket (oldest first) with per-channel counts, errors, sums and p50/p95/p99."""
+        step = timedelta(minutes=1) if res == "1m" else timedelta(hours=1)
+        floor = floor_minute if res == "1m" else floor_hour
+        end = floor(now or datetime.utcnow()) + step
+        start = end - step * buckets
+        t = EventRollup.__table__
+        q = db.select(t).where(t.c.bucket >= start, t.c.bucket < end,
+                               t.c.res == "1m" if res == "1m" else t.c.res.in_(("1m", "1h")))
+        if channel: q = q.where(t.c.channel == channel)
+        if event_name: q = q.where(t.c.event_name == event_name)
+        cells = {}   # bucket -> channel -> aggregate
+        for r in db.session.execute(q).mappings():
+            by_channel = cells.setdefault(floor(r["bucket"]), {})
+            cell = by_channel.get(r["channel"])
+            if cell is None: cell = by_channel[r["channel"]] = {**_new(), "errors": 0}
+            _merge(cell, _from_row(r))
+            if is_error(r["status"]): cell["errors"] += r["count"]
+        out, b = [], start
+        while b < end:
+            chans = {}
+            for ch, c in cells.get(b, {}).items():
+                chans[ch] = {"count": c["count"], "errors": c["errors"],
+                             "value_sum": round(c["value_sum"], 2), "margin_sum": round(c["margin_sum"], 2),
+                             "pltv_sum": round(c["pltv_sum"], 2), "latency_max": c["latency_max"],
+                             "latency_avg": round(c["latency_sum"] / c["count"], 1) if c["count"] else None,
+                             **{f"p{q}": sketch_quantile(c["sketch"], q / 100) for q in (50, 95, 99)}}
+            out.append({"bucket": b.isoformat(), "channels": chans})
+            b += step
+        return out
+
+    def stats(self):
+        with self._lock: pending = len(self._pending)
+        return {"pending_keys": pending, "rows_seen": self.rows_seen, "compactions": self.compactions,
+                "conflicts": self.conflicts, "errors": self.errors, "minute_hours": self.minute_hours}
+
+rollups = Rollups()
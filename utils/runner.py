@@ -0,0 +1,200 @@
+import json, math, multiprocessing, os, socket, time
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import RunnerControl, RunnerShard
+
+# Out-of-process automation (AUTOMATION_RUNNER=process). Web workers only
+# write the desired state to runner_control; `flask automation-runner`
+# supervises N spawned processes, each running an AutomationScheduler on
+# 1/N of every event rate. Shards heartbeat their progress into
+# runner_shard, so start/stop/status work from any web worker, and a shard
+# that dies is restarted by the supervisor while the desired state is running.
+# Shards build the app with BACKGROUND_SERVICES=0 (no boot writes, no
+# housekeeping threads). Only one supervisor runs at a time: it holds
+# runner_control.supervisor as a lease renewed every tick, and a second one
+# refuses to start while that lease is fresh.
+LEASE_TICKS = 5   # a supervisor silent for this many heartbeats (min 10 s) has lost the lease
+
+def _now(): return datetime.utcnow()
+
+def _control_row():
+    t = RunnerControl.__table__
+    row = db.session.execute(t.select().where(t.c.id == 1)).mappings().first()
+    if row is None:
+        try:
+            db.session.add(RunnerControl(id=1, desired="stopped", generation=0)); db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        row = db.session.execute(t.select().where(t.c.id == 1)).mappings().first()
+    return row
+
+def request_start(config):
+    """Ask the runner to start; False if automation is already running."""
+    _control_row()
+    t = RunnerControl.__table__
+    n = db.session.execute(t.update().where(t.c.id == 1, t.c.desired != "running").values(
+        desired="running", generation=t.c.generation + 1, config=json.dumps(config), updated_at=_now())).rowcount
+    db.session.commit()
+    return bool(n)
+
+def request_stop():
+    _control_row()
+    t = RunnerControl.__table__
+    n = db.session.execute(t.update().where(t.c.id == 1, t.c.desired == "running")
+                           .values(desired="stopped", updated_at=_now())).rowcount
+    db.session.commit()
+    return bool(n)
+
+def status(heartbeat=1.0):
+    ctl = _control_row()
+    fresh = _now() - timedelta(seconds=max(3.0, heartbeat * 3))
+    t = RunnerShard.__table__
+    shards = db.session.execute(t.select().where(t.c.generation == ctl["generation"], t.c.heartbeat >= fresh,
+                                                 t.c.state == "running")).mappings().all()
+    db.session.commit()
+    cfg = json.loads(ctl["config"] or "{}")
+    rates = {}
+    for sh in shards:
+        for name, s in json.loads(sh["stats"] or "{}").items():
+            agg = rates.setdefault(name, {"dispatched": 0, "completed": 0, "errors": 0, "lagged": 0,
+                                          "requested": 0.0, "achieved": 0.0})
+            for k in agg: agg[k] += s.get(k, 0)
+    for agg in rates.values():
+        agg["requested"], agg["achieved"] = round(agg["requested"], 6), round(agg["achieved"], 3)
+    seen = ctl["supervisor_seen"]
+    return {"desired": ctl["desired"], "running": ctl["desired"] == "running" and bool(shards),
+            "generation": ctl["generation"], "processes": len(shards), "rates": rates,
+            "requested": cfg.get("rates", {}), "arrivals": cfg.get("arrivals"),
+            "max_concurrency": cfg.get("max_concurrency"),
+            "runner_online": bool(seen and seen >= fresh), "supervisor": ctl["supervisor"]}
+
+# -------------------- Shard process --------------------
+def _beat(shard, generation, state, started_at, stats):
+    row = db.session.get(RunnerShard, shard) or RunnerShard(shard=shard)
+    row.pid, row.generation, row.state = os.getpid(), generation, state
+    row.started_at, row.heartbeat, row.stats = started_at, _now(), json.dumps(stats)
+    db.session.add(row); db.session.commit()
+
+def shard_main(shard, shards, generation, parent_pid, heartbeat=1.0):
+    from app import app
+    from admin.routes import automation_worker
+    from utils.scheduler import AutomationScheduler
+    from utils.capi_batcher import capi_batcher
+    from utils.eventlog_writer import writer as eventlog_writer
+    with app.app_context():
+        ctl = _control_row()
+        if ctl["desired"] != "running" or ctl["generation"] != generation: return
+        cfg = json.loads(ctl["config"] or "{}")
+    rates = {name: float(r) / shards for name, r in (cfg.get("rates") or {}).items() if r and float(r) > 0}
+    workers = max(1, math.ceil(int(cfg.get("max_concurrency") or 4) / shards))
+    sched = AutomationScheduler(max_workers=workers, arrivals=cfg.get("arrivals") or "poisson")
+    sched.start(lambda name: automation_worker(app, name), rates)
+    started = _now()
+    try:
+        with app.app_context():
+            while True:
+                _beat(shard, generation, "running", started, sched.status())
+                ctl = _control_row()
+                if ctl["desired"] != "running" or ctl["generation"] != generation or os.getppid() != parent_pid:
+                    break
+                time.sleep(heartbeat)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sched.stop()
+        capi_batcher.flush()
+        eventlog_writer.flush()
+        with app.app_context(): _beat(shard, generation, "stopped", started, sched.status())
+
+# -------------------- Supervisor --------------------
+class LeaseLost(Exception):
+    pass
+
+class RunnerSupervisor:
+    def __init__(self, app, processes=None, heartbeat=1.0, echo=print):
+        self.app = app
+        self.processes = processes or os.cpu_count() or 1
+        self.heartbeat = heartbeat
+        self.echo = echo
+        self.ident = f"{socket.gethostname()}:{os.getpid()}"
+        self.ctx = multiprocessing.get_context("spawn")
+        self.procs = {}
+        self.generation = None
+
+    def _spawn(self, shard):
+        os.environ["BACKGROUND_SERVICES"] = "0"   # inherited by the spawned interpreter
+        p = self.ctx.Process(target=shard_main, name=f"automation-shard-{shard}",
+                             args=(shard, self.processes, self.generation, os.getpid(), self.heartbeat))
+        p.start()
+        self.procs[shard] = p
+
+    def _reap(self, timeout=10.0):
+        deadline = time.time() + timeout
+        for p in self.procs.values(): p.join(max(0.1, deadline - time.time()))
+        for p in self.procs.values():
+            if p.is_alive(): p.terminate()
+        self.procs = {}
+
+    def claim(self):
+        """Take or renew the supervisor lease; False while another live supervisor holds it."""
+        with self.app.app_context():
+            _control_row()
+            t = RunnerControl.__table__
+            stale = _now() - timedelta(seconds=max(10.0, self.heartbeat * LEASE_TICKS))
+            n = db.session.execute(t.update().where(t.c.id == 1, or_(
+                t.c.supervisor.is_(None), t.c.supervisor == self.ident, t.c.supervisor_seen < stale))
+                .values(supervisor=self.ident, supervisor_seen=_now())).rowcount
+            db.session.commit()
+            return bool(n)
+
+    def release(self):
+        with self.app.app_context():
+            t = RunnerControl.__table__
+            db.session.execute(t.update().where(t.c.id == 1, t.c.supervisor == self.ident)
+                               .values(supervisor=None, supervisor_seen=None))
+            db.session.commit()
+
+    def tick(self):
+        if not self.claim():
+            raise LeaseLost("another automation runner took over the supervisor lease")
+        with self.app.app_context():
+            ctl = _control_row()
+            db.session.commit()
+        if ctl["desired"] == "running":
+            if self.generation != ctl["generation"]:
+                self._reap()   # shards of the old generation exit on their own
+                self.generation = ctl["generation"]
+                self.echo(f"starting generation {self.generation} on {self.processes} processes")
+                for shard in range(self.processes): self._spawn(shard)
+            for shard, p in list(self.procs.items()):
+                if not p.is_alive():
+                    self.echo(f"shard {shard} exited ({p.exitcode}); restarting")
+                    self._spawn(shard)
+        elif self.procs:
+            self.echo(f"stopping generation {self.generation}")
+            self._reap()
+            self.generation = None
+
+    def run(self):
+        """Supervise until interrupted; False (without starting) if another supervisor is live."""
+        if not self.claim():
+            with self.app.app_context(): holder = _control_row()["supervisor"]
+            self.echo(f"automation runner {holder} is already supervising; not starting")
+            return False
+        self.echo(f"automation runner {self.ident}: {self.processes} processes")
+        try:
+            while True:
+                try: self.tick()
+                except LeaseLost as e:
+                    self.echo(str(e)); return False
+                except Exception as e: self.echo(f"runner tick failed: {e}")
+                time.sleep(self.heartbeat)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._reap()
+            try: self.release()
+            except Exception: pass
+        return True
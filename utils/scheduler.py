@@ -0,0 +1,92 @@
+import heapq, itertools, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+# One timer heap drives every automated event type. Each event name has a
+# target rate (events/sec, fractional or thousands); arrivals are Poisson,
+# jittered or fixed. Due events go to a bounded worker pool; when the pool
+# is saturated the arrival is counted as `lagged` instead of queueing
+# unbounded work, so achieved vs. requested rate shows the shortfall.
+ARRIVALS = ("poisson", "jitter", "fixed")
+
+class AutomationScheduler:
+    def __init__(self, max_workers=4, arrivals="poisson", jitter=0.2, backlog=2):
+        self.max_workers = max_workers
+        self.arrivals = arrivals
+        self.jitter = jitter
+        self.backlog = backlog   # queued jobs allowed per worker before arrivals are shed
+        self.thread = None
+        self.pool = None
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.rates = {}
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive() and not self.stop_event.is_set()
+
+    def _gap(self, rate):
+        if self.arrivals == "poisson": return random.expovariate(rate)
+        if self.arrivals == "jitter": return (1.0 / rate) * random.uniform(1 - self.jitter, 1 + self.jitter)
+        return 1.0 / rate
+
+    def start(self, job, rates, max_workers=None, arrivals=None):
+        if self.running: raise RuntimeError("already running")
+        self.rates = {name: float(r) for name, r in rates.items() if r and float(r) > 0}
+        self.max_workers = int(max_workers or self.max_workers)
+        self.arrivals = arrivals if arrivals in ARRIVALS else self.arrivals
+        self._stats = {name: {"dispatched": 0, "completed": 0, "errors": 0, "lagged": 0} for name in self.rates}
+        self.stop_event.clear()
+        self.started_at = time.monotonic()
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="automation")
+        self._slots = threading.BoundedSemaphore(self.max_workers * (1 + self.backlog))
+        self.thread = threading.Thread(target=self._run, args=(job,), name="automation-scheduler", daemon=True)
+        self.thread.start()
+        return list(self.rates)
+
+    def _run(self, job):
+        seq = itertools.count()
+        now = time.monotonic()
+        heap = [(now + self._gap(r), next(seq), name) for name, r in self.rates.items()]
+        heapq.heapify(heap)
+        while heap and not self.stop_event.is_set():
+            due, _, name = heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(min(delay, 0.5))
+                continue
+            heapq.heapreplace(heap, (due + self._gap(self.rates[name]), next(seq), name))
+            stats = self._stats[name]
+            if self._slots.acquire(blocking=False):
+                with self._lock: stats["dispatched"] += 1
+                self.pool.submit(self._call, job, name, stats)
+            else:
+                with self._lock: stats["lagged"] += 1
+
+    def _call(self, job, name, stats):
+        try:
+            job(name)
+            with self._lock: stats["completed"] += 1
+        except Exception:
+            with self._lock: stats["errors"] += 1
+        finally:
+            self._slots.release()
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        if self.thread is not None: self.thread.join(timeout=timeout)
+        # drop queued arrivals, let in-flight ones finish so a following flush sees them
+        if self.pool is not None: self.pool.shutdown(wait=True, cancel_futures=True)
+        self.thread = None
+
+    def status(self):
+        elapsed = max(1e-6, time.monotonic() - self.started_at) if self.started_at else None
+        with self._lock:
+            out = {}
+            for name, rate in self.rates.items():
+                s = dict(self._stats.get(name, {}))
+                s["requested"] = rate
+                s["achieved"] = round(s.get("completed", 0) / elapsed, 3) if elapsed else 0.0
+                out[name] = s
+        return out
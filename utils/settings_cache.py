@@ -0,0 +1,63 @@
+import threading, time
+
+_MISSING = object()
+
+# In-process snapshot of the whole settings table. Reads are served from
+# memory; at most once per `ttl` seconds a single generation stamp is read
+# from the store and the snapshot is reloaded if another process (gunicorn
+# worker, automation runner) bumped it. Local writes update the snapshot
+# directly, so staleness is bounded by `ttl` for remote writes only.
+class SettingsCache:
+    def __init__(self, load_all, load_generation, ttl=1.0):
+        self.load_all = load_all
+        self.load_generation = load_generation
+        self.ttl = ttl
+        self.generation = None
+        self._values = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.reloads = 0
+
+    def init_app(self, app):
+        self.ttl = float(app.config.get("SETTINGS_CACHE_TTL", self.ttl))
+
+    def _fresh(self):
+        return self._values is not None and time.monotonic() - self._checked < self.ttl
+
+    def load(self, force=False):
+        with self._lock:
+            if not force and self._fresh(): return
+            gen = self.load_generation()
+            if force or self._values is None or gen != self.generation:
+                self._values = dict(self.load_all())
+                self.generation = gen
+                self.reloads += 1
+            self._checked = time.monotonic()
+
+    def get(self, key, default=None):
+        if self._fresh():
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.load()
+        value = self._values.get(key, _MISSING)
+        return default if value is _MISSING else value
+
+    def put(self, key, value, generation):
+        with self._lock:
+            if self._values is None: return
+            self._values[key] = value
+            if self.generation is not None and generation == self.generation + 1:
+                self.generation = generation
+            else:
+                self._checked = 0.0   # someone else wrote in between: re-check on next read
+
+    def invalidate(self):
+        with self._lock:
+            self._checked = 0.0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "reloads": self.reloads,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "generation": self.generation, "keys": len(self._values or {}), "ttl": self.ttl}
@@ -0,0 +1,162 @@
+import functools, hashlib, random, re, threading, unicodedata
+from datetime import date, datetime
+
+# CAPI user_data built in one place. Customer information parameters are
+# normalized per the Meta spec and SHA-256 hashed; values that already look
+# like a hash pass through. Synthetic traffic reuses a small pool of
+# identities, so hashing sits behind a bounded LRU keyed on (param, raw
+# value) and a repeat identity costs a dict lookup. ua/ip/fbp/fbc are sent
+# as-is, as the spec requires.
+HASHED = ("em", "ph", "fn", "ln", "ge", "db", "ct", "st", "zp", "country", "external_id")
+ALIASES = {"email": "em", "phone": "ph", "first_name": "fn", "last_name": "ln", "gender": "ge",
+           "dob": "db", "city": "ct", "state": "st", "zip": "zp", "postal_code": "zp"}
+_HEX64 = re.compile(r"[0-9a-f]{64}")
+_NON_DIGIT = re.compile(r"\D+")
+_NON_ALNUM = re.compile(r"[\W_]+", re.UNICODE)
+_US_ZIP = re.compile(r"(\d{5})-?\d{4}")
+
+US_STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca", "colorado": "co",
+    "connecticut": "ct", "delaware": "de", "districtofcolumbia": "dc", "florida": "fl", "georgia": "ga",
+    "hawaii": "hi", "idaho": "id", "illinois": "il", "indiana": "in", "iowa": "ia", "kansas": "ks",
+    "kentucky": "ky", "louisiana": "la", "maine": "me", "maryland": "md", "massachusetts": "ma",
+    "michigan": "mi", "minnesota": "mn", "mississippi": "ms", "missouri": "mo", "montana": "mt",
+    "nebraska": "ne", "nevada": "nv", "newhampshire": "nh", "newjersey": "nj", "newmexico": "nm",
+    "newyork": "ny", "northcarolina": "nc", "northdakota": "nd", "ohio": "oh", "oklahoma": "ok",
+    "oregon": "or", "pennsylvania": "pa", "rhodeisland": "ri", "southcarolina": "sc", "southdakota": "sd",
+    "tennessee": "tn", "texas": "tx", "utah": "ut", "vermont": "vt", "virginia": "va", "washington": "wa",
+    "westvirginia": "wv", "wisconsin": "wi", "wyoming": "wy", "puertorico": "pr",
+}
+# country names and ISO alpha-3 codes we accept besides alpha-2; anything else is dropped
+COUNTRIES = {
+    "unitedstates": "us", "unitedstatesofamerica": "us", "usa": "us", "america": "us",
+    "unitedkingdom": "gb", "greatbritain": "gb", "gbr": "gb", "uk": "gb", "england": "gb",
+    "canada": "ca", "can": "ca", "mexico": "mx", "mex": "mx", "germany": "de", "deu": "de",
+    "france": "fr", "fra": "fr", "spain": "es", "esp": "es", "italy": "it", "ita": "it",
+    "netherlands": "nl", "nld": "nl", "ireland": "ie", "irl": "ie", "australia": "au", "aus": "au",
+    "newzealand": "nz", "nzl": "nz", "brazil": "br", "bra": "br", "india": "in", "ind": "in",
+    "japan": "jp", "jpn": "jp", "china": "cn", "chn": "cn", "southkorea": "kr", "kor": "kr",
+}
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%m/%d/%Y", "%m-%d-%Y", "%d.%m.%Y", "%Y%m%d", "%m%d%Y")
+
+def _letters(v):
+    return _NON_ALNUM.sub("", unicodedata.normalize("NFKC", v).lower())
+
+def _birth_date(v):
+    """YYYYMMDD for a parseable date of birth (ISO, US MM/DD/YYYY, DD.MM.YYYY, 8 digits), else ""."""
+    v = v.replace(" ", "")
+    for fmt in _DATE_FORMATS:
+        try: d = datetime.strptime(v, fmt).date()
+        except ValueError: continue
+        if 1900 <= d.year and d <= date.today(): return d.strftime("%Y%m%d")
+    # day-first with slashes/dashes when the first field cannot be a month
+    for fmt in ("%d/%m/%Y", "%d-%m-%Y"):
+        try: d = datetime.strptime(v, fmt).date()
+        except ValueError: continue
+        if 1900 <= d.year and d <= date.today(): return d.strftime("%Y%m%d")
+    return ""
+
+def normalize(key, value):
+    """Spec-normalized string for one parameter ("" when nothing usable is left)."""
+    v = str(value).strip()
+    if key == "em": return v.lower()
+    if key == "ph": return _NON_DIGIT.sub("", v).lstrip("0")
+    if key in ("fn", "ln", "ct"): return _letters(v)
+    if key == "ge": g = _letters(v)[:1]; return g if g in ("f", "m") else ""
+    if key == "db": return _birth_date(v)
+    if key == "st":
+        # US: 2-letter ANSI code; elsewhere: the full name, lowercase, no punctuation or spaces
+        s = _letters(v)
+        return US_STATES.get(s, s)
+    if key == "country":
+        c = _letters(v)
+        return c if len(c) == 2 else COUNTRIES.get(c, "")
+    if key == "zp":
+        m = _US_ZIP.fullmatch(v)
+        return m.group(1) if m else _letters(v)
+    return v   # external_id: any stable string
+
+def _hash(key, value):
+    if _HEX64.fullmatch(value): return value
+    norm = normalize(key, value)
+    return hashlib.sha256(norm.encode()).hexdigest() if norm else None
+
+def identity_from(mapping):
+    """The customer information parameters of a dict, aliases folded onto their Graph keys."""
+    out = {}
+    for k, v in (mapping or {}).items():
+        key = ALIASES.get(k, k)
+        if key in HASHED and v not in (None, ""): out[key] = v
+    return out
+
+class UserData:
+    def __init__(self, cache_size=4096, pool_size=0):
+        self.pool_size = pool_size
+        self._cached = functools.lru_cache(maxsize=cache_size)(_hash)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._cached = functools.lru_cache(maxsize=int(app.config.get("USER_DATA_CACHE_SIZE", 4096)))(_hash)
+        self.pool_size = int(app.config.get("USER_DATA_IDENTITY_POOL", self.pool_size))
+        self._pool = None
+
+    def hash(self, key, value):
+        """SHA-256 of the normalized value, or None when it normalizes to nothing."""
+        if value in (None, ""): return None
+        return self._cached(key, str(value))
+
+    def hash_identity(self, identity):
+        out = {}
+        for k, v in identity_from(identity).items():
+            h = self.hash(k, v)
+            if h: out[k] = h
+        return out
+
+    def hash_many(self, identities):
+        """hash_identity for a batch; each distinct (param, value) is looked up once."""
+        idents = [identity_from(i) for i in identities]
+        hashed = {}
+        for ident in idents:
+            for k, v in ident.items():
+                pair = (k, str(v))
+                if pair not in hashed: hashed[pair] = self._cached(*pair)
+        return [{k: hashed[(k, str(v))] for k, v in ident.items() if hashed[(k, str(v))]} for ident in idents]
+
+    def build(self, identity=None, ua=None, ip=None, fbp=None, fbc=None):
+        """Graph user_data: hashed identity plus the unhashed browser/click parameters."""
+        ud = {}
+        if ip: ud["client_ip_address"] = ip
+        if ua: ud["client_user_agent"] = ua
+        if fbp: ud["fbp"] = fbp
+        if fbc: ud["fbc"] = fbc
+        if identity: ud.update(self.hash_identity(identity))
+        return ud
+
+    # -------------------- Synthetic identities --------------------
+    def pool(self):
+        """USER_DATA_IDENTITY_POOL pre-hashed synthetic identities (hashed in one batch on first use)."""
+        if self._pool is None and self.pool_size > 0:
+            with self._lock:
+                if self._pool is None:
+                    rnd = random.Random(self.pool_size)
+                    self._pool = self.hash_many({
+                        "em": f"shopper{i}@example.com", "ph": f"1555{rnd.randrange(10**7):07d}",
+                        "fn": rnd.choice(("Alex", "Sam", "Jordan", "Taylor", "Casey", "Riley")),
+                        "ln": rnd.choice(("Smith", "Garcia", "Chen", "Okafor", "Novak", "Silva")),
+                        "zp": f"{rnd.randrange(10000, 99999)}", "country": "US", "external_id": f"shopper-{i}",
+                    } for i in range(self.pool_size))
+        return self._pool or []
+
+    def pick(self):
+        """A random pooled identity ({} when the pool is off)."""
+        pool = self.pool()
+        return dict(random.choice(pool)) if pool else {}
+
+    def stats(self):
+        info = self._cached.cache_info()
+        lookups = info.hits + info.misses
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize,
+                "hit_rate": round(info.hits / lookups, 4) if lookups else None, "pool": len(self._pool or [])}
+
+user_data = UserData()